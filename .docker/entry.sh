@@ -7,9 +7,8 @@ SSL_HOSTNAME=${SSL_HOSTNAME:-"commandment.test"}
 PYTHONPATH=/commandment
 export PYTHONPATH
 
-#echo "Initialising database..."
-#touch /commandment/commandment.db
-#/usr/local/bin/alembic --config /commandment/alembic.ini -x data=true upgrade head
+echo "Bootstrapping commandment..."
+python -m commandment.cli --config /settings.cfg bootstrap || exit 1
 
 if [[ ! -f /etc/nginx/ssl/ssl.crt || ! -f /etc/nginx/ssl.key ]]; then
     echo "Did not find any SSL certificate to use. SSL is required for MDM."
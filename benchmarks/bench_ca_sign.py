@@ -0,0 +1,65 @@
+"""
+Measure certificate signing throughput of :class:`commandment.pki.models.CertificateAuthority`.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/bench_ca_sign.py --count 500 --batch 50
+"""
+import argparse
+import time
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.backends import default_backend
+from flask import Flask
+
+from commandment.models import db
+from commandment.pki.models import CertificateAuthority, Certificate, RSAPrivateKey
+
+
+def make_csr(key_size: int) -> x509.CertificateSigningRequest:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size, backend=default_backend())
+    return x509.CertificateSigningRequestBuilder().subject_name(x509.Name([
+        x509.NameAttribute(NameOID.COMMON_NAME, u'commandment-benchmark'),
+    ])).sign(key, hashes.SHA256(), default_backend())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CA certificate signing.')
+    parser.add_argument('--count', type=int, default=500, help='number of certificates to sign')
+    parser.add_argument('--batch', type=int, default=50, help='CSRs signed per sign_many() call')
+    parser.add_argument('--key-size', type=int, default=2048, help='CA and CSR key size')
+    parser.add_argument('--database', default='sqlite:///:memory:', help='SQLAlchemy database URI')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[
+            RSAPrivateKey.__table__, Certificate.__table__, CertificateAuthority.__table__])
+        ca = CertificateAuthority.create(key_size=args.key_size)
+        csr = make_csr(args.key_size)
+
+        started = time.perf_counter()
+        for _ in range(args.count):
+            ca.sign(csr)
+            db.session.commit()
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for offset in range(0, args.count, args.batch):
+            ca.sign_many([csr] * min(args.batch, args.count - offset))
+            db.session.commit()
+        batched = time.perf_counter() - started
+
+    print('sign():      {:8.1f} certificates/sec'.format(args.count / single))
+    print('sign_many(): {:8.1f} certificates/sec (batch of {})'.format(args.count / batched, args.batch))
+
+
+if __name__ == '__main__':
+    main()
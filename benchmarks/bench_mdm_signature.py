@@ -0,0 +1,82 @@
+"""
+Measure Mdm-Signature verification throughput, with and without the signer certificate cache.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/bench_mdm_signature.py --count 2000
+"""
+import argparse
+import datetime
+import time
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import Encoding, pkcs7
+from cryptography.hazmat.backends import default_backend
+from flask import Flask
+
+from commandment.cms.cache import signer_certificate_cache
+from commandment.cms.decorators import _verify_cms_signers
+
+BODY = b'''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+    <key>Status</key>
+    <string>Idle</string>
+    <key>UDID</key>
+    <string>00000000-0000-0000-0000-000000000000</string>
+</dict>
+</plist>
+'''
+
+
+def make_signature(key_size: int) -> bytes:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size, backend=default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'device-identity')])
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()
+    ).serial_number(x509.random_serial_number()).not_valid_before(
+        datetime.datetime.utcnow()
+    ).not_valid_after(
+        datetime.datetime.utcnow() + datetime.timedelta(days=365)
+    ).sign(key, hashes.SHA256(), default_backend())
+
+    return pkcs7.PKCS7SignatureBuilder().set_data(BODY).add_signer(cert, key, hashes.SHA256()).sign(
+        Encoding.DER, [pkcs7.PKCS7Options.DetachedSignature, pkcs7.PKCS7Options.Binary])
+
+
+def run(app: Flask, signature: bytes, count: int) -> float:
+    started = time.perf_counter()
+    with app.test_request_context(data=BODY):
+        for _ in range(count):
+            _verify_cms_signers(signature, detached=True)
+
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Mdm-Signature verification.')
+    parser.add_argument('--count', type=int, default=2000, help='number of signatures to verify')
+    parser.add_argument('--key-size', type=int, default=2048, help='device identity key size')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    signature = make_signature(args.key_size)
+
+    signer_certificate_cache.maxsize = 0
+    uncached = run(app, signature, args.count)
+
+    signer_certificate_cache.maxsize = 1024
+    signer_certificate_cache.clear()
+    cached = run(app, signature, args.count)
+
+    print('uncached: {:8.1f} verifications/sec'.format(uncached))
+    print('cached:   {:8.1f} verifications/sec ({} hits, {} misses)'.format(
+        cached, signer_certificate_cache.hits, signer_certificate_cache.misses))
+
+
+if __name__ == '__main__':
+    main()
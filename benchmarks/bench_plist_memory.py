@@ -0,0 +1,104 @@
+"""
+Measure the peak memory used to parse plist request bodies from the testdata fixtures.
+
+Each fixture is parsed three ways, with the peak measured by tracemalloc:
+
+- plistlib: the body is read into memory, as ``request.data`` was, and parsed with ``plistlib.loads``.
+- streaming: the body is spooled (to disk once it exceeds --spool-size bytes) and parsed with ``streaming.load``.
+- iter_array: the items of the largest top level array are consumed one at a time with ``streaming.iter_array``.
+
+The --scale option repeats the items of every top level array to approximate the largest macOS responses.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/bench_plist_memory.py --scale 100
+"""
+import argparse
+import glob
+import os
+import plistlib
+import tempfile
+import tracemalloc
+from typing import Callable, Optional
+
+from commandment.plistutil import streaming
+
+TESTDATA = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'testdata')
+
+
+def largest_array_key(value: dict) -> Optional[str]:
+    arrays = [(len(v), k) for k, v in value.items() if isinstance(v, list)]
+    return max(arrays)[1] if arrays else None
+
+
+def scaled(data: bytes, scale: int) -> bytes:
+    value = plistlib.loads(data)
+    for k, v in value.items():
+        if isinstance(v, list):
+            value[k] = v * scale
+
+    return plistlib.dumps(value)
+
+
+def peak(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark peak memory of plist body parsing.')
+    parser.add_argument('--scale', type=int, default=1, help='number of times to repeat the items of each array')
+    parser.add_argument('--spool-size', type=int, default=256 * 1024, help='bytes of a body kept in memory')
+    args = parser.parse_args()
+
+    print('{:50} {:>10} {:>12} {:>12} {:>12}'.format('fixture', 'size', 'plistlib', 'streaming', 'iter_array'))
+
+    for path in sorted(glob.glob(os.path.join(TESTDATA, '*', '*.xml'))):
+        with open(path, 'rb') as fd:
+            data = fd.read()
+
+        try:
+            value = plistlib.loads(data)
+        except ValueError:
+            continue  # Some fixtures contain placeholder data which is not valid base64
+
+        if not isinstance(value, dict):
+            continue
+
+        if args.scale > 1:
+            data = scaled(data, args.scale)
+
+        with tempfile.NamedTemporaryFile() as body:
+            body.write(data)
+            body.flush()
+
+            def read_and_parse():
+                with open(body.name, 'rb') as fd:
+                    return plistlib.loads(fd.read())
+
+            def spool_and_parse():
+                with open(body.name, 'rb') as fd:
+                    return streaming.load(streaming.spool(fd, memory_size=args.spool_size))
+
+            key = largest_array_key(value)
+
+            def iterate():
+                with open(body.name, 'rb') as fd:
+                    for _ in streaming.iter_array(streaming.spool(fd, memory_size=args.spool_size), key):
+                        pass
+
+            print('{:50} {:>10} {:>12} {:>12} {:>12}'.format(
+                os.path.relpath(path, TESTDATA),
+                len(data),
+                peak(read_and_parse),
+                peak(spool_and_parse),
+                peak(iterate) if key is not None else '-',
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Measure the time taken to import each feature, and to create the app with all of them.
+
+Every measurement runs in a new interpreter, so that modules imported by one feature are not already loaded for the
+next. Each feature is measured on its own, after the models which are always imported by ``create_app``, so a
+feature's time includes the third party packages it is the only user of.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/bench_startup.py --repeat 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from commandment.features import FEATURES
+
+SETTINGS = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'travis-ci-settings.cfg')
+
+MEASURE_IMPORT = '''
+import importlib, time
+started = time.perf_counter()
+from commandment.features import import_models, FEATURES
+import_models()
+models = time.perf_counter()
+feature = {feature!r}
+try:
+    for spec in FEATURES.get(feature, []):
+        importlib.import_module(spec.module)
+except ImportError:
+    print('{{}} -'.format(models - started))
+else:
+    print('{{}} {{}}'.format(models - started, time.perf_counter() - models))
+'''
+
+MEASURE_CREATE_APP = '''
+import time
+started = time.perf_counter()
+from commandment import create_app
+app = create_app({settings!r}, start_background=False)
+print(time.perf_counter() - started)
+'''
+
+
+def run(code: str) -> str:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.check_output([sys.executable, '-c', code], env=env, cwd=tempfile.gettempdir(),
+                                   stderr=subprocess.DEVNULL).decode().strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark import time per feature.')
+    parser.add_argument('--repeat', type=int, default=3, help='number of interpreters to take the fastest time from')
+    args = parser.parse_args()
+
+    print('{:15} {:>10}'.format('feature', 'seconds'))
+
+    models = []
+    for feature in FEATURES.keys():
+        times = []
+        for _ in range(args.repeat):
+            models_time, feature_time = run(MEASURE_IMPORT.format(feature=feature)).split()
+            models.append(float(models_time))
+            if feature_time != '-':
+                times.append(float(feature_time))
+
+        print('{:15} {:>10}'.format(feature, '{:.3f}'.format(min(times)) if times else 'unavailable'))
+
+    print('{:15} {:>10.3f}'.format('(models)', min(models)))
+
+    create_app = min(float(run(MEASURE_CREATE_APP.format(settings=os.path.realpath(SETTINGS))))
+                     for _ in range(args.repeat))
+    print('{:15} {:>10.3f}'.format('(create_app)', create_app))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,32 +6,10 @@ from typing import Union, Optional
 from pathlib import PurePath
 from flask import Flask, render_template
 
-from commandment.mdm.app import mdm_app
-from .ac2.ac2_app import ac2_app
-from .api.app_jsonapi import api_app, api
-from .api.app_json import flat_api
-from .apns.app import api_push_app
-from .auth import oauth2
-from .api.configuration import configuration_app
-from .enroll.app import enroll_app
-from .models import db
-from .omdm import omdm_app
-from .sso.oauth import oauth_app
-#from .sso.saml import saml_app
-from .dep.app import dep_app
-from .vpp.app import vpp_app
-from .profiles.api import profiles_api_app
-from .inventory.api import api_app as inventory_api
-from .mdm.api import api_app as mdm_api
-from .apps.app_jsonapi import api_app as applications_api
-from .auth.app import auth_app
-
-from .threads import startup_thread
-from .dep import threads as dep_threads
-from .apns import threads as push_threads
-
-
-def create_app(config_file: Optional[Union[str, PurePath]] = None) -> Flask:
+from . import worker
+
+
+def create_app(config_file: Optional[Union[str, PurePath]] = None, start_background: Optional[bool] = None) -> Flask:
     """Create the Flask Application.
 
     Configuration is looked up the following order:
@@ -42,6 +20,8 @@ def create_app(config_file: Optional[Union[str, PurePath]] = None) -> Flask:
 
     Args:
         config_file (Union[str, PurePath]): Path to configuration file.
+        start_background (Optional[bool]): Whether to start the background jobs and workers in this process (see
+            :mod:`commandment.worker`). Defaults to the START_BACKGROUND_THREADS setting.
 
     Returns:
         Instance of the flask application
@@ -53,36 +33,29 @@ def create_app(config_file: Optional[Union[str, PurePath]] = None) -> Flask:
     else:
         app.config.from_envvar('COMMANDMENT_SETTINGS')
 
+    from .auth import oauth2
+    from .models import db
+    from .features import import_models, register_features
+    from . import profiling, querylog
+
+    import_models()
     db.init_app(app)
     oauth2.init_app(app)
 
-    app.register_blueprint(auth_app)
-    app.register_blueprint(enroll_app, url_prefix='/enroll')
-    app.register_blueprint(mdm_app)
-    app.register_blueprint(configuration_app, url_prefix='/api/v1/configuration')
-    app.register_blueprint(api_app, url_prefix='/api')
-    app.register_blueprint(api_push_app, url_prefix='/api')
-    app.register_blueprint(flat_api, url_prefix='/api')
-    app.register_blueprint(profiles_api_app, url_prefix='/api')
-    app.register_blueprint(applications_api, url_prefix='/api')
-    app.register_blueprint(oauth_app, url_prefix='/oauth')
-    #app.register_blueprint(saml_app, url_prefix='/saml')
-    app.register_blueprint(omdm_app, url_prefix='/omdm')
-    app.register_blueprint(ac2_app)
-    app.register_blueprint(dep_app)
-    app.register_blueprint(vpp_app)
-
-    try:
-        from scepy.blueprint import scep_app
-        app.register_blueprint(scep_app, url_prefix='/scep')
-        app.logger.info('Registered SCEPy service at /scep')
-    except ImportError:
-        app.logger.warning("SCEP will not be available, cannot load SCEPy")
+    register_features(app)
+    profiling.init_app(app)
+    querylog.init_app(app)
+
+    if app.config.get('REQUIRE_CURRENT_SCHEMA', True):
+        from .bootstrap import require_current_schema
+        require_current_schema(app)
 
     # Threads
-    startup_thread.start(app)
-    dep_threads.start(app)
-    # push_threads.start(app)
+    if start_background is None:
+        start_background = app.config.get('START_BACKGROUND_THREADS', True)
+
+    if start_background:
+        worker.start(app)
 
     # SPA Entry Point (when not behind nginx or apache)
     @app.route('/')
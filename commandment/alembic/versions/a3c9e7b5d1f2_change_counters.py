@@ -0,0 +1,43 @@
+"""change counters
+
+Revision ID: a3c9e7b5d1f2
+Revises: e2a8c5d7f9b1
+Create Date: 2026-10-19 12:27:40.902311
+
+"""
+
+# From: http://alembic.zzzcomputing.com/en/latest/cookbook.html#conditional-migration-elements
+
+from alembic import op
+import sqlalchemy as sa
+import commandment.dbtypes
+
+
+from alembic import context
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e7b5d1f2'
+down_revision = 'e2a8c5d7f9b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schema_upgrades()
+
+
+def downgrade():
+    schema_downgrades()
+
+
+def schema_upgrades():
+    change_counters = op.create_table('change_counters',
+                                      sa.Column('name', sa.String(), nullable=False),
+                                      sa.Column('value', sa.BigInteger(), nullable=False),
+                                      sa.PrimaryKeyConstraint('name')
+                                      )
+    op.bulk_insert(change_counters, [{'name': 'devices', 'value': 0}])
+
+
+def schema_downgrades():
+    op.drop_table('change_counters')
@@ -0,0 +1,54 @@
+"""create queued responses
+
+Revision ID: b6d2f4e8a1c3
+Revises: a3c9e7b5d1f2
+Create Date: 2026-10-19 14:02:11.518240
+
+"""
+
+# From: http://alembic.zzzcomputing.com/en/latest/cookbook.html#conditional-migration-elements
+
+from alembic import op
+import sqlalchemy as sa
+import commandment.dbtypes
+
+
+from alembic import context
+
+# revision identifiers, used by Alembic.
+revision = 'b6d2f4e8a1c3'
+down_revision = 'a3c9e7b5d1f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schema_upgrades()
+
+
+def downgrade():
+    schema_downgrades()
+
+
+def schema_upgrades():
+    op.create_table('queued_responses',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('device_id', sa.Integer(), nullable=False),
+                    sa.Column('command_id', sa.Integer(), nullable=False),
+                    sa.Column('request_type', sa.String(), nullable=False),
+                    sa.Column('body', sa.LargeBinary(), nullable=False),
+                    sa.Column('received_at', sa.DateTime(), nullable=False),
+                    sa.Column('claimed_by', sa.String(), nullable=True),
+                    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ),
+                    sa.ForeignKeyConstraint(['command_id'], ['commands.id'], ),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_queued_responses_device_id_request_type', 'queued_responses', ['device_id', 'request_type'],
+                    unique=False)
+
+
+def schema_downgrades():
+    op.drop_index('ix_queued_responses_device_id_request_type', table_name='queued_responses')
+    op.drop_table('queued_responses')
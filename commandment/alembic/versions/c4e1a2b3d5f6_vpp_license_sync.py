@@ -0,0 +1,56 @@
+"""vpp license sync
+
+Revision ID: c4e1a2b3d5f6
+Revises: fa4d91c6aacf
+Create Date: 2026-10-19 09:12:41.207113
+
+"""
+
+# From: http://alembic.zzzcomputing.com/en/latest/cookbook.html#conditional-migration-elements
+
+from alembic import op
+import sqlalchemy as sa
+import commandment.dbtypes
+
+
+from alembic import context
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1a2b3d5f6'
+down_revision = 'fa4d91c6aacf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schema_upgrades()
+
+
+def downgrade():
+    schema_downgrades()
+
+
+def schema_upgrades():
+    op.add_column('vpp_accounts', sa.Column('exp_date', sa.DateTime(), nullable=True))
+    op.add_column('vpp_accounts', sa.Column('org_name', sa.String(), nullable=True))
+    op.add_column('vpp_accounts', sa.Column('location_id', sa.Integer(), nullable=True))
+    op.add_column('vpp_accounts', sa.Column('location_name', sa.String(), nullable=True))
+    op.add_column('vpp_accounts', sa.Column('licenses_synced_at', sa.DateTime(), nullable=True))
+
+    op.add_column('vpp_licenses', sa.Column('serial_number', sa.String(), nullable=True))
+    op.add_column('vpp_licenses', sa.Column('status', sa.String(), nullable=True))
+    op.create_index(op.f('ix_vpp_licenses_adam_id'), 'vpp_licenses', ['adam_id'], unique=False)
+    op.create_index(op.f('ix_vpp_licenses_serial_number'), 'vpp_licenses', ['serial_number'], unique=False)
+
+
+def schema_downgrades():
+    op.drop_index(op.f('ix_vpp_licenses_serial_number'), table_name='vpp_licenses')
+    op.drop_index(op.f('ix_vpp_licenses_adam_id'), table_name='vpp_licenses')
+    op.drop_column('vpp_licenses', 'status')
+    op.drop_column('vpp_licenses', 'serial_number')
+
+    op.drop_column('vpp_accounts', 'licenses_synced_at')
+    op.drop_column('vpp_accounts', 'location_name')
+    op.drop_column('vpp_accounts', 'location_id')
+    op.drop_column('vpp_accounts', 'org_name')
+    op.drop_column('vpp_accounts', 'exp_date')
@@ -0,0 +1,58 @@
+"""create job leases and job runs
+
+Revision ID: c8e1f3a5b7d9
+Revises: b6d2f4e8a1c3
+Create Date: 2026-10-19 15:21:37.104562
+
+"""
+
+# From: http://alembic.zzzcomputing.com/en/latest/cookbook.html#conditional-migration-elements
+
+from alembic import op
+import sqlalchemy as sa
+import commandment.dbtypes
+
+
+from alembic import context
+
+# revision identifiers, used by Alembic.
+revision = 'c8e1f3a5b7d9'
+down_revision = 'b6d2f4e8a1c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schema_upgrades()
+
+
+def downgrade():
+    schema_downgrades()
+
+
+def schema_upgrades():
+    op.create_table('job_leases',
+                    sa.Column('name', sa.String(), nullable=False),
+                    sa.Column('holder', sa.String(), nullable=True),
+                    sa.Column('expires_at', sa.DateTime(), nullable=True),
+                    sa.Column('next_run_at', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('name')
+                    )
+    op.create_table('job_runs',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('name', sa.String(), nullable=False),
+                    sa.Column('holder', sa.String(), nullable=False),
+                    sa.Column('status', sa.Enum('Running', 'Succeeded', 'Failed', name='jobrunstatus'),
+                              nullable=False),
+                    sa.Column('started_at', sa.DateTime(), nullable=False),
+                    sa.Column('finished_at', sa.DateTime(), nullable=True),
+                    sa.Column('error', sa.String(), nullable=True),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_job_runs_name'), 'job_runs', ['name'], unique=False)
+
+
+def schema_downgrades():
+    op.drop_index(op.f('ix_job_runs_name'), table_name='job_runs')
+    op.drop_table('job_runs')
+    op.drop_table('job_leases')
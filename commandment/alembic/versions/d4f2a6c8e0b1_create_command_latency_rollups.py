@@ -0,0 +1,67 @@
+"""create command latency rollups
+
+Revision ID: d4f2a6c8e0b1
+Revises: c8e1f3a5b7d9
+Create Date: 2026-10-19 17:02:44.318205
+
+"""
+
+# From: http://alembic.zzzcomputing.com/en/latest/cookbook.html#conditional-migration-elements
+
+from alembic import op
+import sqlalchemy as sa
+import commandment.dbtypes
+
+
+from alembic import context
+
+# revision identifiers, used by Alembic.
+revision = 'd4f2a6c8e0b1'
+down_revision = 'c8e1f3a5b7d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schema_upgrades()
+
+
+def downgrade():
+    schema_downgrades()
+
+
+def schema_upgrades():
+    op.create_table('command_latency_rollups',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('hour', sa.DateTime(), nullable=False),
+                    sa.Column('metric', sa.Enum('QueuedToSent', 'SentToAcknowledged', name='latencymetric'),
+                              nullable=False),
+                    sa.Column('request_type', sa.String(), nullable=False),
+                    sa.Column('platform', sa.String(), nullable=False),
+                    sa.Column('count', sa.Integer(), nullable=False),
+                    sa.Column('total_seconds', sa.Float(), nullable=False),
+                    sa.Column('max_seconds', sa.Float(), nullable=False),
+                    sa.Column('buckets', commandment.dbtypes.JSONEncodedDict(), nullable=False),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('hour', 'metric', 'request_type', 'platform',
+                                        name='uq_command_latency_rollups_hour_metric_request_type_platform')
+                    )
+    op.create_index(op.f('ix_command_latency_rollups_hour'), 'command_latency_rollups', ['hour'], unique=False)
+    op.create_table('rollup_watermarks',
+                    sa.Column('name', sa.String(), nullable=False),
+                    sa.Column('value', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('name')
+                    )
+
+    # The rollup reads the commands sent or acknowledged since its watermark
+    op.create_index(op.f('ix_commands_sent_at'), 'commands', ['sent_at'], unique=False)
+    op.create_index(op.f('ix_commands_acknowledged_at'), 'commands', ['acknowledged_at'], unique=False)
+
+
+def schema_downgrades():
+    op.drop_index(op.f('ix_commands_acknowledged_at'), table_name='commands')
+    op.drop_index(op.f('ix_commands_sent_at'), table_name='commands')
+
+    op.drop_table('rollup_watermarks')
+    op.drop_index(op.f('ix_command_latency_rollups_hour'), table_name='command_latency_rollups')
+    op.drop_table('command_latency_rollups')
@@ -0,0 +1,40 @@
+"""rsa private key pool
+
+Revision ID: d7f3b9a1c2e4
+Revises: c4e1a2b3d5f6
+Create Date: 2026-10-19 10:03:17.548129
+
+"""
+
+# From: http://alembic.zzzcomputing.com/en/latest/cookbook.html#conditional-migration-elements
+
+from alembic import op
+import sqlalchemy as sa
+import commandment.dbtypes
+
+
+from alembic import context
+
+# revision identifiers, used by Alembic.
+revision = 'd7f3b9a1c2e4'
+down_revision = 'c4e1a2b3d5f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schema_upgrades()
+
+
+def downgrade():
+    schema_downgrades()
+
+
+def schema_upgrades():
+    op.add_column('rsa_private_keys', sa.Column('pooled', sa.Boolean(), nullable=True))
+    op.create_index(op.f('ix_rsa_private_keys_pooled'), 'rsa_private_keys', ['pooled'], unique=False)
+
+
+def schema_downgrades():
+    op.drop_index(op.f('ix_rsa_private_keys_pooled'), table_name='rsa_private_keys')
+    op.drop_column('rsa_private_keys', 'pooled')
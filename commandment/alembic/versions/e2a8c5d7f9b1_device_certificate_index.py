@@ -0,0 +1,38 @@
+"""device certificate index
+
+Revision ID: e2a8c5d7f9b1
+Revises: d7f3b9a1c2e4
+Create Date: 2026-10-19 11:42:05.114520
+
+"""
+
+# From: http://alembic.zzzcomputing.com/en/latest/cookbook.html#conditional-migration-elements
+
+from alembic import op
+import sqlalchemy as sa
+import commandment.dbtypes
+
+
+from alembic import context
+
+# revision identifiers, used by Alembic.
+revision = 'e2a8c5d7f9b1'
+down_revision = 'd7f3b9a1c2e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schema_upgrades()
+
+
+def downgrade():
+    schema_downgrades()
+
+
+def schema_upgrades():
+    op.create_index(op.f('ix_devices_certificate_id'), 'devices', ['certificate_id'], unique=False)
+
+
+def schema_downgrades():
+    op.drop_index(op.f('ix_devices_certificate_id'), table_name='devices')
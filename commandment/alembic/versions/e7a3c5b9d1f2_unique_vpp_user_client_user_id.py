@@ -0,0 +1,32 @@
+"""unique vpp user client user id
+
+Revision ID: e7a3c5b9d1f2
+Revises: d4f2a6c8e0b1
+Create Date: 2026-10-19 21:14:08.529143
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c5b9d1f2'
+down_revision = 'd4f2a6c8e0b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schema_upgrades()
+
+
+def downgrade():
+    schema_downgrades()
+
+
+def schema_upgrades():
+    # vpp_licenses.client_user_id refers to this column, which must be unique to be the parent of a foreign key
+    op.create_index(op.f('ix_vpp_users_client_user_id'), 'vpp_users', ['client_user_id'], unique=True)
+
+
+def schema_downgrades():
+    op.drop_index(op.f('ix_vpp_users_client_user_id'), table_name='vpp_users')
@@ -0,0 +1,61 @@
+"""
+Latency analytics computed from the ``queued_at``, ``sent_at`` and ``acknowledged_at`` timestamps of commands.
+
+Latencies are rolled up per hour, RequestType and platform into histograms with fixed bucket bounds
+(see :data:`BUCKETS`). Histograms with the same bounds can be added together, so a rollup only needs to read the
+commands which changed since the last run, and any range of hours can be summarised by adding their rows before
+estimating percentiles.
+"""
+from bisect import bisect_left
+from enum import Enum
+from typing import List, Optional, Sequence
+
+BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400, 604800)
+"""Tuple[int]: Histogram bucket upper bounds, in seconds. A final bucket holds every greater latency."""
+
+
+class LatencyMetric(Enum):
+    """The interval of a command's lifecycle that a latency was measured over."""
+    QueuedToSent = 'queued_to_sent'
+    SentToAcknowledged = 'sent_to_acknowledged'
+
+
+def bucket_index(seconds: float) -> int:
+    """The index of the histogram bucket which a latency is counted in."""
+    return bisect_left(BUCKETS, seconds)
+
+
+def empty_histogram() -> List[int]:
+    return [0] * (len(BUCKETS) + 1)
+
+
+def add_histograms(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    return [x + y for x, y in zip(a, b)]
+
+
+def percentile(counts: Sequence[int], q: float) -> Optional[float]:
+    """Estimate a percentile from histogram counts, interpolating linearly within the bucket that contains it.
+
+    Args:
+          counts (Sequence[int]): The count of each bucket.
+          q (float): The percentile, between 0 and 1.
+    Returns:
+          Optional[float]: The estimated latency in seconds, None if there are no counts, or the last bound if the
+            percentile is in the final bucket.
+    """
+    total = sum(counts)
+    if total == 0:
+        return None
+
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            if index >= len(BUCKETS):
+                return float(BUCKETS[-1])
+            lower = BUCKETS[index - 1] if index > 0 else 0
+            upper = BUCKETS[index]
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+
+    return float(BUCKETS[-1])
@@ -0,0 +1,108 @@
+"""
+API endpoints which summarise the command latency rollups.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+import dateutil.parser
+from flask import Blueprint, abort, jsonify, request
+
+from commandment.analytics import LatencyMetric, add_histograms, empty_histogram, percentile
+from commandment.analytics.models import CommandLatencyRollup
+from commandment.models import db
+
+analytics_app = Blueprint('analytics_app', __name__)
+
+GROUP_BY = ('metric', 'hour', 'request_type', 'platform')
+"""Tuple[str]: The attributes that rollups may be grouped by."""
+
+PERCENTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+
+def _datetime_arg(name: str, default: datetime) -> datetime:
+    value = request.args.get(name, None)
+    if value is None:
+        return default
+
+    try:
+        return dateutil.parser.parse(value)
+    except (ValueError, OverflowError):
+        return abort(400, 'Invalid {}: {}'.format(name, value))
+
+
+@analytics_app.route('/v1/analytics/command_latency', methods=['GET'])
+def command_latency():
+    """Summarise the latency of commands between being queued and sent, and between being sent and acknowledged.
+
+    Percentiles are estimated from the hourly rollups, which are updated every few minutes by the
+    ``command_latency_rollup`` job.
+
+    :query since: ISO 8601 datetime (utc) of the first hour to include, defaults to 24 hours ago.
+    :query until: ISO 8601 datetime (utc) before which hours are included, defaults to now.
+    :query metric: Only include ``queued_to_sent`` or ``sent_to_acknowledged``.
+    :query request_type: Only include commands of this RequestType.
+    :query platform: Only include devices of this platform, eg. ``iOS``.
+    :query group_by: Comma separated list of ``metric``, ``hour``, ``request_type`` and ``platform``. Defaults to
+        ``metric,request_type,platform``. ``metric`` is always included.
+    :resheader Content-Type: application/json
+    :statuscode 200: OK
+    :statuscode 400: Invalid query parameter
+    """
+    now = datetime.utcnow()
+    until = _datetime_arg('until', now)
+    since = _datetime_arg('since', until - timedelta(hours=24))
+
+    group_by = request.args.get('group_by', 'metric,request_type,platform').split(',')
+    invalid = [g for g in group_by if g not in GROUP_BY]
+    if invalid:
+        return abort(400, 'Invalid group_by: {}'.format(', '.join(invalid)))
+    group_by = [g for g in GROUP_BY if g == 'metric' or g in group_by]
+
+    query = db.session.query(CommandLatencyRollup).filter(
+        CommandLatencyRollup.hour >= since.replace(minute=0, second=0, microsecond=0),
+        CommandLatencyRollup.hour < until,
+    )
+
+    if 'metric' in request.args:
+        try:
+            query = query.filter(CommandLatencyRollup.metric == LatencyMetric(request.args['metric']))
+        except ValueError:
+            return abort(400, 'Invalid metric: {}'.format(request.args['metric']))
+
+    if 'request_type' in request.args:
+        query = query.filter(CommandLatencyRollup.request_type == request.args['request_type'])
+
+    if 'platform' in request.args:
+        query = query.filter(CommandLatencyRollup.platform == request.args['platform'])
+
+    groups: Dict[Tuple, dict] = OrderedDict()
+    for row in query.order_by(CommandLatencyRollup.hour):
+        key = tuple(getattr(row, g) for g in group_by)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'count': 0, 'total': 0.0, 'max': 0.0, 'buckets': empty_histogram()}
+
+        group['count'] += row.count
+        group['total'] += row.total_seconds
+        group['max'] = max(group['max'], row.max_seconds)
+        group['buckets'] = add_histograms(group['buckets'], row.buckets)
+
+    data = []
+    for key, group in groups.items():
+        item = OrderedDict()
+        for name, value in zip(group_by, key):
+            if isinstance(value, LatencyMetric):
+                value = value.value
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            item[name] = value
+
+        item['count'] = group['count']
+        item['mean'] = group['total'] / group['count'] if group['count'] else None
+        for name, q in PERCENTILES:
+            item[name] = percentile(group['buckets'], q)
+        item['max'] = group['max']
+        data.append(item)
+
+    return jsonify({'since': since.isoformat(), 'until': until.isoformat(), 'data': data})
@@ -0,0 +1,50 @@
+from commandment.models import db
+from commandment.dbtypes import JSONEncodedDict
+from commandment.analytics import LatencyMetric
+
+
+class CommandLatencyRollup(db.Model):
+    """A histogram of command latencies for one hour, RequestType, platform and lifecycle interval.
+
+    The hour is that of the timestamp which ends the interval, eg. ``sent_at`` for
+    :attr:`LatencyMetric.QueuedToSent`.
+
+    :table: command_latency_rollups
+    """
+    __tablename__ = 'command_latency_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False, index=True)
+    """hour (datetime.datetime): The start of the hour (utc)."""
+    metric = db.Column(db.Enum(LatencyMetric), nullable=False)
+    """metric (LatencyMetric): The interval that was measured."""
+    request_type = db.Column(db.String, nullable=False)
+    """request_type (str): The command RequestType"""
+    platform = db.Column(db.String, nullable=False)
+    """platform (str): The platform of the device, as a :class:`commandment.mdm.Platform` value."""
+    count = db.Column(db.Integer, nullable=False, default=0)
+    """count (int): The number of commands measured."""
+    total_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    """total_seconds (float): The sum of the latencies, for the mean."""
+    max_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    """max_seconds (float): The greatest latency."""
+    buckets = db.Column(JSONEncodedDict, nullable=False)
+    """buckets (List[int]): The number of latencies in each bucket of :data:`commandment.analytics.BUCKETS`."""
+
+    __table_args__ = (
+        db.UniqueConstraint('hour', 'metric', 'request_type', 'platform',
+                            name='uq_command_latency_rollups_hour_metric_request_type_platform'),
+    )
+
+
+class RollupWatermark(db.Model):
+    """The timestamp up to which a rollup has read its source rows.
+
+    :table: rollup_watermarks
+    """
+    __tablename__ = 'rollup_watermarks'
+
+    name = db.Column(db.String, primary_key=True)
+    """name (str): The rollup name"""
+    value = db.Column(db.DateTime, nullable=False)
+    """value (datetime.datetime): Rows with a timestamp up to and including this value have been rolled up."""
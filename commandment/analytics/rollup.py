@@ -0,0 +1,131 @@
+"""
+Incremental rollup of command latencies into :class:`CommandLatencyRollup` rows.
+
+Each interval has a watermark: the timestamp up to which commands have already been counted. A run only reads commands
+whose end timestamp (``sent_at`` or ``acknowledged_at``) is after the watermark, adds their latencies to the rows for
+their hour, and moves the watermark forward in the same transaction. Commands whose end timestamp is within
+``lag`` seconds of now are left for the next run, so that a transaction which committed late is not skipped.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy.orm import Session
+
+from commandment.analytics import LatencyMetric, bucket_index, empty_histogram, add_histograms
+from commandment.analytics.models import CommandLatencyRollup, RollupWatermark
+from commandment.mdm import CommandStatus
+from commandment.models import db, Command, Device
+
+ROLLUP_LAG = 60
+"""int: Seconds before now after which commands are left for the next run."""
+
+YIELD_PER = 1000
+"""int: Number of commands fetched from the database at a time."""
+
+RollupKey = Tuple[datetime, str, str]
+
+
+class _Accumulator(object):
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self) -> None:
+        self.buckets = empty_histogram()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.buckets[bucket_index(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+def _sources():
+    return [
+        (LatencyMetric.QueuedToSent, Command.queued_at, Command.sent_at, None),
+        (LatencyMetric.SentToAcknowledged, Command.sent_at, Command.acknowledged_at,
+         [CommandStatus.Acknowledged, CommandStatus.Error]),
+    ]
+
+
+def _watermark(session: Session, name: str) -> Optional[RollupWatermark]:
+    return session.query(RollupWatermark).filter(RollupWatermark.name == name).one_or_none()
+
+
+def _merge(session: Session, metric: LatencyMetric, accumulators: Dict[RollupKey, _Accumulator]):
+    for (hour, request_type, platform), acc in accumulators.items():
+        row: CommandLatencyRollup = session.query(CommandLatencyRollup).filter(
+            CommandLatencyRollup.hour == hour,
+            CommandLatencyRollup.metric == metric,
+            CommandLatencyRollup.request_type == request_type,
+            CommandLatencyRollup.platform == platform,
+        ).one_or_none()
+
+        if row is None:
+            session.add(CommandLatencyRollup(
+                hour=hour, metric=metric, request_type=request_type, platform=platform, count=acc.count,
+                total_seconds=acc.total, max_seconds=acc.max, buckets=acc.buckets,
+            ))
+        else:
+            row.count += acc.count
+            row.total_seconds += acc.total
+            row.max_seconds = max(row.max_seconds, acc.max)
+            row.buckets = add_histograms(row.buckets, acc.buckets)
+
+
+def rollup_command_latency(session: Session, now: Optional[datetime] = None, lag: int = ROLLUP_LAG) -> int:
+    """Add the latencies of commands which were sent or acknowledged since the last run to the hourly rollups.
+
+    Args:
+          session (Session): The session to use, which is committed.
+          now (Optional[datetime]): The current time (utc), for testing.
+          lag (int): Seconds before ``now`` after which commands are left for the next run.
+    Returns:
+          int: The number of latencies that were added.
+    """
+    upper = (now or datetime.utcnow()) - timedelta(seconds=lag)
+    added = 0
+
+    for metric, start, end, statuses in _sources():
+        watermark = _watermark(session, metric.value)
+
+        query = session.query(Command.request_type, Device.model_name, start, end).\
+            outerjoin(Device, Device.id == Command.device_id).\
+            filter(start != None, end != None, end <= upper)
+        if watermark is not None:
+            query = query.filter(end > watermark.value)
+        if statuses is not None:
+            query = query.filter(Command.status.in_(statuses))
+
+        accumulators: Dict[RollupKey, _Accumulator] = {}
+        for request_type, model_name, started_at, ended_at in query.yield_per(YIELD_PER):
+            hour = ended_at.replace(minute=0, second=0, microsecond=0)
+            key = (hour, request_type, Device.platform_for_model_name(model_name).value)
+            acc = accumulators.get(key)
+            if acc is None:
+                acc = accumulators[key] = _Accumulator()
+            acc.add(max(0.0, (ended_at - started_at).total_seconds()))
+            added += 1
+
+        _merge(session, metric, accumulators)
+
+        if watermark is None:
+            session.add(RollupWatermark(name=metric.value, value=upper))
+        elif upper > watermark.value:
+            watermark.value = upper
+
+    session.commit()
+    return added
+
+
+def rollup_job(app: Flask):
+    """Run :func:`rollup_command_latency` from the scheduler."""
+    with app.app_context():
+        try:
+            added = rollup_command_latency(db.session, lag=app.config.get('ANALYTICS_ROLLUP_LAG', ROLLUP_LAG))
+            app.logger.info('Rolled up %d command latencies', added)
+        finally:
+            db.session.remove()
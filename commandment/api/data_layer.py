@@ -0,0 +1,121 @@
+"""
+A Flask-REST-JSONAPI data layer that loads the relationships of collections as configured by each resource.
+
+Schemas read every relationship of every object they dump, even if it is only rendered as links, so a lazy
+relationship makes one query per row of a list. List resources set ``eager_load`` in their ``data_layer`` to choose
+how each relationship of the model is loaded:
+
+- ``noload``: not loaded at all. Use this for relationships which are only rendered as links.
+- ``selectin``: loaded for every row of the page by one more query.
+- ``joined``: loaded by joining to the query for the page.
+- ``subquery``: loaded by one more query, which repeats the query for the page as a subquery.
+
+Relationships requested with the ``include`` parameter are always joined, as Flask-REST-JSONAPI does by default.
+
+If ``load_only_fields`` is True, a sparse fieldset for the type of the resource, eg. ``fields[devices]=udid,device_name``,
+also restricts the columns that are selected, with :func:`sqlalchemy.orm.load_only`. Only the columns of the requested
+fields, the primary key, the sort fields and the columns that relationship links are made from are loaded. If a
+requested field is not a column, eg. it is a Python property, every column is loaded.
+
+Example::
+
+    class DeviceList(ResourceList):
+        schema = DeviceSchema
+        data_layer = {
+            'class': EagerLoadingDataLayer,
+            'session': db.session,
+            'model': Device,
+            'eager_load': {'commands': 'noload', 'tags': 'selectin'},
+            'load_only_fields': True,
+        }
+"""
+import re
+from typing import Dict, Optional, Set
+
+from flask_rest_jsonapi.data_layers.alchemy import SqlalchemyDataLayer
+from flask_rest_jsonapi.schema import get_model_field
+from marshmallow_jsonapi.fields import Relationship
+from sqlalchemy import inspect
+from sqlalchemy.orm import ColumnProperty, RelationshipProperty, joinedload, load_only, noload, selectinload, \
+    subqueryload
+
+LOADERS = {
+    'noload': noload,
+    'selectin': selectinload,
+    'joined': joinedload,
+    'subquery': subqueryload,
+}
+
+_view_kwarg_attribute = re.compile(r'^<(\w+)>$')
+
+
+class EagerLoadingDataLayer(SqlalchemyDataLayer):
+    """A SqlalchemyDataLayer which loads relationships of collections as configured by ``eager_load``."""
+
+    eager_load: Dict[str, str] = {}
+    load_only_fields: bool = False
+
+    def __init__(self, kwargs):
+        super(EagerLoadingDataLayer, self).__init__(kwargs)
+
+        for relationship, strategy in self.eager_load.items():
+            if strategy not in LOADERS:
+                raise ValueError('Unknown loading strategy {} for {}.{}, must be one of {}'.format(
+                    strategy, self.model.__name__, relationship, ', '.join(LOADERS.keys())))
+
+    def eagerload_includes(self, query, qs):
+        included = set()
+        for include in qs.include:
+            try:
+                included.add(get_model_field(self.resource.schema, include.split('.')[0]))
+            except Exception:
+                pass  # Reported as an invalid include by the default implementation
+
+        for relationship, strategy in self.eager_load.items():
+            if relationship not in included:
+                query = query.options(LOADERS[strategy](getattr(self.model, relationship)))
+
+        if self.load_only_fields:
+            columns = self.sparse_columns(qs)
+            if columns is not None:
+                query = query.options(load_only(*[getattr(self.model, column) for column in columns]))
+
+        return super(EagerLoadingDataLayer, self).eagerload_includes(query, qs)
+
+    def sparse_columns(self, qs) -> Optional[Set[str]]:
+        """The column attributes of the model needed to dump the sparse fieldset requested for this resource, or None
+        if there is no sparse fieldset or it cannot be limited to columns."""
+        schema = self.resource.schema
+        if schema.Meta.type_ not in qs.fields:
+            return None
+
+        mapper = inspect(self.model)
+        columns = {mapper.get_property_by_column(column).key for column in mapper.primary_key}
+
+        def add_view_kwargs(view_kwargs: Optional[dict]):
+            for value in (view_kwargs or {}).values():
+                match = _view_kwarg_attribute.match(str(value))
+                if match:
+                    columns.add(match.group(1))
+
+        add_view_kwargs(getattr(schema.Meta, 'self_view_kwargs', None))
+        columns.update(sort['field'] for sort in qs.sorting)  # Keyset pages read the sort value of the last row
+
+        for name in qs.fields[schema.Meta.type_]:
+            field = schema._declared_fields[name]
+            attribute = field.attribute or name
+            prop = mapper.attrs.get(attribute)
+
+            if isinstance(field, Relationship):
+                add_view_kwargs(getattr(field, 'self_view_kwargs', None))
+                add_view_kwargs(getattr(field, 'related_view_kwargs', None))
+                if isinstance(prop, RelationshipProperty):  # The foreign keys of many to one relationships
+                    columns.update(mapper.get_property_by_column(column).key for column in prop.local_columns
+                                   if column.table is mapper.local_table)
+            elif isinstance(prop, ColumnProperty):
+                columns.add(attribute)
+            else:
+                return None
+
+        # Only attributes which are columns, eg. <id> may be a view kwarg read from a property
+        return {column for column in columns if isinstance(mapper.attrs.get(column), ColumnProperty)}
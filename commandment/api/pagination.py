@@ -0,0 +1,229 @@
+"""
+Keyset (cursor) pagination for JSON:API lists of large collections.
+
+Flask-REST-JSONAPI pages with ``page[number]``, which makes the database count the whole collection for every page
+and skip every row before the page, so deep pages of a large fleet get slower and slower. Resources derived from
+:class:`KeysetResourceList` also accept ``page[after]``, which selects keyset pagination instead:
+
+- The rows are ordered by the sort field, which must be one of the ``keyset_sort`` fields of the data layer, and then
+  by id. The default is to sort by id only. Rows whose sort value is NULL are last in ascending order, and first in
+  descending order, which is the exact reverse.
+- ``page[after]`` is the cursor of the last row of the previous page, or empty for the first page. The cursor of the
+  next page is in the ``next`` link, which is absent on the last page.
+- The collection is not counted, unless ``page[totals]`` is ``exact``, or ``approximate`` to use the row count
+  estimated by PostgreSQL or MySQL for unfiltered lists. ``meta.approximate`` is true if the count is an estimate.
+
+Example::
+
+    GET /api/v1/devices?sort=-serial_number&page[size]=100&page[after]=
+    GET /api/v1/devices?sort=-serial_number&page[size]=100&page[after]=WyJDMDJYMTIzNEFCQ0QiLCA0Ml0=
+"""
+import base64
+import datetime
+import enum
+import json
+from typing import Any, List, Optional, Tuple
+
+from flask import current_app, request, url_for
+from flask_rest_jsonapi import ResourceList
+from flask_rest_jsonapi.exceptions import BadRequest
+from flask_rest_jsonapi.querystring import QueryStringManager
+from flask_rest_jsonapi.schema import compute_schema
+from six.moves.urllib.parse import urlencode
+from sqlalchemy import and_, or_, inspect, text, DateTime, Enum
+from sqlalchemy.orm import Query
+from werkzeug.datastructures import MultiDict
+
+from commandment.api.data_layer import EagerLoadingDataLayer
+
+KEYSET_PARAMETERS = ('page[after]', 'page[totals]')
+"""Tuple[str]: Query string parameters handled by keyset pagination, which Flask-REST-JSONAPI would reject."""
+
+
+def encode_cursor(value: Any, id_: int) -> str:
+    """Encode the sort value and id of the last row of a page as an opaque cursor."""
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    elif isinstance(value, enum.Enum):
+        value = value.value
+
+    return base64.urlsafe_b64encode(json.dumps([value, id_]).encode('utf8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, column) -> Tuple[Any, int]:
+    """Decode a cursor made by :func:`encode_cursor`, converting the sort value back to the type of ``column``.
+
+    Raises:
+          BadRequest: If the cursor was not made by :func:`encode_cursor`.
+    """
+    try:
+        value, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf8'))
+        if value is not None:
+            if isinstance(column.type, DateTime):
+                value = datetime.datetime.fromisoformat(value)
+            elif isinstance(column.type, Enum) and column.type.enum_class is not None:
+                value = column.type.enum_class(value)
+        return value, int(id_)
+    except (ValueError, TypeError, UnicodeError):
+        raise BadRequest('Invalid cursor', source={'parameter': 'page[after]'})
+
+
+def estimated_count(session, model) -> Optional[int]:
+    """The number of rows in the table of ``model`` estimated by the database statistics, or None if the database does
+    not keep an estimate."""
+    dialect = session.get_bind().dialect.name
+    table = model.__table__.name
+
+    if dialect == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = :table'
+    elif dialect == 'mysql':
+        sql = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :table'
+    else:
+        return None
+
+    count = session.execute(text(sql), {'table': table}).scalar()
+    return int(count) if count is not None and count >= 0 else None
+
+
+class KeysetDataLayer(EagerLoadingDataLayer):
+    """An EagerLoadingDataLayer which can also fetch pages after a cursor.
+
+    The ``keyset_sort`` kwarg lists the attributes of the model which keyset pages may be sorted by. They should be
+    indexed, together with the id if possible, for pages to be fetched in constant time.
+    """
+
+    keyset_sort: List[str] = ['id']
+
+    def _keyset_order(self, qs: QueryStringManager):
+        sorting = qs.sorting
+        if not sorting:
+            return None, False
+
+        if len(sorting) > 1 or sorting[0]['field'] not in self.keyset_sort:
+            raise BadRequest('Pages after a cursor can only be sorted by one of: {}'.format(', '.join(self.keyset_sort)),
+                             source={'parameter': 'sort'})
+
+        return getattr(self.model, sorting[0]['field']), sorting[0]['order'] == 'desc'
+
+    def get_keyset_collection(self, qs: QueryStringManager, after: str, totals: str,
+                              view_kwargs: dict) -> Tuple[Optional[int], bool, list, Optional[str]]:
+        """Retrieve the page of objects after a cursor.
+
+        Returns:
+              Tuple[Optional[int], bool, list, Optional[str]]: The number of objects if ``totals`` is exact or
+                approximate, whether that number is an estimate, the page of objects, and the cursor of the next page
+                or None if this is the last page.
+        """
+        self.before_get_collection(qs, view_kwargs)
+
+        query: Query = self.query(view_kwargs)
+        if qs.filters:
+            query = self.filter_query(query, qs.filters, self.model)
+
+        count, approximate = None, False
+        if totals == 'approximate' and not qs.filters and not view_kwargs:
+            count = estimated_count(self.session, self.model)
+            approximate = count is not None
+        if totals in ('approximate', 'exact') and count is None:
+            count = query.count()
+
+        id_column = getattr(self.model, inspect(self.model).primary_key[0].key)
+        column, descending = self._keyset_order(qs)
+
+        if after:
+            if column is None:
+                _, last_id = decode_cursor(after, id_column)
+                query = query.filter(id_column > last_id)
+            else:
+                query = query.filter(self._after(column, descending, *decode_cursor(after, column.property.columns[0]),
+                                                 id_column=id_column))
+
+        if column is None:
+            query = query.order_by(id_column)
+        elif not column.property.columns[0].nullable:
+            query = query.order_by(column.desc() if descending else column, id_column.desc() if descending else id_column)
+        elif descending:  # NULLs first, so that the order is exactly the reverse of ascending
+            query = query.order_by(column.is_(None).desc(), column.desc(), id_column.desc())
+        else:
+            query = query.order_by(column.is_(None), column, id_column)
+
+        query = self.eagerload_includes(query, qs)
+
+        page_size = int(qs.pagination.get('size', 0)) or current_app.config['PAGE_SIZE']
+        objects = query.limit(page_size + 1).all()
+
+        next_cursor = None
+        if len(objects) > page_size:
+            objects = objects[:page_size]
+            last = objects[-1]
+            next_cursor = encode_cursor(getattr(last, column.key) if column is not None else None,
+                                        getattr(last, id_column.key))
+
+        objects = self.after_get_collection(objects, qs, view_kwargs)
+        return count, approximate, objects, next_cursor
+
+    @staticmethod
+    def _after(column, descending: bool, value: Any, last_id: int, id_column):
+        """The filter for rows after (value, last_id) in the order of (column, id), where NULLs are last ascending and
+        first descending."""
+        nullable = column.property.columns[0].nullable
+
+        if value is None:
+            if descending:
+                return or_(and_(column.is_(None), id_column < last_id), column.isnot(None))
+            return and_(column.is_(None), id_column > last_id)
+
+        if descending:
+            return or_(column < value, and_(column == value, id_column < last_id))
+
+        after = or_(column > value, and_(column == value, id_column > last_id))
+        return or_(after, column.is_(None)) if nullable else after
+
+
+class KeysetResourceList(ResourceList):
+    """A ResourceList which pages with ``page[after]`` if it is given, and with ``page[number]`` otherwise.
+
+    The data layer must be a :class:`KeysetDataLayer`.
+    """
+
+    def get(self, *args, **kwargs):
+        if 'page[after]' not in request.args:
+            return super(KeysetResourceList, self).get(*args, **kwargs)
+
+        self.before_get(args, kwargs)
+
+        after = request.args['page[after]']
+        totals = request.args.get('page[totals]', 'none')
+        if totals not in ('none', 'approximate', 'exact'):
+            raise BadRequest('page[totals] must be none, approximate or exact', source={'parameter': 'page[totals]'})
+
+        qs = QueryStringManager(MultiDict([(key, value) for key, value in request.args.items(multi=True)
+                                           if key not in KEYSET_PARAMETERS]), self.schema)
+        if qs.pagination.get('number') or qs.pagination.get('size') == '0':
+            raise BadRequest('page[after] cannot be combined with page[number] or page[size]=0',
+                             source={'parameter': 'page'})
+
+        count, approximate, objects, next_cursor = self._data_layer.get_keyset_collection(qs, after, totals, kwargs)
+
+        schema_kwargs = getattr(self, 'get_schema_kwargs', dict())
+        schema_kwargs.update({'many': True})
+        schema = compute_schema(self.schema, schema_kwargs, qs, qs.include)
+        result = schema.dump(objects).data
+
+        view_kwargs = request.view_args if getattr(self, 'view_kwargs', None) is True else dict()
+        base_url = url_for(self.view, _external=True, **view_kwargs)
+        qs_args = qs.querystring
+        qs_args.update({key: request.args[key] for key in KEYSET_PARAMETERS if key in request.args})
+
+        result['links'] = {
+            'self': base_url + '?' + urlencode(qs_args),
+            'first': base_url + '?' + urlencode(dict(qs_args, **{'page[after]': ''})),
+        }
+        if next_cursor is not None:
+            result['links']['next'] = base_url + '?' + urlencode(dict(qs_args, **{'page[after]': next_cursor}))
+
+        if count is not None:
+            result['meta'] = {'count': count, 'approximate': approximate}
+
+        self.after_get(result)
+        return result
@@ -11,13 +11,29 @@ from commandment.pki.models import Certificate, CertificateSigningRequest, SSLCe
     CACertificate
 
 from commandment.mdm import commands as mdmcommands, CommandType
+from commandment.api.data_layer import EagerLoadingDataLayer
+from commandment.api.pagination import KeysetDataLayer, KeysetResourceList
 
 from flask_rest_jsonapi import ResourceDetail, ResourceList, ResourceRelationship
 
 
-class DeviceList(ResourceList):
+class DeviceList(KeysetResourceList):
     schema = DeviceSchema
-    data_layer = {'session': db.session, 'model': Device}
+    data_layer = {
+        'class': KeysetDataLayer,
+        'session': db.session,
+        'model': Device,
+        'keyset_sort': ['id', 'udid', 'serial_number'],
+        'eager_load': {
+            'commands': 'noload',
+            'installed_certificates': 'noload',
+            'installed_applications': 'noload',
+            'tags': 'noload',
+            'available_os_updates': 'noload',
+            'dep_profile': 'noload',
+        },
+        'load_only_fields': True,
+    }
 
 
 class DeviceDetail(ResourceDetail):
@@ -158,8 +174,10 @@ class OrganizationDetail(ResourceDetail):
 class TagsList(ResourceList):
     schema = TagSchema
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
-        'model': Tag
+        'model': Tag,
+        'eager_load': {'devices': 'noload'},
     }
     view_kwargs = True
 
@@ -14,6 +14,7 @@ from cryptography.hazmat.backends import default_backend
 from oscrypto.keys import parse_pkcs12
 from flask import g, current_app
 from commandment.models import Device
+from commandment.metrics import apns_pushes
 import json
 
 
@@ -101,6 +102,7 @@ def push_to_device(device: Device) -> apns2.Response:
     payload = MDMPayload(device.push_magic)
     notification = apns2.Notification(payload, priority=apns2.PRIORITY_LOW)
     response: apns2.response.Response = client.push(notification, device.hex_token, device.topic)
+    apns_pushes.inc(str(response.status_code))
 
     # 410 means that the token is no longer valid for this device, so don't attempt to push any more
     if response.status_code == 410:
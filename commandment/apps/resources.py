@@ -1,6 +1,7 @@
 from sqlalchemy.orm.exc import NoResultFound
 from flask_rest_jsonapi import ResourceDetail, ResourceList, ResourceRelationship
 from flask_rest_jsonapi.exceptions import ObjectNotFound
+from commandment.api.data_layer import EagerLoadingDataLayer
 from commandment.apps.schema import ApplicationManifestSchema, ApplicationSchema, ManagedApplicationSchema
 from commandment.apps.models import db, ApplicationManifest, Application, ManagedApplication, AppstoreMacApplication, \
     AppstoreiOSApplication, EnterpriseMacApplication, EnterpriseiOSApplication
@@ -27,9 +28,11 @@ class ApplicationDetail(ResourceDetail):
 class ApplicationList(ResourceList):
     schema = ApplicationSchema
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': Application,
-        'url_field': 'application_id'
+        'url_field': 'application_id',
+        'eager_load': {'tags': 'noload'},
     }
 
 
@@ -54,9 +57,11 @@ class MASApplicationDetail(ResourceDetail):
 class MASApplicationList(ResourceList):
     schema = ApplicationSchema
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': AppstoreMacApplication,
-        'url_field': 'application_id'
+        'url_field': 'application_id',
+        'eager_load': {'tags': 'noload'},
     }
 
 
@@ -72,18 +77,22 @@ class IOSApplicationDetail(ResourceDetail):
 class IOSApplicationList(ResourceList):
     schema = ApplicationSchema
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': AppstoreiOSApplication,
-        'url_field': 'application_id'
+        'url_field': 'application_id',
+        'eager_load': {'tags': 'noload'},
     }
 
 
 class EnterpriseMacApplicationList(ResourceList):
     schema = ApplicationSchema
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': EnterpriseMacApplication,
-        'url_field': 'application_id'
+        'url_field': 'application_id',
+        'eager_load': {'tags': 'noload'},
     }
 
 
@@ -99,9 +108,11 @@ class EnterpriseMacApplicationDetail(ResourceDetail):
 class EnterpriseIosApplicationList(ResourceList):
     schema = ApplicationSchema
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': EnterpriseiOSApplication,
-        'url_field': 'application_id'
+        'url_field': 'application_id',
+        'eager_load': {'tags': 'noload'},
     }
 
 
@@ -138,10 +149,12 @@ class ManagedApplicationList(ResourceList):
 
     schema = ManagedApplicationSchema
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': ManagedApplication,
         'url_field': 'managed_application_id',
         'methods': {'query': query},
+        'eager_load': {'device': 'noload'},
     }
 
 
@@ -0,0 +1,191 @@
+"""
+One-shot setup of a Commandment installation, run with ``commandment bootstrap`` before the app is started:
+
+- Run the database migrations.
+- Generate the internal CA certificate, for sandbox setups.
+- Split up a PKCS#12 push certificate into PEM files.
+
+Every step does nothing if it has already been done, so bootstrap can run on every deploy. Concurrent runs, eg. from
+several containers started at once, are serialised by a database advisory lock.
+
+Until bootstrap has migrated the database to the latest revision, the app refuses requests with 503 Service
+Unavailable (see :func:`require_current_schema`), rather than serving them from a schema the code does not expect.
+"""
+import logging
+import os
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Set
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from flask import Flask, Response
+from flask_alembic import Alembic
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from commandment.models import db
+from commandment.pki.ca import get_ca
+
+BOOTSTRAP_LOCK = 'commandment.bootstrap'
+"""str: The name of the advisory lock held while bootstrapping."""
+
+logger = logging.getLogger('bootstrap')
+
+
+def generate_ca(app: Flask):
+    """Generate internal CA certificate for sandbox setups."""
+    with app.app_context():
+        app.logger.info('Generating Internal CA if necessary...')
+        get_ca()  # Implicit creation of `certificate_authority` row and certificates
+
+
+def split_pkcs12(app: Flask):
+    """Split up .p12 containers if necessary."""
+    with app.app_context():
+        if 'PUSH_CERTIFICATE' not in app.config:
+            app.logger.warn('No push certificate specified, you will not be able to manage devices until this is configured')
+            return
+
+        push_certificate_path = app.config['PUSH_CERTIFICATE']
+        if not os.path.exists(push_certificate_path):
+            raise RuntimeError('You specified a push certificate at: {}, but it does not exist.'.format(push_certificate_path))
+
+        # We can handle loading PKCS#12 but APNS2Client specifically requests PEM encoded certificates
+        from oscrypto.keys import parse_pkcs12
+
+        push_certificate_basename, ext = os.path.splitext(push_certificate_path)
+        if ext.lower() == '.p12':
+            pem_key_path = push_certificate_basename + '.key'
+            pem_certificate_path = push_certificate_basename + '.crt'
+
+            if not os.path.exists(pem_key_path) or not os.path.exists(pem_certificate_path):
+                app.logger.info('You provided a PKCS#12 push certificate, we will have to encode it as PEM to continue...')
+                app.logger.info('.key and .crt files will be saved in the same location: %s, %s', pem_key_path, pem_certificate_path)
+                with open(push_certificate_path, 'rb') as fd:
+                    if 'PUSH_CERTIFICATE_PASSWORD' in app.config:
+                        key, certificate, intermediates = parse_pkcs12(fd.read(), bytes(app.config['PUSH_CERTIFICATE_PASSWORD'], 'utf8'))
+                    else:
+                        key, certificate, intermediates = parse_pkcs12(fd.read())
+
+                try:
+                    crypto_key = serialization.load_der_private_key(key.dump(), None, default_backend())
+                    with open(pem_key_path, 'wb') as fd:
+                        fd.write(crypto_key.private_bytes(
+                            encoding=serialization.Encoding.PEM,
+                            format=serialization.PrivateFormat.PKCS8,
+                            encryption_algorithm=serialization.NoEncryption()))
+
+                    crypto_cert = x509.load_der_x509_certificate(certificate.dump(), default_backend())
+                    with open(pem_certificate_path, 'wb') as fd:
+                        fd.write(crypto_cert.public_bytes(serialization.Encoding.PEM))
+                except PermissionError:
+                    app.logger.error('Could not write out .key or .crt file. You will not be able to push APNS messages')
+                    app.logger.error('This means your MDM is BROKEN until you fix permissions')
+            else:
+                app.logger.info('.p12 already split into PEM/KEY components')
+
+
+def run_migrations(app: Flask):
+    """Run the database migrations."""
+    with app.app_context():
+        app.logger.info('Running Alembic Migrations')
+        alembic = Alembic()
+        alembic.init_app(app, run_mkdir=False)
+        alembic.upgrade('head')
+
+
+class BootstrapError(Exception):
+    """Raised if bootstrap could not take the advisory lock."""
+    pass
+
+
+@contextmanager
+def advisory_lock(connection: Connection, name: str = BOOTSTRAP_LOCK, timeout: int = 600):
+    """Hold a database advisory lock, which is released when the connection is closed if the process dies.
+
+    PostgreSQL and MySQL support advisory locks. Other databases, eg. SQLite, are used by a single host, and bootstrap
+    proceeds without a lock.
+
+    Raises:
+          BootstrapError: If MySQL could not take the lock within ``timeout`` seconds.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        key = zlib.crc32(name.encode('utf8'))
+        connection.execute(text('SELECT pg_advisory_lock(:key)'), key=key)
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(:key)'), key=key)
+    elif dialect == 'mysql':
+        acquired = connection.execute(text('SELECT GET_LOCK(:name, :timeout)'), name=name, timeout=timeout).scalar()
+        if acquired != 1:
+            raise BootstrapError('Could not take the bootstrap lock within {} second(s)'.format(timeout))
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT RELEASE_LOCK(:name)'), name=name)
+    else:
+        logger.info('The %s database does not support advisory locks, bootstrapping without a lock', dialect)
+        yield
+
+
+def bootstrap(app: Flask):
+    """Run every bootstrap step while holding the bootstrap lock."""
+    with app.app_context():
+        connection = db.engine.connect()
+        try:
+            with advisory_lock(connection, timeout=app.config.get('BOOTSTRAP_LOCK_TIMEOUT', 600)):
+                logger.info('Bootstrapping')
+                run_migrations(app)
+                generate_ca(app)
+                split_pkcs12(app)
+        finally:
+            connection.close()
+
+
+def _revisions(alembic: Alembic, current: bool) -> Set[str]:
+    revisions = alembic.current() if current else alembic.heads()
+    return {revision.revision for revision in revisions}
+
+
+def schema_is_current(app: Flask) -> bool:
+    """Whether the database has been migrated to the latest revision."""
+    alembic = app.extensions.get('alembic')
+    if alembic is None:
+        alembic = Alembic()
+        alembic.init_app(app, run_mkdir=False)
+
+    return _revisions(alembic, True) == _revisions(alembic, False)
+
+
+def require_current_schema(app: Flask):
+    """Refuse requests with 503 Service Unavailable until the database has been migrated to the latest revision.
+
+    The revision is checked at most once every ``SCHEMA_CHECK_INTERVAL`` seconds, and no longer once it matches.
+    """
+    interval = app.config.get('SCHEMA_CHECK_INTERVAL', 5)
+    state = {'ready': False, 'checked_at': None}
+
+    @app.before_request
+    def check_schema():
+        if state['ready']:
+            return None
+
+        now = time.monotonic()
+        if state['checked_at'] is None or now - state['checked_at'] >= interval:
+            state['checked_at'] = now
+            try:
+                state['ready'] = schema_is_current(app)
+            except Exception as e:
+                app.logger.warning('Could not read the database schema revision: %s', e)
+
+            if state['ready']:
+                app.logger.info('Database schema is current, accepting requests')
+                return None
+
+        return Response('The database has not been migrated, run commandment bootstrap', status=503,
+                        headers={'Retry-After': str(interval)}, mimetype='text/plain')
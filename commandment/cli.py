@@ -4,7 +4,10 @@ Copyright (c) 2015 Jesse Peterson, 2017 Mosen
 Licensed under the MIT license. See the included LICENSE.txt file for details.
 """
 
+import argparse
+import logging
 import os
+from typing import Optional
 from commandment import create_app
 from commandment.pki.ssl import generate_self_signed_certificate
 from cryptography.hazmat.primitives import serialization
@@ -12,10 +15,29 @@ from cryptography.hazmat.primitives import serialization
 from commandment.apns.push import get_apns
 
 
-def server():
-    """Run server in standalone development mode."""
-    
-    app = create_app(os.environ['COMMANDMENT_SETTINGS'])
+def bootstrap(config: Optional[str] = None):
+    """Migrate the database and create the certificates needed before the app can start. Safe to run repeatedly."""
+    from commandment.bootstrap import bootstrap as run_bootstrap
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_app(config or os.environ['COMMANDMENT_SETTINGS'], start_background=False)
+    run_bootstrap(app)
+
+
+def server(config: Optional[str] = None):
+    """Run server in standalone development mode, bootstrapping first."""
+    from commandment import worker
+    from commandment.bootstrap import BootstrapError, bootstrap as run_bootstrap
+
+    # The background threads poll tables which bootstrap creates, so they are started after it
+    app = create_app(config or os.environ['COMMANDMENT_SETTINGS'], start_background=False)
+    try:
+        run_bootstrap(app)
+    except (RuntimeError, BootstrapError) as e:
+        app.logger.error('Bootstrap did not complete: %s', e)
+
+    if app.config.get('START_BACKGROUND_THREADS', True):
+        worker.start(app)
 
     # Werkzeug, in debug mode, will launch the app using the debug file-system
     # watching auto-reloader. For threads this means that there would be two
@@ -69,3 +91,24 @@ def server():
         port=app.config.get('PORT'),
         ssl_context=(cert_path, key_path),
         threaded=True)
+
+
+def main(argv: Optional[list] = None):
+    """Entry point for the ``commandment`` command. Runs the development server if no command is given."""
+    parser = argparse.ArgumentParser(description='Commandment MDM server.')
+    parser.add_argument('--config', default=os.environ.get('COMMANDMENT_SETTINGS'),
+                        help='path to the settings file, defaults to the COMMANDMENT_SETTINGS environment variable')
+    parser.add_argument('command', nargs='?', choices=['serve', 'bootstrap'], default='serve')
+    args = parser.parse_args(argv)
+
+    if args.config is None:
+        parser.error('No settings file, use --config or set COMMANDMENT_SETTINGS')
+
+    if args.command == 'bootstrap':
+        bootstrap(args.config)
+    else:
+        server(args.config)
+
+
+if __name__ == '__main__':
+    main()
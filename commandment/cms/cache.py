@@ -0,0 +1,95 @@
+"""
+LRU cache of parsed signer certificates.
+
+A device signs every check-in and every command response with the same identity certificate, so the certificate, its
+public key and the result of checking its validity period are kept between requests, keyed by the SHA-256 digest of the
+DER encoded certificate.
+"""
+import datetime
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+
+logger = logging.getLogger(__name__)
+
+
+class SignerCertificate(NamedTuple):
+    """A parsed signer certificate.
+
+    Attributes:
+          certificate (x509.Certificate): The certificate.
+          public_key: The public key of the certificate.
+          valid (bool): Whether the certificate was within its validity period when it was first seen.
+    """
+    certificate: x509.Certificate
+    public_key: object
+    valid: bool
+
+
+class SignerCertificateCache(object):
+    """Bounded, thread-safe LRU of :class:`SignerCertificate`.
+
+    Args:
+          maxsize (int): Maximum number of certificates to keep. 0 disables caching.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, der: bytes) -> SignerCertificate:
+        """Get the parsed certificate for the DER encoded certificate, parsing it if it has not been seen recently."""
+        key = hashlib.sha256(der).digest()
+
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+
+        entry = _parse(der)
+        if self.maxsize <= 0:
+            return entry
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return entry
+
+
+def _parse(der: bytes) -> SignerCertificate:
+    certificate = x509.load_der_x509_certificate(der, default_backend())
+    now = datetime.datetime.utcnow()
+    valid = certificate.not_valid_before <= now <= certificate.not_valid_after
+    if not valid:
+        logger.warning('Signer certificate is outside of its validity period: %s, serial: %d',
+                       certificate.subject.rfc4514_string(), certificate.serial_number)
+
+    return SignerCertificate(certificate, certificate.public_key(), valid)
+
+
+signer_certificate_cache = SignerCertificateCache()
+"""SignerCertificateCache: The cache used to verify CMS signers."""
@@ -1,4 +1,4 @@
-from typing import List, Tuple
+from typing import IO, List, Tuple, Union
 
 from asn1crypto.cms import CMSAttribute
 from cryptography.exceptions import InvalidSignature
@@ -7,12 +7,37 @@ from functools import wraps
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
 from asn1crypto import cms
 from base64 import b64decode, b64encode
 from . import _certificate_by_signer_identifier, _cryptography_hash_function, _cryptography_pad_function
+from .cache import signer_certificate_cache
+from commandment.decorators import request_body
 
+CHUNK_SIZE = 64 * 1024
 
-def _verify_cms_signers(signed_data: bytes, detached: bool = False) -> Tuple[List[x509.Certificate], bytes]:
+
+def _digest(hash_function, data: Union[bytes, IO[bytes]]) -> bytes:
+    """Hash the signed content, reading it in chunks if it is a file."""
+    h = hashes.Hash(hash_function(), default_backend())
+    if isinstance(data, bytes):
+        h.update(data)
+    else:
+        data.seek(0)
+        for chunk in iter(lambda: data.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+        data.seek(0)
+
+    return h.finalize()
+
+
+def _verify_cms_signers(signed_data: bytes,
+                        detached: bool = False) -> Tuple[List[x509.Certificate], Union[bytes, IO[bytes]]]:
+    """Verify every signer of a CMS SignedData structure.
+
+    If the signature is detached, the signed content is the request body, which is hashed from the spooled body
+    file (see :func:`commandment.decorators.request_body`) and returned as that file.
+    """
     ci = cms.ContentInfo.load(signed_data)
     assert ci['content_type'].native == 'signed_data'
     signed: cms.SignedData = ci['content']
@@ -23,7 +48,8 @@ def _verify_cms_signers(signed_data: bytes, detached: bool = False) -> Tuple[Lis
     for signer in signed['signer_infos']:
         asn_certificate = _certificate_by_signer_identifier(signed['certificates'], signer['sid'])
         assert asn_certificate is not None
-        certificate = x509.load_der_x509_certificate(asn_certificate.dump(), default_backend())
+        signer_certificate = signer_certificate_cache.get(asn_certificate.dump())
+        certificate = signer_certificate.certificate
 
         digest_algorithm = signer['digest_algorithm']
         signature_algorithm = signer['signature_algorithm']
@@ -39,29 +65,38 @@ def _verify_cms_signers(signed_data: bytes, detached: bool = False) -> Tuple[Lis
         assert signed['encap_content_info']['content_type'].native == 'data'
 
         if detached:
-            data = request.data
+            data = request_body()
         else:
             data = signed['encap_content_info']['content'].native
 
+        digest = _digest(hash_function, data)
+
         if 'signed_attrs' in signer and len(signer['signed_attrs']) > 0:
+            message_digest = None
             for i in range(0, len(signer['signed_attrs'])):
                 signed_attr: CMSAttribute = signer['signed_attrs'][i]
 
                 if signed_attr['type'].native == "message_digest":
-                    current_app.logger.debug("SignerInfo digest: %s", b64encode(signed_attr['values'][0].native))
+                    message_digest = signed_attr['values'][0].native
+                    current_app.logger.debug("SignerInfo digest: %s", b64encode(message_digest))
 
-            certificate.public_key().verify(
+            if message_digest != digest:
+                raise InvalidSignature('Message digest does not match the signed content')
+
+            # The signature covers the attributes encoded as a SET OF, not with the [0] IMPLICIT tag of SignerInfo.
+            signed_attrs = signer['signed_attrs'].dump()
+            signer_certificate.public_key.verify(
                 signer['signature'].native,
-                signer['signed_attrs'].dump(),
+                b'\x31' + signed_attrs[1:],
                 pad_function(),
                 hash_function()
             )
         else:  # No signed attributes means we are only validating the digest
-            certificate.public_key().verify(
+            signer_certificate.public_key.verify(
                 signer['signature'].native,
-                data,
+                digest,
                 pad_function(),
-                hash_function()
+                Prehashed(hash_function())
             )
 
         signers.append(certificate)
@@ -69,7 +104,7 @@ def _verify_cms_signers(signed_data: bytes, detached: bool = False) -> Tuple[Lis
     # TODO: Don't assume that content is OctetString
 
     if detached:
-        return signers, request.data
+        return signers, request_body()
     else:
         return signers, signed['encap_content_info']['content'].native
 
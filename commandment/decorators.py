@@ -1,28 +1,72 @@
 from functools import wraps
+from typing import IO
 
 from flask import request, abort, current_app, g
 from cryptography import x509
 from cryptography.exceptions import UnsupportedAlgorithm
 from cryptography.hazmat.backends import default_backend
 
-import plistlib
+
+from commandment.plistutil import streaming
+
+DEBUG_BODY_PREFIX = 4096
+"""int: Number of bytes of a plist request body that are logged in debug mode."""
+
+REQUEST_BODY_ENVIRON_KEY = 'commandment.request_body'
+"""str: The WSGI environ key of the spooled request body."""
+
+STREAMED_ARRAYS = ('InstalledApplicationList', 'CertificateList', 'ProfileList')
+"""Tuple[str]: The top level arrays of command responses which are passed to their handlers as
+:class:`commandment.plistutil.streaming.StreamedArray` instead of lists."""
+
+
+def request_body() -> IO[bytes]:
+    """Get the body of the current request as a file, positioned at the start.
+
+    The body is read from the request stream once and spooled to a temporary file, which is kept in memory up to
+    MDM_BODY_SPOOL_SIZE bytes.
+
+    :status 413: If the body is larger than MDM_MAX_BODY_SIZE bytes.
+    """
+    body = request.environ.get(REQUEST_BODY_ENVIRON_KEY, None)
+    if body is None:
+        max_size = current_app.config.get('MDM_MAX_BODY_SIZE', None)
+        if max_size is not None and request.content_length is not None and request.content_length > max_size:
+            abort(413)
+
+        try:
+            body = streaming.spool(request.stream, max_size=max_size,
+                                   memory_size=current_app.config.get('MDM_BODY_SPOOL_SIZE', 256 * 1024))
+        except streaming.BodyTooLarge:
+            abort(413)
+
+        request.environ[REQUEST_BODY_ENVIRON_KEY] = body
+
+    body.seek(0)
+    return body
 
 
 def parse_plist_input_data(f):
     """Parses plist data as HTTP input from request.
 
-    The unserialized data is attached to the global **g** object as **g.plist_data**.
+    The unserialized data is attached to the global **g** object as **g.plist_data**. The body is parsed incrementally
+    from the file returned by :func:`request_body`, so that it is never held in memory as a whole. The arrays in
+    :data:`STREAMED_ARRAYS` are skipped, and their items are parsed again from the file when they are iterated.
 
     :status 400: If invalid plist data was supplied in the request.
+    :status 413: If the body is larger than MDM_MAX_BODY_SIZE bytes.
     """
 
     @wraps(f)
     def decorator(*args, **kwargs):
+        body = request_body()
+        if current_app.debug:
+            current_app.logger.debug(body.read(DEBUG_BODY_PREFIX))
+            body.seek(0)
+
         try:
-            if current_app.debug:
-                current_app.logger.debug(request.data)
-            g.plist_data = plistlib.loads(request.data)
-        except:
+            g.plist_data = streaming.load(body, stream_arrays=STREAMED_ARRAYS)
+        except streaming.InvalidPlist:
             current_app.logger.info('could not parse property list input data')
             abort(400, 'invalid input data')
 
@@ -26,11 +26,133 @@ MDMCERT_API_KEY = 'b742461ff981756ca3f924f02db5a12e1f6639a9109db047ead1814aafc05
 
 PLISTIFY_MIMETYPE = 'application/xml'
 
+# VPP - Seconds to use the cached VPPServiceConfigSrv reply before revalidating it with the service.
+VPP_SERVICE_CONFIG_TTL = 3600
+
+
+# Seconds to reuse a rendered enrollment or trust profile. Changes made through this process invalidate it immediately.
+ENROLL_PROFILE_CACHE_TTL = 60
+
+# Cache-Control max-age of the trust profile and DEP anchor certificates, which are revalidated with their ETag.
+TRUST_RESPONSE_MAX_AGE = 300
+
+
+# Seconds between checks for device changes made by other processes, which invalidate the cached device state.
+DEVICE_CACHE_SYNC_INTERVAL = 5
+
+# Acknowledged responses to these RequestTypes are queued for the response workers instead of being handled in the
+# request, eg. ['InstalledApplicationList', 'CertificateList', 'ProfileList']. Empty handles every response immediately.
+MDM_DEFERRED_RESPONSE_TYPES = []
+
+# Number of response worker threads per process, and the number of responses each one claims at a time.
+MDM_RESPONSE_WORKERS = 2
+MDM_RESPONSE_BATCH_SIZE = 50
+
+# Seconds after which a response claimed by a worker that has not finished may be claimed by another worker.
+MDM_RESPONSE_LEASE = 300
+
+# Number of times processing a queued response may fail before it is discarded.
+MDM_RESPONSE_MAX_ATTEMPTS = 3
+
+# Largest plist body accepted by /mdm and /checkin, in bytes. Larger requests are rejected with 413.
+MDM_MAX_BODY_SIZE = 32 * 1024 * 1024
+
+# Default number of objects in each page of a JSON:API list, if page[size] is not given.
+PAGE_SIZE = 30
+
+# Plist bodies are spooled to a temporary file, which is only kept in memory up to this many bytes.
+MDM_BODY_SPOOL_SIZE = 256 * 1024
+
+# Refuse requests with 503 until `commandment bootstrap` has migrated the database, checking every
+# SCHEMA_CHECK_INTERVAL seconds.
+REQUIRE_CURRENT_SCHEMA = True
+SCHEMA_CHECK_INTERVAL = 5
+
+# Seconds that `commandment bootstrap` waits for another bootstrap to finish, on databases with advisory locks.
+BOOTSTRAP_LOCK_TIMEOUT = 600
+
+# Features whose blueprints are imported and registered, eg. ['auth', 'enroll', 'mdm'] for a process which only serves
+# devices. None enables every feature: auth, enroll, mdm, api, profiles, applications, oauth, omdm, ac2, dep, vpp,
+# analytics, export, reports, metrics, scep.
+ENABLED_FEATURES = None
+
+# Seconds that importing a feature may take before a warning is logged. FEATURE_IMPORT_BUDGETS overrides it per feature.
+FEATURE_IMPORT_BUDGET = 0.5
+FEATURE_IMPORT_BUDGETS = {}
+
+# Start the background jobs and workers in every process that creates the app. Set to False for web processes when
+# they are run by `commandment-worker` processes instead.
+START_BACKGROUND_THREADS = True
+
+# Seconds between runs of the periodic background jobs, which run in one process at a time. Jobs not listed here use
+# their default interval: dep_sync 90, vpp_sync 300, apns_push 90, command_latency_rollup 300, inventory_snapshot 900.
+JOB_INTERVALS = {}
+
+# Background jobs which are not run by this process, eg. ['vpp_sync'].
+JOBS_DISABLED = ['apns_push']
+
+# Seconds after which the lease on a job whose process has not released it expires. Must exceed the longest run.
+JOB_LEASE_TIME = 600
+
+# Seconds between attempts to take the lease on a job which is due, but held by another process.
+JOB_POLL_INTERVAL = 10
+
+# Days of job run history kept in the job_runs table.
+JOB_HISTORY_DAYS = 7
+
+# Seconds before now after which sent and acknowledged commands are left for the next latency rollup, so that commands
+# from transactions that commit late are not skipped.
+ANALYTICS_ROLLUP_LAG = 60
+
+# Rows fetched from the database at a time by the /api/v1/export endpoints.
+EXPORT_BATCH_SIZE = 1000
+
+# Directory that the inventory_snapshot job writes columnar snapshots of the inventory to, which the /api/v1/reports
+# endpoints read. None disables the job. Requires pyarrow, see commandment.snapshots.
+SNAPSHOT_DIR = None
+
+# Format of the snapshot files: parquet (compressed) or arrow (uncompressed, memory mapped by reports).
+SNAPSHOT_FORMAT = 'parquet'
+
+# Seconds before the previous snapshot from which devices seen are read again, for responses processed late.
+SNAPSHOT_OVERLAP = 300
+
+# Seconds between snapshots which are rebuilt from every row rather than only the devices seen since the last one.
+SNAPSHOT_FULL_INTERVAL = 86400
+
+# Profile this fraction of requests to PROFILE_PATHS, and every request whose body mentions one of PROFILE_UDIDS. Both
+# are off by default. See commandment.profiling.
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_UDIDS = []
+PROFILE_PATHS = ['/mdm', '/checkin', '/enroll/']
+
+# Directory where profiles are written, defaults to commandment-profiles in the temporary directory. Only the newest
+# PROFILE_MAX_FILES are kept.
+PROFILE_DIR = None
+PROFILE_MAX_FILES = 200
+
+# pstats for cProfile output, or collapsed for stacks sampled every PROFILE_SAMPLE_INTERVAL seconds (flame graphs).
+PROFILE_FORMAT = 'pstats'
+PROFILE_SAMPLE_INTERVAL = 0.001
+
+# At most this many requests are profiled per minute by each process, however they were selected.
+PROFILE_MAX_PER_MINUTE = 10
+
+# Count and time the SQL statements executed by each request, and log a warning for any statement executed
+# QUERY_LOG_REPEAT_THRESHOLD or more times by one request, which is usually an N+1 query. QUERY_LOG_HEADERS adds the
+# X-Query-Count, X-Query-Time and X-Query-Repeated response headers. See commandment.querylog.
+QUERY_LOG_ENABLED = False
+QUERY_LOG_REPEAT_THRESHOLD = 10
+QUERY_LOG_HEADERS = True
+
 
 # Internal CA - Certificate X.509 Attributes
 INTERNAL_CA_CN = 'COMMANDMENT-CA'
 INTERNAL_CA_O = 'Commandment'
 
+# Number of RSA private keys to pre-generate for device identities issued by the internal CA. 0 disables the pool.
+RSA_KEY_POOL_SIZE = 0
+
 
 # --------------
 # SCEPy Defaults
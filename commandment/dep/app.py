@@ -15,10 +15,8 @@ from base64 import urlsafe_b64encode
 from commandment.models import db
 from commandment.pki.models import RSAPrivateKey, CertificateSigningRequest
 from commandment.dep.models import DEPServerTokenCertificate, DEPAccount
-from commandment.enroll.util import generate_enroll_profile
+from commandment.enroll.cache import enroll_profile_cache, response_cache, file_version
 from commandment.cms.decorators import verify_cms_signers
-from commandment.plistutil.nonewriter import dumps as dumps_none
-from commandment.profiles.plist_schema import ProfileSchema
 from commandment.profiles import PROFILE_CONTENT_TYPE
 from commandment.pki.ca import get_ca
 from commandment.dep import smime
@@ -169,11 +167,7 @@ def profile():
             <https://developer.apple.com/library/content/documentation/Miscellaneous/Reference/MobileDeviceManagementProtocolRef/4-Profile_Management/ProfileManagement.html#//apple_ref/doc/uid/TP40017387-CH7-SW242>`_.
     """
     g.plist_data = plistlib.loads(g.signed_data)
-    profile = generate_enroll_profile()
-
-    schema = ProfileSchema()
-    result = schema.dump(profile)
-    plist_data = dumps_none(result.data, skipkeys=True)
+    plist_data = enroll_profile_cache.render()
 
     return plist_data, 200, {'Content-Type': PROFILE_CONTENT_TYPE}
 
@@ -182,7 +176,18 @@ def profile():
 def anchor_certs():
     """Download a list of certificates to trust the MDM
 
-    The response is a JSON array of base64 encoded DER certs as described in the DEP profile creation documentation."""
+    The response is a JSON array of base64 encoded DER certs as described in the DEP profile creation documentation.
+    It is cached until the certificate files change, and served with a strong ETag because Setup Assistant requests it
+    for every device."""
+    key = ('anchor_certs',
+           file_version(current_app.config.get('CA_CERTIFICATE', None)),
+           file_version(current_app.config.get('SSL_CERTIFICATE', None)))
+
+    return response_cache.response(key, generate_anchor_certs, 'application/json')
+
+
+def generate_anchor_certs() -> bytes:
+    """Generate the serialized list of anchor certificates."""
     anchors = []
 
     if 'CA_CERTIFICATE' in current_app.config:
@@ -190,13 +195,13 @@ def anchor_certs():
             pem_data = fd.read()
             c: x509.Certificate = x509.load_pem_x509_certificate(pem_data, backend=default_backend())
             der = c.public_bytes(Encoding.DER)
-            anchors.append(urlsafe_b64encode(der))
+            anchors.append(urlsafe_b64encode(der).decode('ascii'))
 
     if 'SSL_CERTIFICATE' in current_app.config:
         with open(current_app.config['SSL_CERTIFICATE'], 'rb') as fd:
             pem_data = fd.read()
             c: x509.Certificate = x509.load_pem_x509_certificate(pem_data, backend=default_backend())
             der = c.public_bytes(Encoding.DER)
-            anchors.append(urlsafe_b64encode(der))
+            anchors.append(urlsafe_b64encode(der).decode('ascii'))
 
-    return jsonify(anchors)
+    return json.dumps(anchors).encode('utf8')
@@ -12,6 +12,7 @@ import logging
 from flask import g, current_app
 
 from commandment.dep import DEPProfileRemovals
+from commandment.metrics import api_response_hook
 from .errors import DEPServiceError, DEPClientError
 from email.utils import parsedate  # Necessary for HTTP-Date
 
@@ -82,6 +83,7 @@ class DEP:
             "Content-Type": "application/json;charset=UTF8",
             "User-Agent": DEP.UserAgent,
         })
+        self._session.hooks['response'].append(api_response_hook('dep'))
         self._retry_after: Optional[datetime] = None
 
     @property
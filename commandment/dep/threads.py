@@ -3,18 +3,13 @@
 Copyright (c) 2015 Jesse Peterson, 2018 Mosen
 Licensed under the MIT license. See the included LICENSE.txt file for details.
 
+The sync is run by the scheduler in one process at a time (see :mod:`commandment.jobs.scheduler`).
+
 Attributes:
-    dep_thread (threading.Timer):
     dep_start (int): In seconds, time of first run
     dep_time (int): In seconds, time of subsequent runs
-
-Todo:
-    * Currently we start this thread after the database context and
-      configuration has already been. We envision a day when this runner runs
-      standalone and thus we'll need to sort out separate configuration routines etc.
 """
 import logging
-import threading
 import datetime
 import dateutil.parser
 from flask import Flask
@@ -32,29 +27,12 @@ from commandment.dep import DEPOrgType, DEPOrgVersion, DEPOperationType
 import sqlalchemy.orm.exc
 import sqlalchemy.exc
 
-dep_thread = None
 dep_start = 5
 dep_time = 90
 
 logger = logging.getLogger('dep thread')
 
 
-def start(app: Flask):
-    """Start the StartUp thread"""
-    logger.info('DEP thread will run in 5 seconds')
-    dep_thread = threading.Timer(dep_start, dep_thread_callback, [app])
-    dep_thread.daemon = True
-    dep_thread.start()
-
-
-def stop():
-    """Stop the runner thread"""
-    logger.info('DEP thread will stop')
-    global dep_thread
-    if dep_thread is threading.Timer:
-        dep_thread.cancel()
-
-
 def dep_sync_organization(app: Flask, dep: DEP):
     """Synchronise information from the DEP service to the local database.
     """
@@ -201,14 +179,12 @@ def dep_define_profiles(app: Flask, dep: DEP):
 
 
 def dep_thread_callback(app: Flask):
-    """Runner thread main procedure
+    """Sync DEP devices and profiles once. The scheduler runs this every `dep_time` seconds, or as configured in
+    JOB_INTERVALS.
 
     Todo:
-        * Catch everything so we don't interrupt the thread (and it never reschedules)
         * Certificate expiration warnings/emails
     """
-    threadlocals = threading.local()
-
     with app.app_context():
         try:
             dep_account: DEPAccount = db.session.query(DEPAccount).one()
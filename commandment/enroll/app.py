@@ -14,13 +14,13 @@ import os
 
 from commandment.enroll import AllDeviceAttributes
 from commandment.enroll.profiles import ca_trust_payload_from_configuration, scep_payload_from_configuration, \
-    identity_payload
-from commandment.profiles.models import MDMPayload, Profile, PEMCertificatePayload, DERCertificatePayload, SCEPPayload
+    ssl_trust_payload_from_configuration, identity_payload, stable_uuid
+from commandment.profiles.models import MDMPayload, Profile, DERCertificatePayload, SCEPPayload
 from commandment.profiles import PROFILE_CONTENT_TYPE, plist_schema as profile_schema, PayloadScope
 from commandment.models import db, Organization, SCEPConfig
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from commandment.plistutil.nonewriter import dumps as dumps_none
-from commandment.enroll.util import generate_enroll_profile
+from commandment.enroll.cache import enroll_profile_cache, response_cache, file_version
 from commandment.cms.decorators import verify_cms_signers
 from commandment.pki.ca import get_ca
 
@@ -39,10 +39,28 @@ def base64_to_pem(crypto_type, b64_text, width=76):
 def trust_mobileconfig():
     """Generate a trust profile, if one is required.
 
+    The profile is cached until the certificate files or the organization change, and served with a strong ETag.
+
     :resheader Content-Type: application/x-apple-aspen-config
+    :resheader ETag: Changes only if the profile content changes
     :statuscode 200:
+    :statuscode 304: The profile matches the ETag given in If-None-Match
     :statuscode 500: The system has not been configured, so we can't produce anything.
     """
+    ssl_certificate_path = None
+    if 'SSL_CERTIFICATE' in current_app.config:
+        ssl_certificate_path = os.path.join(os.path.dirname(__file__), current_app.config['SSL_CERTIFICATE'])
+
+    key = ('trust.mobileconfig',
+           file_version(current_app.config.get('CA_CERTIFICATE', None)),
+           file_version(ssl_certificate_path))
+
+    return response_cache.response(key, generate_trust_profile, PROFILE_CONTENT_TYPE,
+                                   {'Content-Disposition': 'attachment; filename="trust.mobileconfig"'})
+
+
+def generate_trust_profile() -> bytes:
+    """Generate the serialized trust profile."""
     try:
         org = db.session.query(Organization).one()
     except NoResultFound:
@@ -52,7 +70,6 @@ def trust_mobileconfig():
 
     profile = Profile(
         identifier=org.payload_prefix + '.trust',
-        uuid=uuid4(),
         display_name='Commandment Trust Profile',
         description='Allows your device to trust the MDM server',
         organization=org.name,
@@ -66,26 +83,14 @@ def trust_mobileconfig():
         profile.payloads.append(ca_payload)
 
     if 'SSL_CERTIFICATE' in current_app.config:
-        basepath = os.path.dirname(__file__)
-        certpath = os.path.join(basepath, current_app.config['SSL_CERTIFICATE'])
-        with open(certpath, 'rb') as fd:
-            pem_payload = PEMCertificatePayload(
-                uuid=uuid4(),
-                identifier=org.payload_prefix + '.ssl',
-                payload_content=fd.read(),
-                display_name='Web Server Certificate',
-                description='Required for your device to trust the server',
-                type='com.apple.security.pkcs1',
-                version=1
-            )
-            profile.payloads.append(pem_payload)
+        profile.payloads.append(ssl_trust_payload_from_configuration())
+
+    profile.uuid = stable_uuid(profile.identifier, '\n'.join(
+        [org.name] + [str(payload.uuid) for payload in profile.payloads]).encode('utf8'))
 
     schema = profile_schema.ProfileSchema()
     result = schema.dump(profile)
-    plist_data = dumps_none(result.data, skipkeys=True)
-
-    return plist_data, 200, {'Content-Type': PROFILE_CONTENT_TYPE,
-                             'Content-Disposition': 'attachment; filename="trust.mobileconfig"'}
+    return dumps_none(result.data, skipkeys=True)
 
 
 @enroll_app.route('/profile', methods=['GET', 'POST'])
@@ -97,11 +102,7 @@ def enroll():
     device_certificate = ca.sign(csr)
 
     pkcs12_payload = identity_payload(key, device_certificate, 'sekret')
-    profile = generate_enroll_profile(pkcs12_payload)
-
-    schema = profile_schema.ProfileSchema()
-    result = schema.dump(profile)
-    plist_data = dumps_none(result.data, skipkeys=True)
+    plist_data = enroll_profile_cache.render(pkcs12_payload)
 
     return plist_data, 200, {'Content-Type': PROFILE_CONTENT_TYPE}
 
@@ -208,7 +209,7 @@ def ota_authenticate():
         scep_payload = scep_payload_from_configuration()
         profile.payloads.append(scep_payload)
     else:
-        profile = generate_enroll_profile()
+        return enroll_profile_cache.render(), 200, {'Content-Type': PROFILE_CONTENT_TYPE}
 
     schema = profile_schema.ProfileSchema()
     result = schema.dump(profile)
@@ -0,0 +1,254 @@
+"""
+Render cache for enrollment profiles.
+
+Apart from the device identity payload, the enrollment profile is the same for every device, but generating it
+involves several database queries, reading and parsing the push certificate, and a marshmallow dump of every payload.
+
+This module keeps the device independent part of the profile as a serialized plist, split around the position of the
+identity payload. Rendering a profile for a device only serializes the identity payload and joins the pieces.
+
+Cached profiles are discarded when an :class:`Organization` or :class:`SCEPConfig` is written in this process, when
+the push certificate file changes, or after ``ENROLL_PROFILE_CACHE_TTL`` seconds, which bounds how long other processes
+may serve a stale profile.
+
+Responses that do not depend on the device at all, such as the trust profile and the DEP anchor certificates, are kept
+in a :class:`ResponseCache` and served with a strong ETag so that clients can revalidate them with a conditional GET.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from uuid import UUID, uuid4
+
+from flask import current_app, has_request_context, request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from commandment.enroll.util import generate_enroll_profile, get_push_certificate_path
+from commandment.models import Organization, SCEPConfig
+from commandment.plistutil.nonewriter import dumps as dumps_none, dumps_fragment
+from commandment.profiles.models import PKCS12CertificatePayload
+from commandment.profiles.plist_schema import ProfileSchema, schema_for
+
+IDENTITY_PLACEHOLDER = '__COMMANDMENT_DEVICE_IDENTITY__'
+"""str: Stands in for the identity payload while the device independent part of the profile is serialized."""
+
+INVALIDATED_BY = (Organization, SCEPConfig)
+"""tuple: Model classes that are used to generate the enrollment profile."""
+
+
+class EnrollProfileTemplate(NamedTuple):
+    """A serialized enrollment profile, split where the identity payload should be inserted.
+
+    If the profile does not contain a device specific identity payload (eg. it uses SCEP), the whole profile is in
+    ``head`` and ``identity_uuid`` is None.
+    """
+    head: bytes
+    tail: bytes
+    indent_level: int
+    identity_uuid: Optional[UUID]
+    created_at: float
+
+
+class EnrollProfileCache(object):
+    """Process-wide cache of enrollment profile templates.
+
+    Args:
+          ttl (int): Default number of seconds a template is used for, if ENROLL_PROFILE_CACHE_TTL is not configured.
+    """
+
+    def __init__(self, ttl: int = 60) -> None:
+        self.ttl = ttl
+        self._templates: Dict[Tuple, EnrollProfileTemplate] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Discard every cached template."""
+        with self._lock:
+            self._templates = {}
+            self._generation += 1
+
+    def render(self, pkcs12_payload: Optional[PKCS12CertificatePayload] = None) -> bytes:
+        """Render an enrollment profile as an XML property list.
+
+        This is equivalent to dumping :func:`generate_enroll_profile` with the ProfileSchema, except that the UUID of
+        the identity payload is replaced with the UUID that the cached MDM payload refers to.
+
+        Args:
+              pkcs12_payload (Optional[PKCS12CertificatePayload]): A PKCS#12 Payload if we are supplying device
+                identity without using SCEP
+        Returns:
+              bytes: The serialized enrollment profile.
+        """
+        template = self._template(pkcs12_payload is not None)
+        if pkcs12_payload is None:
+            return template.head
+
+        pkcs12_payload.uuid = template.identity_uuid
+        result = schema_for(pkcs12_payload.type)().dump(pkcs12_payload)
+        identity = dumps_fragment(result.data, indent_level=template.indent_level, skipkeys=True)
+
+        return template.head + identity + template.tail
+
+    def _template(self, with_identity: bool) -> EnrollProfileTemplate:
+        ttl = current_app.config.get('ENROLL_PROFILE_CACHE_TTL', self.ttl)
+        key = _cache_key(with_identity)
+
+        with self._lock:
+            template = self._templates.get(key, None)
+            generation = self._generation
+
+        if template is not None and time.time() - template.created_at < ttl:
+            return template
+
+        template = _build_template(with_identity)
+
+        with self._lock:
+            if generation == self._generation:
+                self._templates[key] = template
+
+        return template
+
+
+def file_version(path: Optional[str]) -> Optional[Tuple[str, int, int]]:
+    """Identify the current contents of a file by its path, modification time and size.
+
+    Returns:
+          None if the path is None or the file cannot be read.
+    """
+    if path is None:
+        return None
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return path, st.st_mtime_ns, st.st_size
+
+
+def _cache_key(with_identity: bool) -> Tuple:
+    """Everything outside of the database that the generated profile depends upon."""
+    push_certificate_path = get_push_certificate_path()
+
+    # The fallback SCEP payload URL is generated from the request host.
+    host_url = request.host_url if has_request_context() else None
+
+    return with_identity, push_certificate_path, file_version(push_certificate_path), host_url
+
+
+def _build_template(with_identity: bool) -> EnrollProfileTemplate:
+    placeholder = None
+    if with_identity:
+        placeholder = PKCS12CertificatePayload(uuid=uuid4(), type='com.apple.security.pkcs12')
+
+    profile = generate_enroll_profile(placeholder)
+    data = ProfileSchema().dump(profile).data
+
+    if placeholder is None:
+        return EnrollProfileTemplate(dumps_none(data, skipkeys=True), b'', 0, None, time.time())
+
+    payloads = data['PayloadContent']
+    index = [payload.get('PayloadUUID') for payload in payloads].index(str(placeholder.uuid))
+    payloads[index] = IDENTITY_PLACEHOLDER
+
+    plist_data = dumps_none(data, skipkeys=True)
+    marker = '<string>{}</string>\n'.format(IDENTITY_PLACEHOLDER).encode('utf8')
+    start = plist_data.index(marker)
+    line_start = plist_data.rindex(b'\n', 0, start) + 1
+
+    return EnrollProfileTemplate(
+        head=plist_data[:line_start],
+        tail=plist_data[start + len(marker):],
+        indent_level=start - line_start,
+        identity_uuid=placeholder.uuid,
+        created_at=time.time(),
+    )
+
+
+class CachedResponse(NamedTuple):
+    """A response body and its strong ETag."""
+    body: bytes
+    etag: str
+    created_at: float
+
+
+class ResponseCache(object):
+    """Process-wide cache of response bodies that only change when the configuration changes.
+
+    Bodies are keyed by a tuple that should identify every file the body was generated from (see :func:`file_version`).
+    Bodies generated from the database are discarded by :meth:`invalidate`.
+
+    Args:
+          ttl (int): Default number of seconds a body is used for, if ENROLL_PROFILE_CACHE_TTL is not configured.
+    """
+
+    def __init__(self, ttl: int = 60) -> None:
+        self.ttl = ttl
+        self._responses: Dict[Tuple, CachedResponse] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Discard every cached response body."""
+        with self._lock:
+            self._responses = {}
+            self._generation += 1
+
+    def get(self, key: Tuple, build: Callable[[], bytes]) -> CachedResponse:
+        """Get the cached body for the key, calling build() to generate it if it is missing or expired."""
+        ttl = current_app.config.get('ENROLL_PROFILE_CACHE_TTL', self.ttl)
+
+        with self._lock:
+            cached = self._responses.get(key, None)
+            generation = self._generation
+
+        if cached is not None and time.time() - cached.created_at < ttl:
+            return cached
+
+        body = build()
+        cached = CachedResponse(body, hashlib.sha256(body).hexdigest(), time.time())
+
+        with self._lock:
+            if generation == self._generation:
+                self._responses[key] = cached
+
+        return cached
+
+    def response(self, key: Tuple, build: Callable[[], bytes], mimetype: str, headers: dict = None) -> Response:
+        """Serve the cached body with its ETag and Cache-Control, replying 304 Not Modified if the client has it."""
+        cached = self.get(key, build)
+
+        res = Response(cached.body, mimetype=mimetype, headers=headers)
+        res.set_etag(cached.etag)
+        res.cache_control.public = True
+        res.cache_control.max_age = current_app.config.get('TRUST_RESPONSE_MAX_AGE', 300)
+
+        return res.make_conditional(request)
+
+
+enroll_profile_cache = EnrollProfileCache()
+"""EnrollProfileCache: The cache used by every enrollment endpoint."""
+
+response_cache = ResponseCache()
+"""ResponseCache: The cache used for trust profiles and anchor certificates."""
+
+
+def _invalidate(mapper, connection, target):
+    enroll_profile_cache.invalidate()
+    response_cache.invalidate()
+
+
+for model in INVALIDATED_BY:
+    for identifier in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, identifier, _invalidate, propagate=True)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def _invalidate_after_bulk(context):
+    if issubclass(context.mapper.class_, INVALIDATED_BY):
+        enroll_profile_cache.invalidate()
+        response_cache.invalidate()
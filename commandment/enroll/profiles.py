@@ -1,6 +1,7 @@
+import hashlib
 import os.path
 from typing import Optional
-from uuid import uuid4
+from uuid import NAMESPACE_DNS, UUID, uuid4, uuid5
 from flask import abort, current_app, url_for
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 
@@ -67,6 +68,15 @@ def scep_payload_from_configuration() -> SCEPPayload:
     return scep_payload
 
 
+def stable_uuid(identifier: str, content: bytes) -> UUID:
+    """Derive a PayloadUUID from the payload identifier and content.
+
+    A payload generated again from the same certificate gets the same UUID, so the serialized profile and its ETag only
+    change when the content does.
+    """
+    return uuid5(NAMESPACE_DNS, '{}:{}'.format(identifier, hashlib.sha256(content).hexdigest()))
+
+
 def ca_trust_payload_from_configuration() -> PEMCertificatePayload:
     """Create a CA payload with the PEM representation of the Certificate Authority used by this instance.
 
@@ -82,7 +92,7 @@ def ca_trust_payload_from_configuration() -> PEMCertificatePayload:
     with open(current_app.config['CA_CERTIFICATE'], 'rb') as fd:
         pem_data = fd.read()
         pem_payload = PEMCertificatePayload(
-            uuid=uuid4(),
+            uuid=stable_uuid(org.payload_prefix + '.ca', pem_data),
             identifier=org.payload_prefix + '.ca',
             payload_content=pem_data,
             display_name='Certificate Authority',
@@ -109,10 +119,11 @@ def ssl_trust_payload_from_configuration() -> PEMCertificatePayload:
     certpath = os.path.join(basepath, current_app.config['SSL_CERTIFICATE'])
 
     with open(certpath, 'rb') as fd:
+        pem_data = fd.read()
         pem_payload = PEMCertificatePayload(
-            uuid=uuid4(),
+            uuid=stable_uuid(org.payload_prefix + '.ssl', pem_data),
             identifier=org.payload_prefix + '.ssl',
-            payload_content=fd.read(),
+            payload_content=pem_data,
             display_name='Web Server Certificate',
             description='Required for your device to trust the server',
             type='com.apple.security.pkcs1',
@@ -14,6 +14,22 @@ from commandment.profiles.models import Profile, MDMPayload, PKCS12CertificatePa
 from uuid import uuid4
 
 
+def get_push_certificate_path() -> str:
+    """Get the path to the PEM encoded push certificate that supplies the MDM topic.
+
+    If PUSH_CERTIFICATE refers to a PKCS#12 container, the push service will have re-exported the certificate alongside
+    it with a .crt extension.
+    """
+    push_certificate_path = os.path.join(os.path.dirname(current_app.root_path), current_app.config['PUSH_CERTIFICATE'])
+
+    if os.path.exists(push_certificate_path):
+        push_certificate_basename, ext = os.path.splitext(push_certificate_path)
+        if ext.lower() == '.p12':  # push service will have re-exported the PKCS#12 container
+            push_certificate_path = push_certificate_basename + '.crt'
+
+    return push_certificate_path
+
+
 def generate_enroll_profile(pkcs12_payload: Optional[PKCS12CertificatePayload] = None) -> Profile:
     """Generate an enrollment profile.
 
@@ -39,13 +55,9 @@ def generate_enroll_profile(pkcs12_payload: Optional[PKCS12CertificatePayload] =
     except MultipleResultsFound:
         abort(500, 'Multiple organizations, backup your database and start again')
 
-    push_certificate_path = os.path.join(os.path.dirname(current_app.root_path), current_app.config['PUSH_CERTIFICATE'])
+    push_certificate_path = get_push_certificate_path()
 
     if os.path.exists(push_certificate_path):
-        push_certificate_basename, ext = os.path.splitext(push_certificate_path)
-        if ext.lower() == '.p12':  # push service will have re-exported the PKCS#12 container
-            push_certificate_path = push_certificate_basename + '.crt'
-
         with open(push_certificate_path, 'rb') as fd:
             push_certificate = x509.load_pem_x509_certificate(fd.read(), backend=default_backend())
     else:
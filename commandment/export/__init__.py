@@ -0,0 +1,76 @@
+"""
+Streaming serialization of query rows as newline delimited JSON or CSV.
+
+Rows are plain tuples of column values, so that exporting does not build ORM objects or marshmallow dumps. The output
+is generated in chunks of about :data:`CHUNK_SIZE` characters, so a response can be streamed with constant memory
+however many rows there are.
+"""
+import base64
+import csv
+import datetime
+import enum
+import io
+import json
+import uuid
+from typing import Any, Iterable, Iterator, Sequence
+
+CHUNK_SIZE = 64 * 1024
+"""int: The approximate number of characters in each chunk of output."""
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+"""Dict[str, str]: The content type of each export format."""
+
+
+def plain_value(value: Any) -> Any:
+    """Convert a column value to a JSON or CSV compatible value."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    elif isinstance(value, enum.Enum):
+        return value.value
+    elif isinstance(value, uuid.UUID):
+        return str(value)
+    elif isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    else:
+        return value
+
+
+def ndjson_chunks(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    """Generate chunks of newline delimited JSON objects, one per row, keyed by ``columns``."""
+    buffer, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, (plain_value(v) for v in row)))) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_chunks(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    """Generate chunks of CSV, starting with a header of ``columns``."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for row in rows:
+        writer.writerow([plain_value(v) for v in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+CHUNKS = {
+    'ndjson': ndjson_chunks,
+    'csv': csv_chunks,
+}
@@ -0,0 +1,105 @@
+"""
+API endpoints which stream every device, or every installed application, certificate or profile, in one response.
+
+The attributes that are exported are those of the JSON:API schema of each type, which are columns, and the id (and
+device id and UDID of inventory). Rows are read from a server side cursor, where the database supports one, in
+batches of ``EXPORT_BATCH_SIZE``, and written as they are read, so memory use does not depend on the size of the
+fleet.
+"""
+from collections import OrderedDict
+from typing import List, NamedTuple, Tuple, Type
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+from marshmallow_jsonapi import Schema
+from marshmallow_jsonapi.fields import Relationship
+from sqlalchemy import inspect
+from sqlalchemy.orm import ColumnProperty
+
+from commandment.api.schema import DeviceSchema
+from commandment.export import CHUNKS, FORMATS
+from commandment.inventory.models import InstalledApplication, InstalledCertificate, InstalledProfile
+from commandment.inventory.schema import InstalledApplicationSchema, InstalledCertificateSchema, \
+    InstalledProfileSchema
+from commandment.models import db, Device
+
+export_app = Blueprint('export_app', __name__)
+
+
+class ExportSpec(NamedTuple):
+    """The rows of an export.
+
+    Attributes:
+          model (Type[db.Model]): The model whose table is exported.
+          schema (Type[Schema]): The JSON:API schema whose attributes are exported.
+          extra (Tuple[str]): Columns exported in addition to the schema attributes.
+    """
+    model: Type[db.Model]
+    schema: Type[Schema]
+    extra: Tuple[str, ...] = ()
+
+
+EXPORTS = OrderedDict([
+    ('devices', ExportSpec(Device, DeviceSchema)),
+    ('installed_applications', ExportSpec(InstalledApplication, InstalledApplicationSchema,
+                                          ('device_id', 'device_udid'))),
+    ('installed_certificates', ExportSpec(InstalledCertificate, InstalledCertificateSchema,
+                                          ('device_id', 'device_udid'))),
+    ('installed_profiles', ExportSpec(InstalledProfile, InstalledProfileSchema, ('device_id', 'device_udid'))),
+])
+
+
+def export_columns(spec: ExportSpec) -> List[Tuple[str, str]]:
+    """The (name, model attribute) of each exported column, in order."""
+    mapper = inspect(spec.model)
+    columns = [('id', 'id')] + [(name, name) for name in spec.extra]
+
+    for name, field in spec.schema._declared_fields.items():
+        attribute = field.attribute or name
+        if name == 'id' or isinstance(field, Relationship):
+            continue
+        if isinstance(mapper.attrs.get(attribute), ColumnProperty):
+            columns.append((name, attribute))
+
+    return columns
+
+
+@export_app.route('/v1/export/<string:resource>', methods=['GET'])
+def export(resource: str):
+    """Stream every row of a resource.
+
+    :param resource: One of ``devices``, ``installed_applications``, ``installed_certificates`` or
+        ``installed_profiles``.
+    :query format: ``ndjson`` (the default) for one JSON object per line, or ``csv``.
+    :query fields: Comma separated list of the columns to export, defaults to every column.
+    :resheader Content-Type: application/x-ndjson or text/csv
+    :statuscode 200: OK
+    :statuscode 400: Invalid format or fields
+    :statuscode 404: No such resource
+    """
+    spec = EXPORTS.get(resource, None)
+    if spec is None:
+        # Not abort(404), which the app answers with the index page for client side routes
+        return jsonify(error=True, message='Cannot export {}'.format(resource)), 404
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return abort(400, 'Invalid format: {}, must be one of {}'.format(fmt, ', '.join(FORMATS.keys())))
+
+    columns = export_columns(spec)
+    if 'fields' in request.args:
+        names = request.args['fields'].split(',')
+        available = dict(columns)
+        invalid = [name for name in names if name not in available]
+        if invalid:
+            return abort(400, 'Invalid fields: {}'.format(', '.join(invalid)))
+        columns = [(name, available[name]) for name in names]
+
+    query = db.session.query(*[getattr(spec.model, attribute) for _, attribute in columns]) \
+        .order_by(spec.model.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(current_app.config.get('EXPORT_BATCH_SIZE', 1000))
+
+    chunks = CHUNKS[fmt]([name for name, _ in columns], query)
+    return Response(stream_with_context(chunks), content_type=FORMATS[fmt], headers={
+        'Content-Disposition': 'attachment; filename={}.{}'.format(resource, fmt),
+    })
@@ -0,0 +1,143 @@
+"""
+The blueprints of each feature, which are only imported by :func:`commandment.create_app` if the feature is enabled.
+
+Importing a blueprint also imports its schemas, resources and third party dependencies, eg. ``oscrypto``, ``apns2``
+or ``requests_oauthlib``, which make up most of the time it takes to create the app. Features which are not listed in
+``ENABLED_FEATURES`` are never imported. Every model is always imported, so that relationships between models of
+different features can be resolved.
+
+The import time of each feature is logged, with a warning if it exceeds the import budget of the feature. Because
+modules are only imported once, dependencies shared by several features count towards the first feature that
+imports them. ``benchmarks/bench_startup.py`` measures each feature in a separate interpreter.
+
+Attributes:
+    MODELS (List[str]): The modules containing every model.
+    FEATURES (Dict[str, List[BlueprintSpec]]): The blueprints of each feature, in the order they are registered.
+"""
+import importlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+class BlueprintSpec(NamedTuple):
+    """The location of a blueprint.
+
+    Attributes:
+          module (str): The module to import.
+          name (Optional[str]): The blueprint attribute of the module, or None if the module is only imported for the
+            routes it adds to another blueprint.
+          url_prefix (Optional[str]): The prefix that the blueprint is registered at.
+          optional (bool): If True, the feature is skipped with a warning if the module cannot be imported.
+    """
+    module: str
+    name: Optional[str] = None
+    url_prefix: Optional[str] = None
+    optional: bool = False
+
+
+MODELS = [
+    'commandment.models',
+    'commandment.auth.models',
+    'commandment.pki.models',
+    'commandment.profiles.models',
+    'commandment.inventory.models',
+    'commandment.apps.models',
+    'commandment.dep.models',
+    'commandment.vpp.models',
+    'commandment.jobs.models',
+    'commandment.analytics.models',
+]
+
+FEATURES: Dict[str, List[BlueprintSpec]] = OrderedDict([
+    ('auth', [BlueprintSpec('commandment.auth.app', 'auth_app')]),
+    ('enroll', [BlueprintSpec('commandment.enroll.app', 'enroll_app', '/enroll')]),
+    ('mdm', [BlueprintSpec('commandment.mdm.app', 'mdm_app')]),
+    ('api', [
+        BlueprintSpec('commandment.api.configuration', 'configuration_app', '/api/v1/configuration'),
+        # These add their routes to the JSON-API blueprint, so they must be imported before it is registered.
+        BlueprintSpec('commandment.inventory.api'),
+        BlueprintSpec('commandment.mdm.api'),
+        BlueprintSpec('commandment.api.app_jsonapi', 'api_app', '/api'),
+        BlueprintSpec('commandment.apns.app', 'api_push_app', '/api'),
+        BlueprintSpec('commandment.api.app_json', 'flat_api', '/api'),
+    ]),
+    ('profiles', [BlueprintSpec('commandment.profiles.api', 'profiles_api_app', '/api')]),
+    ('applications', [BlueprintSpec('commandment.apps.app_jsonapi', 'api_app', '/api')]),
+    ('oauth', [BlueprintSpec('commandment.sso.oauth', 'oauth_app', '/oauth')]),
+    ('omdm', [BlueprintSpec('commandment.omdm', 'omdm_app', '/omdm')]),
+    ('ac2', [BlueprintSpec('commandment.ac2.ac2_app', 'ac2_app')]),
+    ('dep', [BlueprintSpec('commandment.dep.app', 'dep_app')]),
+    ('vpp', [BlueprintSpec('commandment.vpp.app', 'vpp_app')]),
+    ('analytics', [BlueprintSpec('commandment.analytics.app', 'analytics_app', '/api')]),
+    ('export', [BlueprintSpec('commandment.export.app', 'export_app', '/api')]),
+    ('reports', [BlueprintSpec('commandment.snapshots.app', 'reports_app', '/api')]),
+    ('metrics', [BlueprintSpec('commandment.metrics.app', 'metrics_app')]),
+    ('scep', [BlueprintSpec('scepy.blueprint', 'scep_app', '/scep', optional=True)]),
+])
+
+
+def import_models():
+    """Import the modules containing every model."""
+    for module in MODELS:
+        importlib.import_module(module)
+
+
+def enabled_features(app: Flask) -> List[str]:
+    """The features enabled by ``ENABLED_FEATURES``, in the order they are registered.
+
+    Raises:
+          ValueError: If ``ENABLED_FEATURES`` contains a name which is not a feature.
+    """
+    enabled = app.config.get('ENABLED_FEATURES')
+    if enabled is None:
+        return list(FEATURES.keys())
+
+    unknown = set(enabled) - set(FEATURES.keys())
+    if unknown:
+        raise ValueError('Unknown feature(s) in ENABLED_FEATURES: {}'.format(', '.join(sorted(unknown))))
+
+    return [name for name in FEATURES.keys() if name in enabled]
+
+
+def register_features(app: Flask) -> Dict[str, float]:
+    """Import and register the blueprints of every enabled feature.
+
+    Returns:
+          Dict[str, float]: The number of seconds it took to import each feature that was registered. This is also
+            stored in ``app.extensions['feature_import_times']``.
+    """
+    default_budget = app.config.get('FEATURE_IMPORT_BUDGET', None)
+    budgets = app.config.get('FEATURE_IMPORT_BUDGETS', {})
+    import_times = OrderedDict()
+
+    for feature in enabled_features(app):
+        started = time.perf_counter()
+        try:
+            modules = [importlib.import_module(spec.module) for spec in FEATURES[feature]]
+        except ImportError as e:
+            if not all(spec.optional for spec in FEATURES[feature]):
+                raise
+            app.logger.warning('Feature %s will not be available, cannot import it: %s', feature, e)
+            continue
+
+        elapsed = time.perf_counter() - started
+        import_times[feature] = elapsed
+
+        budget = budgets.get(feature, default_budget)
+        if budget is not None and elapsed > budget:
+            app.logger.warning('Importing feature %s took %.3fs, over its budget of %.3fs', feature, elapsed, budget)
+        else:
+            logger.debug('Imported feature %s in %.3fs', feature, elapsed)
+
+        for spec, module in zip(FEATURES[feature], modules):
+            if spec.name is not None:
+                app.register_blueprint(getattr(module, spec.name), url_prefix=spec.url_prefix)
+
+    app.extensions['feature_import_times'] = import_times
+    return import_times
@@ -7,9 +7,11 @@ from commandment.inventory.schema import InstalledApplicationSchema, InstalledCe
 from commandment.inventory.models import db, InstalledApplication, InstalledCertificate, InstalledProfile, \
     AvailableOSUpdate
 from commandment.models import Device
+from commandment.api.data_layer import EagerLoadingDataLayer
+from commandment.api.pagination import KeysetDataLayer, KeysetResourceList
 
 
-class InstalledApplicationsList(ResourceList):
+class InstalledApplicationsList(KeysetResourceList):
     def query(self, view_kwargs):
         query_ = self.session.query(InstalledApplication)
         if view_kwargs.get('device_id') is not None:
@@ -23,9 +25,12 @@ class InstalledApplicationsList(ResourceList):
 
     schema = InstalledApplicationSchema
     data_layer = {
+        'class': KeysetDataLayer,
         'session': db.session,
         'model': InstalledApplication,
-        'methods': {'query': query}
+        'methods': {'query': query},
+        'keyset_sort': ['id', 'bundle_identifier', 'version'],
+        'eager_load': {'device': 'noload'},
     }
 
 
@@ -52,9 +57,11 @@ class InstalledCertificatesList(ResourceList):
     schema = InstalledCertificateSchema
     view_kwargs = True
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': InstalledCertificate,
-        'methods': {'query': query}
+        'methods': {'query': query},
+        'eager_load': {'device': 'noload'},
     }
 
 
@@ -97,9 +104,11 @@ class InstalledProfilesList(ResourceList):
     schema = InstalledProfileSchema
     view_kwargs = True
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': InstalledProfile,
-        'methods': {'query': query}
+        'methods': {'query': query},
+        'eager_load': {'device': 'noload'},
     }
 
 
@@ -126,9 +135,11 @@ class AvailableOSUpdateList(ResourceList):
     schema = AvailableOSUpdateSchema
     view_kwargs = True
     data_layer = {
+        'class': EagerLoadingDataLayer,
         'session': db.session,
         'model': AvailableOSUpdate,
-        'methods': {'query': query}
+        'methods': {'query': query},
+        'eager_load': {'device': 'noload'},
     }
 
 
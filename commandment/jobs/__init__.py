@@ -0,0 +1,13 @@
+"""
+Periodic background jobs which run once across every process that shares the database.
+
+See :mod:`commandment.jobs.scheduler`.
+"""
+from enum import Enum
+
+
+class JobRunStatus(Enum):
+    """The outcome of a single run of a background job."""
+    Running = 'Running'
+    Succeeded = 'Succeeded'
+    Failed = 'Failed'
@@ -0,0 +1,47 @@
+import datetime
+
+from commandment.models import db
+from commandment.jobs import JobRunStatus
+
+
+class JobLease(db.Model):
+    """A lease on a background job, which is held by the process running it.
+
+    There is one row per job. A process may only run the job if it can take the lease, which is not possible while
+    another process holds an unexpired lease, or before ``next_run_at``.
+
+    :table: job_leases
+    """
+    __tablename__ = 'job_leases'
+
+    name = db.Column(db.String, primary_key=True)
+    """name (str): The job name"""
+    holder = db.Column(db.String, nullable=True)
+    """holder (str): Identifies the process running the job, if any."""
+    expires_at = db.Column(db.DateTime, nullable=True)
+    """expires_at (datetime.datetime): The datetime (utc) after which another process may take the lease, even if
+        the holder has not released it."""
+    next_run_at = db.Column(db.DateTime, nullable=True)
+    """next_run_at (datetime.datetime): The datetime (utc) before which a periodic job will not run again."""
+
+
+class JobRun(db.Model):
+    """The history of background job runs.
+
+    :table: job_runs
+    """
+    __tablename__ = 'job_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, index=True, nullable=False)
+    """name (str): The job name"""
+    holder = db.Column(db.String, nullable=False)
+    """holder (str): Identifies the process that ran the job."""
+    status = db.Column(db.Enum(JobRunStatus), nullable=False, default=JobRunStatus.Running)
+    """status (JobRunStatus): Whether the job is running, or whether it succeeded."""
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    """started_at (datetime.datetime): The datetime (utc) that the run started."""
+    finished_at = db.Column(db.DateTime, nullable=True)
+    """finished_at (datetime.datetime): The datetime (utc) that the run finished."""
+    error = db.Column(db.String, nullable=True)
+    """error (str): The exception raised by a failed run."""
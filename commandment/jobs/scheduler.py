@@ -0,0 +1,292 @@
+"""
+Run periodic background jobs once across every process that shares the database.
+
+Every process runs a single scheduler thread. When a job is due, the scheduler tries to take the lease on the job with
+a conditional UPDATE of its ``job_leases`` row, which only one process can win. The winner records a ``job_runs`` row,
+runs the job, and releases the lease with the time the job should next run. Every other process skips the job until
+then. This prevents overlapping runs of the same job, so that eg. only one process syncs DEP devices from the cursor.
+
+A job given without an interval runs once in each process. The lease still prevents two processes from running it at
+the same time.
+
+A lease expires after ``JOB_LEASE_TIME`` seconds even if it was not released, so that a job held by a process that
+died will run again. It must be longer than the longest run of any job.
+
+If the lease tables do not exist yet, eg. before ``commandment bootstrap`` has run, jobs without an interval run
+without a lease and periodic jobs are skipped.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+import sqlalchemy.exc
+from flask import Flask
+
+from commandment.jobs import JobRunStatus
+from commandment.jobs.models import JobLease, JobRun
+from commandment.models import db
+
+logger = logging.getLogger('scheduler')
+
+JobFunction = Callable[[Flask], Any]
+
+
+class Job(object):
+    """A background job.
+
+    Args:
+          name (str): Unique name, which identifies the lease and run history of the job.
+          func (JobFunction): Called with the flask app to run the job.
+          interval (Optional[int]): Seconds between the start of one run and the next, or None to run once per process.
+          delay (int): Seconds to wait after the scheduler starts before the job is first due.
+          lease (Optional[int]): Seconds after which an unreleased lease expires, defaults to JOB_LEASE_TIME.
+    """
+
+    def __init__(self, name: str, func: JobFunction, interval: Optional[int] = None, delay: int = 0,
+                 lease: Optional[int] = None) -> None:
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.delay = delay
+        self.lease = lease
+        self.due_at = 0.0
+        self.finished = False
+
+
+class Scheduler(object):
+    """Runs registered jobs from a single thread.
+
+    Args:
+          poll_interval (int): Default number of seconds between attempts to take the lease on a due job, if
+            JOB_POLL_INTERVAL is not configured.
+    """
+
+    def __init__(self, poll_interval: int = 10) -> None:
+        self.poll_interval = poll_interval
+        self.holder = '{}:{}:{}'.format(socket.gethostname(), os.getpid(), uuid4().hex[:8])
+        self.jobs: Dict[str, Job] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def add_job(self, name: str, func: JobFunction, interval: Optional[int] = None, delay: int = 0,
+                lease: Optional[int] = None) -> Job:
+        """Register a job, replacing any job of the same name. See :class:`Job` for the arguments."""
+        job = Job(name, func, interval, delay, lease)
+        self.jobs[name] = job
+        return job
+
+    def start(self, app: Flask):
+        """Start the scheduler thread, stopping the thread of a previous call."""
+        self.stop()
+
+        started = time.time()
+        for job in self.jobs.values():
+            job.due_at = started + job.delay
+            job.finished = False
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=[app, self._stopped], name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread. A job that is running is allowed to finish."""
+        if self._thread is not None:
+            logger.info('Scheduler will stop')
+            self._stopped.set()
+            self._thread = None
+
+    def _run(self, app: Flask, stopped: threading.Event):
+        logger.info('Scheduler started with job(s): %s', ', '.join(self.jobs.keys()))
+        while not stopped.is_set():
+            self.run_pending(app)
+
+            due = [job.due_at for job in self.jobs.values() if not job.finished]
+            if not due:
+                break
+
+            stopped.wait(max(0.0, min(due) - time.time()))
+
+    def run_pending(self, app: Flask) -> List[str]:
+        """Try to run every job that is due in this process.
+
+        Returns:
+              List[str]: The names of the jobs that were run.
+        """
+        ran = []
+        for job in list(self.jobs.values()):
+            if job.finished or job.due_at > time.time():
+                continue
+
+            if self.run_job(app, job):
+                ran.append(job.name)
+
+        return ran
+
+    def run_job(self, app: Flask, job: Job) -> bool:
+        """Run a job if this process can take its lease, and schedule the next attempt.
+
+        Returns:
+              bool: True if the job was run.
+        """
+        poll_interval = app.config.get('JOB_POLL_INTERVAL', self.poll_interval)
+        lease = job.lease or app.config.get('JOB_LEASE_TIME', 600)
+
+        with app.app_context():
+            try:
+                acquired = self._acquire(job, lease)
+            except sqlalchemy.exc.DBAPIError as e:
+                db.session.rollback()
+                db.session.remove()
+                if job.interval is not None:
+                    logger.warning('Skipping job %s, the lease could not be taken: %s', job.name, e)
+                    job.due_at = time.time() + poll_interval
+                    return False
+
+                logger.warning('Running job %s without a lease: %s', job.name, e)
+                acquired = None
+
+            if acquired is False:
+                db.session.remove()
+                job.due_at = time.time() + poll_interval
+                return False
+
+            run_id = self._record_start(job) if acquired else None
+            db.session.remove()
+
+        error = None
+        try:
+            job.func(app)
+        except Exception:
+            error = traceback.format_exc()
+            logger.exception('Job %s failed', job.name)
+
+        with app.app_context():
+            try:
+                if acquired:
+                    self._record_finish(job, run_id, error, app.config.get('JOB_HISTORY_DAYS', 7))
+                    self._release(job)
+            except sqlalchemy.exc.SQLAlchemyError as e:
+                db.session.rollback()
+                logger.error('Could not release the lease on job %s: %s', job.name, e)
+            finally:
+                db.session.remove()
+
+        if job.interval is None:
+            job.finished = True
+        else:
+            job.due_at = time.time() + min(job.interval, poll_interval)
+
+        return True
+
+    def _acquire(self, job: Job, lease: int) -> bool:
+        now = datetime.utcnow()
+        if db.session.query(JobLease.name).filter(JobLease.name == job.name).first() is None:
+            try:
+                db.session.add(JobLease(name=job.name))
+                db.session.commit()
+            except sqlalchemy.exc.IntegrityError:
+                db.session.rollback()  # Another process created it first
+
+        query = db.session.query(JobLease).filter(
+            JobLease.name == job.name,
+            (JobLease.expires_at == None) | (JobLease.expires_at < now),
+        )
+        if job.interval is not None:
+            query = query.filter((JobLease.next_run_at == None) | (JobLease.next_run_at <= now))
+
+        acquired = query.update({
+            JobLease.holder: self.holder,
+            JobLease.expires_at: now + timedelta(seconds=lease),
+        }, synchronize_session=False) == 1
+        db.session.commit()
+
+        return acquired
+
+    def _record_start(self, job: Job) -> int:
+        run = JobRun(name=job.name, holder=self.holder, status=JobRunStatus.Running, started_at=datetime.utcnow())
+        db.session.add(run)
+        db.session.commit()
+        return run.id
+
+    def _record_finish(self, job: Job, run_id: int, error: Optional[str], history_days: int):
+        now = datetime.utcnow()
+        db.session.query(JobRun).filter(JobRun.id == run_id).update({
+            JobRun.status: JobRunStatus.Failed if error is not None else JobRunStatus.Succeeded,
+            JobRun.finished_at: now,
+            JobRun.error: error,
+        }, synchronize_session=False)
+        db.session.query(JobRun).filter(JobRun.name == job.name,
+                                        JobRun.started_at < now - timedelta(days=history_days)).delete(
+            synchronize_session=False)
+        db.session.commit()
+
+    def _release(self, job: Job):
+        next_run_at = None
+        if job.interval is not None:
+            next_run_at = datetime.utcnow() + timedelta(seconds=job.interval)
+
+        db.session.query(JobLease).filter(JobLease.name == job.name, JobLease.holder == self.holder).update({
+            JobLease.holder: None,
+            JobLease.expires_at: None,
+            JobLease.next_run_at: next_run_at,
+        }, synchronize_session=False)
+        db.session.commit()
+
+
+scheduler = Scheduler()
+"""Scheduler: The scheduler of this process."""
+
+
+def register_jobs(app: Flask, sched: Scheduler = scheduler):
+    """Register the built-in jobs, using the intervals in JOB_INTERVALS and skipping any listed in JOBS_DISABLED."""
+    from commandment.threads import vpp_thread
+    from commandment.dep import threads as dep_threads
+    from commandment.apns import threads as push_threads
+    from commandment.analytics import rollup
+    from commandment import snapshots
+
+    intervals = app.config.get('JOB_INTERVALS', {})
+    disabled = app.config.get('JOBS_DISABLED', [])
+
+    builtin = [
+        Job('dep_sync', dep_threads.dep_thread_callback, intervals.get('dep_sync', dep_threads.dep_time),
+            dep_threads.dep_start),
+        Job('vpp_sync', vpp_thread.vpp_thread_callback, intervals.get('vpp_sync', vpp_thread.vpp_time),
+            vpp_thread.vpp_start),
+        Job('apns_push', push_threads.push_thread_callback, intervals.get('apns_push', push_threads.push_time),
+            push_threads.push_start),
+        Job('command_latency_rollup', rollup.rollup_job, intervals.get('command_latency_rollup', 300), 30),
+    ]
+
+    if app.config.get('SNAPSHOT_DIR') is not None:
+        if snapshots.available():
+            from commandment.snapshots import writer
+            builtin.append(Job('inventory_snapshot', writer.snapshot_job,
+                               intervals.get('inventory_snapshot', 900), 60))
+        else:
+            logger.warning('SNAPSHOT_DIR is set, but inventory snapshots require pyarrow which is not installed')
+
+    for job in builtin:
+        if job.name in disabled:
+            logger.info('Job %s is disabled', job.name)
+            sched.jobs.pop(job.name, None)
+            continue
+
+        sched.add_job(job.name, job.func, job.interval, job.delay)
+
+
+def start(app: Flask):
+    """Register the built-in jobs and start the scheduler thread of this process."""
+    register_jobs(app)
+    scheduler.start(app)
+
+
+def stop():
+    """Stop the scheduler thread of this process."""
+    scheduler.stop()
@@ -6,18 +6,23 @@ from flask import Blueprint, make_response, abort, jsonify, g, current_app
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from commandment.mdm import CommandStatus
 from commandment.mdm.commands import Command
-from commandment.decorators import parse_plist_input_data
+from commandment.decorators import parse_plist_input_data, request_body
 from commandment.cms.decorators import verify_mdm_signature
 from commandment.mdm.util import queue_full_inventory
+from commandment.mdm.identity import resolve_device, resolve_device_state, touch_device, invalidate_device, \
+    device_state_cache
 from commandment.models import DeviceUser
 from commandment.pki.models import DeviceIdentityCertificate
 from commandment.mdm.routers import CommandRouter, PlistRouter
+from commandment.metrics import mdm_requests
+from commandment import profiling
 from commandment.utils import plistify
+from commandment.plistutil import streaming
 import plistlib
 import ssl
 from commandment.apns.push import push_to_device
 from datetime import datetime
-from commandment.signals import device_enrolled
+from commandment.signals import device_enrolled, device_unenrolled
 
 
 mdm_app = Blueprint('mdm_app', __name__)
@@ -25,6 +30,7 @@ mdm_app = Blueprint('mdm_app', __name__)
 plr = PlistRouter(mdm_app, '/checkin')
 command_router = CommandRouter(mdm_app)
 from .handlers import *
+from .ingest import is_deferred, enqueue_response
 
 
 @plr.route('MessageType', 'Authenticate')
@@ -69,6 +75,9 @@ def authenticate(plist_data):
 
     # TODO: Check supplied identity against identities we actually issued
 
+    if device.id is not None:
+        invalidate_device(device)
+
     db.session.commit()
 
     return 'OK'
@@ -78,9 +87,8 @@ def authenticate(plist_data):
 @verify_mdm_signature
 def token_update(plist_data):
     current_app.logger.debug('TokenUpdate (UDID %s)', plist_data.get('UDID', None))
-    try:
-        device = db.session.query(Device).filter(Device.udid == plist_data['UDID']).one()
-    except NoResultFound:
+    device = resolve_device(plist_data['UDID'])
+    if device is None:
         current_app.logger.debug(
             'Device (UDID: %s) will be unenrolled because the database has no record of this device.', plist_data['UDID'])
         return abort(410)  # Ask the device to unenroll itself because we dont seem to have any records.
@@ -112,6 +120,7 @@ def token_update(plist_data):
     device.unlock_token = plist_data.get('UnlockToken', None)
     device.last_seen = datetime.now()
     db.session.commit()
+    device_state_cache.discard(device.udid)
 
     try:
         response = push_to_device(device)
@@ -145,10 +154,11 @@ def check_out(plist_data):
     """
     device_udid = plist_data['UDID']
     try:
-        d = db.session.query(Device).filter(Device.udid == device_udid).one()
-    except NoResultFound:
-        current_app.logger.warning('Attempted to unenroll device with UDID: {}, but none was found'.format(device_udid))
-        return abort(404, 'No matching device found')
+        d = resolve_device(device_udid)
+        if d is None:
+            current_app.logger.warning(
+                'Attempted to unenroll device with UDID: {}, but none was found'.format(device_udid))
+            return abort(404, 'No matching device found')
 
     except MultipleResultsFound:
         current_app.logger.warning(
@@ -162,6 +172,7 @@ def check_out(plist_data):
     d.token = None
     d.push_magic = None
 
+    device_unenrolled.send(d)
     db.session.commit()
     current_app.logger.debug('Device has been unenrolled, UDID: {}'.format(device_udid))
 
@@ -184,12 +195,17 @@ def mdm():
     :resheader Content-Type: application/xml; charset=UTF-8
     :status 200: With an empty body, no commands remaining, or plist contents of next command.
     :status 400: Invalid data submitted
+    :status 403: The request was signed by the identity certificate of a different device.
     :status 410: User channel capability not available.
     """
-    # TODO: proper identity verification, for now just matching on UDID
-    try:
-        device = db.session.query(Device).filter(Device.udid == g.plist_data['UDID']).one()
-    except NoResultFound:
+    device = resolve_device_state(g.plist_data['UDID'])
+    if device is not None and not touch_device(device):
+        # The cached state may predate a re-enrollment in another process, which gave the device a new row.
+        device = resolve_device_state(g.plist_data['UDID'])
+        if device is not None and not touch_device(device):
+            device = None
+
+    if device is None:
         current_app.logger.info("An unmanaged device (UDID %s), tried to check in with us, rejecting.", g.plist_data['UDID'])
         return abort(410)  # Unmanage devices that we dont have a record of
 
@@ -207,23 +223,19 @@ def mdm():
         return abort(400, 'response does not contain Status')
     else:
         status = CommandStatus(g.plist_data['Status'])
+        mdm_requests.inc(status.value)
+        profiling.tag(status.value)
 
     current_app.logger.info('device id=%d udid=%s processing status=%s', device.id, device.udid, status)
-    device.last_seen = datetime.utcnow()
     db.session.commit()
 
-    if current_app.config['DEBUG']:
-        try:
-            print(g.plist_data)
-        except UnicodeEncodeError:
-            print('Cannot DEBUG print plist request, unencodable characters')
-
     if status != CommandStatus.Idle:  # this device is responding to an earlier command.
         if 'CommandUUID' not in g.plist_data:
             current_app.logger.error('missing CommandUUID for non-Idle status')
             abort(400, 'response does not contain CommandUUID')
         try:
             command = DBCommand.find_by_uuid(g.plist_data['CommandUUID'])
+            profiling.tag('{}-{}'.format(status.value, command.request_type))
             command.status = status
             command.acknowledged_at = datetime.utcnow()
             db.session.commit()
@@ -233,8 +245,17 @@ def mdm():
             # turns out this is less useful than passing the db model
             # cmd = Command.new_request_type(command.request_type, command.parameters, command.uuid)
 
-            # route the response by the handler type corresponding to that command
-            command_router.handle(command, device, g.plist_data)
+            if status == CommandStatus.Acknowledged and is_deferred(command.request_type):
+                # a response worker will route the response, so that the device gets its next command immediately
+                enqueue_response(command, device.id, request_body().read())
+            else:
+                # route the response by the handler type corresponding to that command
+                try:
+                    command_router.handle(command, db.session.query(Device).get(device.id), g.plist_data)
+                except streaming.InvalidPlist:
+                    # the items of streamed arrays are only validated as the handler reads them
+                    db.session.rollback()
+                    return abort(400, 'invalid input data')
 
         except NoResultFound:
             current_app.logger.warning('no record of command uuid=%s', g.plist_data['CommandUUID'])
@@ -13,13 +13,18 @@ from commandment.mdm import commands
 from commandment.mdm.app import command_router
 from .commands import ProfileList, DeviceInformation, SecurityInfo, InstalledApplicationList, CertificateList, \
     InstallProfile, AvailableOSUpdates, InstallApplication, RemoveProfile, ManagedApplicationList
-from .response_schema import InstalledApplicationListResponse, DeviceInformationResponse, AvailableOSUpdateListResponse, \
-    ProfileListResponse, SecurityInfoResponse
+from .loaders import load_device_information, load_installed_application_list, load_profile_list, \
+    load_available_os_updates
+from .response_schema import SecurityInfoResponse
 from ..models import db, Device, Command as DBCommand
-from commandment.inventory.models import InstalledCertificate, InstalledProfile, InstalledApplication
+from commandment.inventory.models import InstalledCertificate, InstalledProfile, InstalledPayload, \
+    InstalledApplication, AvailableOSUpdate
 
 Queries = DeviceInformation.Queries
 
+INSERT_BATCH_SIZE = 1000
+"""int: Number of installed applications inserted at a time."""
+
 
 @command_router.route('DeviceInformation')
 def ack_device_information(command: DBCommand, device: Device, response: dict):
@@ -35,9 +40,8 @@ def ack_device_information(command: DBCommand, device: Device, response: dict):
     See Also:
         - `DeviceInformation Command <https://developer.apple.com/library/content/documentation/Miscellaneous/Reference/MobileDeviceManagementProtocolRef/3-MDM_Protocol/MDM_Protocol.html#//apple_ref/doc/uid/TP40017387-CH3-SW15>`_.
     """
-    schema = DeviceInformationResponse()
-    result = schema.load(response)
-    for k, v in result.data['QueryResponses'].items():
+    result = load_device_information(response)
+    for k, v in result.get('QueryResponses', {}).items():
         setattr(device, k, v)
 
     db.session.commit()
@@ -78,15 +82,14 @@ def ack_profile_list(request: DBCommand, device: Device, response: dict):
     Returns:
           void: Reserved for future use
     """
-    schema = ProfileListResponse()
-    profile_list = schema.load(response)
+    profile_list = load_profile_list(response)
 
-    for pl in device.installed_payloads:
-        db.session.delete(pl)
+    db.session.query(InstalledPayload).filter(InstalledPayload.device_id == device.id).delete(
+        synchronize_session=False)
 
     # Impossible to calculate delta, so all profiles get wiped
-    for p in device.installed_profiles:
-        db.session.delete(p)
+    db.session.query(InstalledProfile).filter(InstalledProfile.device_id == device.id).delete(
+        synchronize_session=False)
 
     desired_profiles = {}
     for tag in device.tags:
@@ -95,15 +98,18 @@ def ack_profile_list(request: DBCommand, device: Device, response: dict):
 
     remove_profiles = []
 
-    for profile in profile_list.data['ProfileList']:
+    for columns in profile_list.get('ProfileList', []):
+        payloads = columns.pop('payload_content', [])
+        profile = InstalledProfile(**columns)
         profile.device = device
 
         # device.udid may have dashes (macOS) or not (iOS)
         profile.device_udid = device.udid
 
-        for payload in profile.payload_content:
+        for payload_columns in payloads:
+            payload = InstalledPayload(**payload_columns)
             payload.device = device
-            payload.profile_id = profile.id
+            payload.profile = profile
 
         db.session.add(profile)
 
@@ -138,11 +144,10 @@ def ack_certificate_list(request: DBCommand, device: Device, response: dict):
     for c in device.installed_certificates:
         db.session.delete(c)
 
-    certificates = response['CertificateList']
-    current_app.logger.debug(
-        'Received CertificatesList response containing {} certificate(s)'.format(len(certificates)))
-
-    for cert in certificates:
+    # A StreamedArray, whose items are parsed as they are iterated, if the response was received by /mdm
+    count = 0
+    for cert in response['CertificateList']:
+        count += 1
         ic = InstalledCertificate()
         ic.device = device
         ic.device_udid = device.udid
@@ -157,6 +162,7 @@ def ack_certificate_list(request: DBCommand, device: Device, response: dict):
 
         db.session.add(ic)
 
+    current_app.logger.debug('Received CertificatesList response containing %d certificate(s)', count)
     db.session.commit()
 
 
@@ -177,33 +183,30 @@ def ack_installed_app_list(request: DBCommand, device: Device, response: dict):
           void: Nothing is returned but this behaviour is subject to change.
     """
 
-    for a in device.installed_applications:
-        db.session.delete(a)
-
-    applications = response['InstalledApplicationList']
-    current_app.logger.debug(
-        'Received InstalledApplicationList response containing {} application(s)'.format(len(applications))
-    )
-
-    schema = InstalledApplicationListResponse()
-    result, errors = schema.load(response)
-    current_app.logger.debug(errors)
-    # current_app.logger.info(result)
+    db.session.query(InstalledApplication).filter(InstalledApplication.device_id == device.id).delete(
+        synchronize_session=False)
 
+    result = load_installed_application_list(response)
     ignored_app_bundle_ids = current_app.config['IGNORED_APPLICATION_BUNDLE_IDS']
 
-    for ia in result['InstalledApplicationList']:
-        if isinstance(ia, db.Model):
-            if ia.bundle_identifier in ignored_app_bundle_ids:
-                current_app.logger.debug('Ignoring app with bundle id: %s', ia.bundle_identifier)
-                continue
-
-            ia.device = device
-            ia.device_udid = device.udid
-            db.session.add(ia)
-        else:
-            current_app.logger.debug('Not a model: %s', ia)
-
+    # Applications are converted as they are parsed, if the response was received by /mdm, and inserted in batches
+    count = 0
+    rows = []
+    for ia in result.get('InstalledApplicationList', []):
+        count += 1
+        if ia.get('bundle_identifier', None) in ignored_app_bundle_ids:
+            current_app.logger.debug('Ignoring app with bundle id: %s', ia['bundle_identifier'])
+            continue
+
+        ia['device_id'] = device.id
+        ia['device_udid'] = device.udid
+        rows.append(ia)
+        if len(rows) == INSERT_BATCH_SIZE:
+            db.session.bulk_insert_mappings(InstalledApplication, rows)
+            rows = []
+
+    db.session.bulk_insert_mappings(InstalledApplication, rows)
+    current_app.logger.debug('Received InstalledApplicationList response containing %d application(s)', count)
     db.session.commit()
 
 
@@ -227,16 +230,15 @@ def ack_available_os_updates(request: DBCommand, device: Device, response: dict)
     if response.get('Status', None) == 'Error':
         pass
     else:
-        for au in device.available_os_updates:
-            db.session.delete(au)
-
-        schema = AvailableOSUpdateListResponse()
-        result = schema.load(response)
+        db.session.query(AvailableOSUpdate).filter(AvailableOSUpdate.device_id == device.id).delete(
+            synchronize_session=False)
 
-        for upd in result.data['AvailableOSUpdates']:
-            upd.device = device
-            db.session.add(upd)
+        result = load_available_os_updates(response)
+        rows = result.get('AvailableOSUpdates', [])
+        for upd in rows:
+            upd['device_id'] = device.id
 
+        db.session.bulk_insert_mappings(AvailableOSUpdate, rows)
         db.session.commit()
 
 
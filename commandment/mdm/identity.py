@@ -0,0 +1,292 @@
+"""
+Identify the device making an MDM request by the certificate that signed it.
+
+Each device is bound to its identity certificate on the first TokenUpdate. The binding from certificate fingerprint to
+device is looked up through the unique index on ``certificates.fingerprint`` and kept in an in-process LRU, so that
+authenticating a check-in against its signer and resolving the Device row costs one cached lookup.
+
+The ``/mdm`` endpoint only needs a few columns of the device to answer an Idle check-in, so those are kept in a second
+LRU keyed by UDID. Entries are discarded when the ``device_enrolled``, ``device_unenrolled`` or
+``device_token_expired`` signals are sent. Those signals also increment the ``devices`` :class:`ChangeCounter`, which
+every process compares against the value it last saw at most once every ``DEVICE_CACHE_SYNC_INTERVAL`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from flask import g, current_app, abort
+from sqlalchemy.orm.exc import NoResultFound
+
+from commandment.models import db, Device, ChangeCounter
+from commandment.pki.models import Certificate
+from commandment.signals import device_enrolled, device_unenrolled, device_token_expired
+
+DEVICE_CHANGE_COUNTER = 'devices'
+"""str: The name of the ChangeCounter incremented whenever cached device state changes."""
+
+
+class DeviceIdentity(NamedTuple):
+    """The device that an identity certificate is bound to."""
+    device_id: int
+    udid: str
+
+
+class DeviceIdentityCache(object):
+    """Bounded, thread-safe LRU of certificate fingerprint to :class:`DeviceIdentity`.
+
+    Args:
+          maxsize (int): Maximum number of bindings to keep.
+    """
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, fingerprint: bytes) -> Optional[DeviceIdentity]:
+        with self._lock:
+            identity = self._entries.get(fingerprint, None)
+            if identity is not None:
+                self._entries.move_to_end(fingerprint)
+
+            return identity
+
+    def put(self, fingerprint: bytes, identity: DeviceIdentity):
+        with self._lock:
+            self._entries[fingerprint] = identity
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, fingerprint: bytes):
+        with self._lock:
+            self._entries.pop(fingerprint, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+device_identity_cache = DeviceIdentityCache()
+"""DeviceIdentityCache: Bindings used by the check-in and command endpoints."""
+
+
+def certificate_fingerprint(certificate: x509.Certificate) -> bytes:
+    """The fingerprint of a certificate, in the form stored in ``Certificate.fingerprint``."""
+    return certificate.fingerprint(hashes.SHA256())
+
+
+def identity_for_certificate(certificate: x509.Certificate) -> Optional[DeviceIdentity]:
+    """Find the device bound to an identity certificate, using the cache before the database.
+
+    Returns:
+          DeviceIdentity or None if the certificate is not bound to any device.
+    """
+    fingerprint = certificate_fingerprint(certificate)
+    identity = device_identity_cache.get(fingerprint)
+    if identity is not None:
+        return identity
+
+    row = db.session.query(Device.id, Device.udid).join(
+        Certificate, Device.certificate_id == Certificate.id
+    ).filter(Certificate.fingerprint == fingerprint).first()
+
+    if row is None:
+        return None
+
+    identity = DeviceIdentity(row.id, row.udid)
+    device_identity_cache.put(fingerprint, identity)
+    return identity
+
+
+def _verify_signer(udid: str) -> Optional[DeviceIdentity]:
+    """Check that the device bound to the signer of the current request, if any, has the given UDID.
+
+    Aborts with 403 Forbidden if it does not, unless the flask setting DEBUG is true.
+    """
+    signers = getattr(g, 'signers', None)
+    if not signers:
+        return None
+
+    identity = identity_for_certificate(signers[0])
+    if identity is not None and identity.udid != udid:
+        current_app.logger.warning('Request for UDID %s was signed by the certificate of UDID %s',
+                                   udid, identity.udid)
+        if not current_app.config.get('DEBUG', False):
+            return abort(403)
+
+        return None
+
+    return identity
+
+
+def resolve_device(udid: str) -> Optional[Device]:
+    """Find the device making the current request.
+
+    If the request signature was verified and its signer certificate is bound to a device, that device is returned
+    without searching by UDID. A request whose UDID does not match the device bound to its signer is rejected with
+    403 Forbidden, unless the flask setting DEBUG is true.
+
+    Devices without a bound certificate, and requests without a verified signer, are found by UDID as before.
+
+    Args:
+          udid (str): The UDID given in the request.
+    Returns:
+          Device or None if there is no record of the device.
+    """
+    identity = _verify_signer(udid)
+    if identity is not None:
+        device = db.session.query(Device).get(identity.device_id)
+        if device is not None and device.udid == identity.udid:
+            return device
+
+        device_identity_cache.discard(certificate_fingerprint(g.signers[0]))
+
+    try:
+        return db.session.query(Device).filter(Device.udid == udid).one()
+    except NoResultFound:
+        return None
+
+
+class DeviceState(NamedTuple):
+    """The columns of a device needed to answer a check-in, without loading the whole row."""
+    id: int
+    udid: str
+    is_enrolled: bool
+    topic: Optional[str]
+    push_magic: Optional[str]
+
+
+class DeviceStateCache(object):
+    """Bounded, thread-safe LRU of UDID to :class:`DeviceState`.
+
+    Args:
+          maxsize (int): Maximum number of devices to keep.
+          sync_interval (int): Default number of seconds between reads of the devices ChangeCounter, if
+            DEVICE_CACHE_SYNC_INTERVAL is not configured.
+    """
+
+    def __init__(self, maxsize: int = 10000, sync_interval: int = 5) -> None:
+        self.maxsize = maxsize
+        self.sync_interval = sync_interval
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter: Optional[int] = None
+        self._synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, udid: str) -> Optional[DeviceState]:
+        self._sync()
+        with self._lock:
+            state = self._entries.get(udid, None)
+            if state is not None:
+                self._entries.move_to_end(udid)
+
+            return state
+
+    def put(self, state: DeviceState):
+        with self._lock:
+            self._entries[state.udid] = state
+            self._entries.move_to_end(state.udid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, udid: str):
+        with self._lock:
+            self._entries.pop(udid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counter = None
+            self._synced_at = 0.0
+
+    def _sync(self):
+        """Discard every entry if another process has changed a device since the counter was last read."""
+        interval = current_app.config.get('DEVICE_CACHE_SYNC_INTERVAL', self.sync_interval)
+        now = time.time()
+        if now - self._synced_at < interval:
+            return
+
+        counter = ChangeCounter.current(DEVICE_CHANGE_COUNTER)
+        with self._lock:
+            if counter != self._counter:
+                self._entries.clear()
+                self._counter = counter
+
+            self._synced_at = now
+
+
+device_state_cache = DeviceStateCache()
+"""DeviceStateCache: Device state used by the check-in and command endpoints."""
+
+
+def resolve_device_state(udid: str) -> Optional[DeviceState]:
+    """Find the device making the current request, like :func:`resolve_device`, without loading the Device row.
+
+    Args:
+          udid (str): The UDID given in the request.
+    Returns:
+          DeviceState or None if there is no record of the device.
+    """
+    identity = _verify_signer(udid)
+
+    state = device_state_cache.get(udid)
+    if state is not None:
+        return state
+
+    query = db.session.query(Device.id, Device.udid, Device.is_enrolled, Device.topic, Device.push_magic)
+    if identity is not None:
+        query = query.filter(Device.id == identity.device_id)
+    else:
+        query = query.filter(Device.udid == udid)
+
+    row = query.first()
+    if row is None:
+        return None
+
+    state = DeviceState(row.id, row.udid, row.is_enrolled, row.topic, row.push_magic)
+    device_state_cache.put(state)
+    return state
+
+
+def touch_device(state: DeviceState) -> bool:
+    """Record that the device was seen now, without loading the Device row.
+
+    Returns:
+          False if no device has the id of the state, in which case it is discarded from the cache. The device may
+            have been deleted, or re-enrolled with a new id by another process.
+    """
+    updated = db.session.query(Device).filter(Device.id == state.id).update(
+        {Device.last_seen: datetime.utcnow()}, synchronize_session=False)
+
+    if updated == 0:
+        device_state_cache.discard(state.udid)
+        return False
+
+    return True
+
+
+def invalidate_device(device: Device):
+    """Discard the cached state of a device in every process.
+
+    The ChangeCounter is incremented as part of the current transaction, so the caller must commit.
+    """
+    device_state_cache.discard(device.udid)
+    ChangeCounter.increment(DEVICE_CHANGE_COUNTER)
+
+
+@device_enrolled.connect
+@device_unenrolled.connect
+@device_token_expired.connect
+def _device_changed(device: Device, **kwargs):
+    invalidate_device(device)
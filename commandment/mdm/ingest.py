@@ -0,0 +1,177 @@
+"""
+Write-behind queue for large command responses.
+
+Handlers such as ``ack_installed_app_list`` replace hundreds of rows, and used to do so while the device and a web
+worker waited for the reply to ``/mdm``. If the RequestType of a command is listed in ``MDM_DEFERRED_RESPONSE_TYPES``,
+an Acknowledged response is instead stored in the ``queued_responses`` table exactly as it was received, and the device
+is sent its next command straight away. Response workers (see :mod:`commandment.threads.response_thread`) claim
+queued responses in batches across every device and pass them to the command router as if they had just arrived.
+
+Each of the deferred responses describes the whole of some inventory, so only the latest response for a device and
+request type is ever processed. Older responses that have not been claimed are deleted when a new one is queued, and
+any that remain in a claimed batch are discarded without being handled.
+
+A claim is a lease: responses claimed by a worker that has not finished with them after ``MDM_RESPONSE_LEASE`` seconds
+may be claimed by another worker.
+"""
+import io
+from datetime import datetime, timedelta
+from typing import List, Tuple
+from uuid import uuid4
+
+from flask import current_app
+from sqlalchemy import or_, and_, exists
+from sqlalchemy.orm import aliased
+
+from commandment.decorators import STREAMED_ARRAYS
+from commandment.models import db, Command, Device, QueuedResponse
+from commandment.plistutil import streaming
+from commandment.signals import command_response_queued
+
+
+def is_deferred(request_type: str) -> bool:
+    """Whether Acknowledged responses to commands of this RequestType are queued instead of handled immediately."""
+    return request_type in current_app.config.get('MDM_DEFERRED_RESPONSE_TYPES', ())
+
+
+def enqueue_response(command: Command, device_id: int, body: bytes) -> QueuedResponse:
+    """Queue a command response for a response worker, and commit.
+
+    Any unclaimed response to the same RequestType from the same device is superseded and deleted.
+
+    Args:
+          command (Command): The command that the device responded to.
+          device_id (int): The device that sent the response.
+          body (bytes): The response as it was received.
+    Returns:
+          QueuedResponse: The queued response.
+    """
+    db.session.query(QueuedResponse).filter(
+        QueuedResponse.device_id == device_id,
+        QueuedResponse.request_type == command.request_type,
+        QueuedResponse.claimed_by == None,
+    ).delete(synchronize_session=False)
+
+    queued = QueuedResponse(device_id=device_id, command_id=command.id, request_type=command.request_type, body=body,
+                            received_at=datetime.utcnow(), attempts=0)
+    db.session.add(queued)
+    db.session.commit()
+
+    command_response_queued.send(queued)
+    return queued
+
+
+def claim_batch(worker: str, limit: int, lease: int) -> List[QueuedResponse]:
+    """Claim up to ``limit`` of the oldest queued responses, and commit.
+
+    A response is not claimed while another response from the same device and of the same request type is held by
+    a worker, so that responses for a device are never processed out of order.
+
+    Args:
+          worker (str): Identifies the worker, for diagnostics.
+          limit (int): The maximum number of responses to claim.
+          lease (int): Seconds after which a claim made by another worker is considered abandoned.
+    Returns:
+          List[QueuedResponse]: The claimed responses, in the order they were received.
+    """
+    now = datetime.utcnow()
+    claimable = or_(QueuedResponse.claimed_by == None, QueuedResponse.claimed_at < now - timedelta(seconds=lease))
+
+    held = aliased(QueuedResponse)
+    ids = [row.id for row in db.session.query(QueuedResponse.id).filter(
+        claimable,
+        ~exists().where(and_(
+            held.device_id == QueuedResponse.device_id,
+            held.request_type == QueuedResponse.request_type,
+            held.id != QueuedResponse.id,
+            held.claimed_at >= now - timedelta(seconds=lease),
+        )),
+    ).order_by(QueuedResponse.id).limit(limit)]
+
+    if len(ids) == 0:
+        return []
+
+    token = '{}/{}'.format(worker, uuid4())
+    db.session.query(QueuedResponse).filter(QueuedResponse.id.in_(ids), claimable).update({
+        QueuedResponse.claimed_by: token,
+        QueuedResponse.claimed_at: now,
+    }, synchronize_session=False)
+    db.session.commit()
+
+    return db.session.query(QueuedResponse).filter(QueuedResponse.claimed_by == token).order_by(QueuedResponse.id).all()
+
+
+def coalesce(responses: List[QueuedResponse]) -> Tuple[List[QueuedResponse], List[QueuedResponse]]:
+    """Split responses into the latest for each device and request type, and those superseded by them.
+
+    Returns:
+          Tuple[List[QueuedResponse], List[QueuedResponse]]: latest, superseded
+    """
+    latest = {}
+    superseded = []
+    for queued in responses:
+        key = (queued.device_id, queued.request_type)
+        if key in latest:
+            superseded.append(latest[key])
+        latest[key] = queued
+
+    return sorted(latest.values(), key=lambda q: q.id), superseded
+
+
+def process_response(queued: QueuedResponse):
+    """Pass a queued response to the handler for its request type."""
+    command = db.session.query(Command).get(queued.command_id)
+    device = db.session.query(Device).get(queued.device_id)
+    if command is None or device is None:
+        current_app.logger.info('Discarding queued %s response, the command or device no longer exists',
+                                queued.request_type)
+        return
+
+    from commandment.mdm.app import command_router  # mdm.app imports this module
+    command_router.handle(command, device, streaming.load(io.BytesIO(queued.body), stream_arrays=STREAMED_ARRAYS))
+
+
+def process_batch(worker: str, limit: int = 50, lease: int = 300, max_attempts: int = 3) -> int:
+    """Claim and process a batch of queued responses.
+
+    A response that cannot be processed is released so that it can be retried, until it has failed ``max_attempts``
+    times, after which it is discarded.
+
+    Returns:
+          int: The number of responses claimed, including superseded responses.
+    """
+    batch = claim_batch(worker, limit, lease)
+    latest, superseded = coalesce(batch)
+
+    if len(superseded) > 0:
+        current_app.logger.debug('Discarding %d superseded response(s)', len(superseded))
+        db.session.query(QueuedResponse).filter(QueuedResponse.id.in_([q.id for q in superseded])).delete(
+            synchronize_session=False)
+        db.session.commit()
+
+    for queued in latest:
+        queued_id, request_type, attempts = queued.id, queued.request_type, queued.attempts
+
+        try:
+            process_response(queued)
+        except Exception:
+            db.session.rollback()
+            attempts += 1
+            if attempts >= max_attempts:
+                current_app.logger.exception('Discarding queued %s response after %d attempt(s)', request_type,
+                                             attempts)
+                db.session.query(QueuedResponse).filter(QueuedResponse.id == queued_id).delete(
+                    synchronize_session=False)
+            else:
+                current_app.logger.exception('Could not process queued %s response, will retry', request_type)
+                db.session.query(QueuedResponse).filter(QueuedResponse.id == queued_id).update({
+                    QueuedResponse.claimed_by: None,
+                    QueuedResponse.claimed_at: None,
+                    QueuedResponse.attempts: attempts,
+                }, synchronize_session=False)
+        else:
+            db.session.query(QueuedResponse).filter(QueuedResponse.id == queued_id).delete(synchronize_session=False)
+
+        db.session.commit()
+
+    return len(batch)
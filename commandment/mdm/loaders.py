@@ -0,0 +1,209 @@
+"""
+Compiled loaders for MDM command responses.
+
+Loading a large response such as ``InstalledApplicationList`` with its marshmallow schema walks the whole Unmarshaller
+machinery for every field of every item, and then constructs a model instance for every item in ``post_load``. The
+handlers only need the column values, which they insert in bulk.
+
+:func:`compile_loader` reads the declared fields of a response schema once and builds a loader that converts the
+plist dictionary into plain column dictionaries in a single pass. ``post_load`` processors are not run, so nested items
+are returned as dicts keyed by attribute name instead of model instances.
+
+The conversions follow marshmallow 2, which does not fail the whole load when a single field is invalid:
+
+- A missing key is omitted from the result.
+- A value that the field would reject, including None, is omitted from the result.
+- Items of a nested list that are not dictionaries are omitted.
+
+A nested list which is a :class:`~commandment.plistutil.streaming.StreamedArray` is loaded as a generator, which
+converts each item as it is parsed, so that the list is never held in memory.
+
+Unlike marshmallow, which skips ``post_load`` for a nested object with any invalid field, the attributes listed in a
+schema's ``FLATTEN`` are always merged into their parent.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from marshmallow import Schema, fields, missing, ValidationError
+
+from commandment.plistutil.streaming import StreamedArray
+
+from .response_schema import DeviceInformationResponse, InstalledApplicationListResponse, ProfileListResponse, \
+    AvailableOSUpdateListResponse
+
+Converter = Callable[[Any], Any]
+
+
+class Invalid(Exception):
+    """Raised by a converter when the value would not pass validation."""
+    pass
+
+
+def _string(value: Any) -> str:
+    if type(value) is str:
+        return value
+    if isinstance(value, bytes):
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            raise Invalid()
+
+    raise Invalid()
+
+
+def _boolean(field: fields.Boolean) -> Converter:
+    truthy = field.truthy
+    falsy = field.falsy
+
+    def convert(value: Any) -> bool:
+        try:
+            if value in truthy:
+                return True
+            elif value in falsy:
+                return False
+        except TypeError:
+            pass
+
+        raise Invalid()
+
+    return convert
+
+
+def _number(num_type: type) -> Converter:
+    def convert(value: Any):
+        try:
+            return num_type(value)
+        except (TypeError, ValueError):
+            raise Invalid()
+
+    return convert
+
+
+def _generic(field: fields.Field) -> Converter:
+    """Fall back to the field itself for types without an inline conversion, eg. Date, UUID or List."""
+    def convert(value: Any):
+        try:
+            return field.deserialize(value)
+        except ValidationError:
+            raise Invalid()
+
+    return convert
+
+
+def _nested(field: fields.Nested) -> Converter:
+    loader = compile_loader(type(field.schema))
+
+    if field.many:
+        def convert(value: Any) -> Iterable[dict]:
+            if isinstance(value, StreamedArray):
+                return (loader(item) for item in value if isinstance(item, dict))
+            if not isinstance(value, (list, tuple)):
+                raise Invalid()
+
+            return [loader(item) for item in value if isinstance(item, dict)]
+    else:
+        def convert(value: Any) -> dict:
+            if not isinstance(value, dict):
+                raise Invalid()
+
+            return loader(value)
+
+    return convert
+
+
+def _converter(field: fields.Field) -> Converter:
+    if field.validators:
+        return _generic(field)
+
+    field_type = type(field)
+    if field_type is fields.String:
+        return _string
+    if field_type is fields.Boolean and field.truthy:
+        return _boolean(field)
+    if field_type in (fields.Integer, fields.Float, fields.Number) and not field.as_string:
+        return _number(field.num_type)
+    if field_type is fields.Nested:
+        return _nested(field)
+
+    return _generic(field)
+
+
+class CompiledLoader(object):
+    """Converts a plist dictionary to a dictionary keyed by the attribute names of a schema.
+
+    Use :func:`compile_loader` to get an instance.
+
+    Args:
+          schema_cls (Type[Schema]): The schema to compile.
+          flatten (Tuple[str]): Attributes of nested single objects whose contents are merged into the result.
+    """
+
+    def __init__(self, schema_cls: Type[Schema], flatten: Tuple[str, ...] = ()) -> None:
+        self.schema_cls = schema_cls
+        self.flatten = flatten
+        self._fields: List[Tuple[str, Optional[str], str, Converter, bool, Any]] = []
+
+        schema = schema_cls()
+        for name, field in schema.fields.items():
+            if field.dump_only:
+                continue
+
+            self._fields.append((
+                name,
+                field.load_from,
+                field.attribute or name,
+                _converter(field),
+                field.allow_none is True,
+                field.missing,
+            ))
+
+    def __call__(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        result = {}
+        for name, load_from, attribute, convert, allow_none, default in self._fields:
+            value = data.get(name, missing)
+            if value is missing and load_from:
+                value = data.get(load_from, missing)
+            if value is missing:
+                if default is missing:
+                    continue
+                value = default() if callable(default) else default
+
+            if value is None:
+                if allow_none:
+                    result[attribute] = None
+                continue
+
+            try:
+                result[attribute] = convert(value)
+            except Invalid:
+                continue
+
+        for attribute in self.flatten:
+            result.update(result.pop(attribute, None) or {})
+
+        return result
+
+
+_compiled: Dict[Type[Schema], CompiledLoader] = {}
+
+
+def compile_loader(schema_cls: Type[Schema]) -> CompiledLoader:
+    """Get the compiled loader for a schema class, compiling it on first use."""
+    loader = _compiled.get(schema_cls, None)
+    if loader is None:
+        loader = CompiledLoader(schema_cls, getattr(schema_cls, 'FLATTEN', ()))
+        _compiled[schema_cls] = loader
+
+    return loader
+
+
+load_device_information = compile_loader(DeviceInformationResponse)
+"""CompiledLoader: Loads a ``DeviceInformation`` response, ``QueryResponses`` contains Device attributes."""
+
+load_installed_application_list = compile_loader(InstalledApplicationListResponse)
+"""CompiledLoader: Loads an ``InstalledApplicationList`` response into InstalledApplication columns."""
+
+load_profile_list = compile_loader(ProfileListResponse)
+"""CompiledLoader: Loads a ``ProfileList`` response into InstalledProfile and InstalledPayload columns."""
+
+load_available_os_updates = compile_loader(AvailableOSUpdateListResponse)
+"""CompiledLoader: Loads an ``AvailableOSUpdates`` response into AvailableOSUpdate columns."""
@@ -1,12 +1,13 @@
-from flask_rest_jsonapi import ResourceDetail, ResourceList, ResourceRelationship
+from flask_rest_jsonapi import ResourceDetail, ResourceRelationship
 from flask_rest_jsonapi.exceptions import ObjectNotFound
 from sqlalchemy.orm.exc import NoResultFound
 
+from commandment.api.pagination import KeysetDataLayer, KeysetResourceList
 from commandment.mdm.schema import CommandSchema
 from commandment.models import db, Command, Device
 
 
-class CommandsList(ResourceList):
+class CommandsList(KeysetResourceList):
     def query(self, view_kwargs):
         query_ = self.session.query(Command)
         if view_kwargs.get('device_id') is not None:
@@ -21,9 +22,12 @@ class CommandsList(ResourceList):
     schema = CommandSchema
     view_kwargs = True
     data_layer = {
+        'class': KeysetDataLayer,
         'session': db.session,
         'model': Command,
-        'methods': {'query': query}
+        'methods': {'query': query},
+        'keyset_sort': ['id', 'sent_at', 'acknowledged_at'],
+        'eager_load': {'device': 'noload'},
     }
 
 
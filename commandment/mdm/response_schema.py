@@ -49,6 +49,9 @@ class OSUpdateSettings(Schema):
 
 
 class DeviceInformation(Schema):
+    FLATTEN = ('os_update_settings',)
+    """tuple: Nested attributes whose contents are merged into the result, because they are columns of the Device."""
+
     # Table 5
     UDID = fields.String(attribute='udid')
     # Languages
@@ -113,9 +116,8 @@ class DeviceInformation(Schema):
 
     @post_load
     def normalize_osu(self, data):
-        print(data)
-        for k, v in data.get('os_update_settings', {}).items():
-            setattr(data, k, v)
+        for attribute in self.FLATTEN:
+            data.update(data.pop(attribute, None) or {})
         return data
 
 
@@ -1,10 +1,14 @@
 """This module contains routers which direct the request towards a certain module or function based upon the CONTENT
 of the request, rather than the URL."""
 
+import time
 from typing import Union, Any, Type, Callable, Dict, List
-from flask import Flask, app, Blueprint, request, abort, current_app
+from flask import Flask, app, Blueprint, abort, current_app
 from functools import wraps
-import biplist
+from commandment.decorators import request_body, DEBUG_BODY_PREFIX
+from commandment.metrics import checkin_messages, command_handler_seconds
+from commandment import profiling
+from commandment.plistutil import streaming
 from commandment.models import db, Device, Command
 from commandment.mdm import commands
 
@@ -30,7 +34,11 @@ class CommandRouter(object):
     def handle(self, command: Command, device: Device, response: dict):
         current_app.logger.debug('Looking for handler using command: {}'.format(command.request_type))
         if command.request_type in self._handlers:
-            return self._handlers[command.request_type](command, device, response)
+            started = time.perf_counter()
+            try:
+                return self._handlers[command.request_type](command, device, response)
+            finally:
+                command_handler_seconds.observe(time.perf_counter() - started, command.request_type)
         else:
             current_app.logger.warning('No handler found to process command response: {}'.format(command.request_type))
             return None
@@ -68,13 +76,14 @@ class PlistRouter(object):
         self.kv_routes: List[Dict[str, Any]] = []
 
     def view(self):
-        current_app.logger.debug(request.data)
+        body = request_body()
+        if current_app.debug:
+            current_app.logger.debug(body.read(DEBUG_BODY_PREFIX))
+            body.seek(0)
 
         try:
-            plist_data = biplist.readPlistFromString(request.data)
-        except biplist.NotBinaryPlistException:
-            abort(400, 'The request body does not contain a plist as expected')
-        except biplist.InvalidPlistException:
+            plist_data = streaming.load(body)
+        except streaming.InvalidPlist:
             abort(400, 'The request body does not contain a valid plist')
 
         for kvr in self.kv_routes:
@@ -82,8 +91,11 @@ class PlistRouter(object):
                 continue
 
             if plist_data[kvr['key']] == kvr['value']:
+                checkin_messages.inc(str(kvr['value']))
+                profiling.tag(str(kvr['value']))
                 return kvr['handler'](plist_data)
 
+        checkin_messages.inc('unknown')
         abort(404, 'No matching plist route')
 
     def route(self, key: str, value: Any):
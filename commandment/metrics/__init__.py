@@ -0,0 +1,226 @@
+"""
+Counters, gauges and histograms, exposed in the Prometheus text format at ``/metrics`` (see
+:mod:`commandment.metrics.app`).
+
+Recording a value takes an uncontended lock and a dict update, so metrics can be recorded on the check-in hot path.
+Values are kept per process: with several web or worker processes, each process must be scraped, and the results
+summed by Prometheus.
+
+Attributes:
+    registry (Registry): Every metric defined in this module.
+"""
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Tuple[float]: Histogram bucket upper bounds, in seconds."""
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+"""Tuple[float]: Histogram bucket upper bounds for the number of database queries made by a request."""
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(object):
+    """Base class of a metric with zero or more labels.
+
+    Args:
+          name (str): The metric name.
+          documentation (str): The help text.
+          labelnames (Sequence[str]): The label names. Values are passed positionally, in the same order.
+    """
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _labels(self, labelvalues: LabelValues, extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labelnames, labelvalues))
+        if extra:
+            pairs.extend(extra.items())
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(k, _escape(str(v))) for k, v in pairs) + '}'
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def expose(self) -> Iterator[str]:
+        yield '# HELP {} {}'.format(self.name, self.documentation)
+        yield '# TYPE {} {}'.format(self.name, self.type)
+        yield from self.samples()
+
+
+class Counter(Metric):
+    """A value which only increases, eg. the number of check-ins."""
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super(Counter, self).__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in sorted(values):
+            yield '{}{} {}'.format(self.name, self._labels(labelvalues), _format_value(value))
+
+
+class Gauge(Metric):
+    """A value which may go up and down, eg. the number of queued commands."""
+    type = 'gauge'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super(Gauge, self).__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def replace(self, values: Dict[LabelValues, float]):
+        """Replace every value, so that label values which are no longer present are not exposed."""
+        with self._lock:
+            self._values = dict(values)
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in sorted(values):
+            yield '{}{} {}'.format(self.name, self._labels(labelvalues), _format_value(value))
+
+
+class Histogram(Metric):
+    """The distribution of a value, eg. the duration of a command handler, counted into buckets.
+
+    Args:
+          buckets (Sequence[float]): The bucket upper bounds, in increasing order. +Inf is added.
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: a non-cumulative count per bucket (the last is +Inf), the sum and the count.
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, *labelvalues: str) -> int:
+        entry = self._values.get(labelvalues)
+        return sum(entry[0]) if entry is not None else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(k, (list(counts), total[0])) for k, (counts, total) in self._values.items()]
+
+        for labelvalues, (counts, total) in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield '{}_bucket{} {}'.format(
+                    self.name, self._labels(labelvalues, {'le': _format_value(float(bound))}), cumulative)
+            yield '{}_sum{} {}'.format(self.name, self._labels(labelvalues), _format_value(total))
+            yield '{}_count{} {}'.format(self.name, self._labels(labelvalues), cumulative)
+
+
+class Registry(object):
+    """A collection of metrics, and callbacks which update gauges when the metrics are exposed."""
+
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def on_collect(self, callback: Callable[[], None]):
+        """Call ``callback`` every time the metrics are exposed, eg. to set a gauge from the database."""
+        if callback not in self._collectors:
+            self._collectors.append(callback)
+
+    def expose(self) -> str:
+        """Run the collect callbacks, and format every metric in the Prometheus text format (version 0.0.4)."""
+        for callback in self._collectors:
+            callback()
+
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+checkin_messages = registry.register(Counter(
+    'commandment_checkin_messages_total', 'Check-in messages received, by MessageType.', ['message_type']))
+
+mdm_requests = registry.register(Counter(
+    'commandment_mdm_requests_total', 'Requests to the MDM endpoint, by the Status reported by the device.',
+    ['status']))
+
+command_handler_seconds = registry.register(Histogram(
+    'commandment_command_handler_seconds', 'Time taken to handle a command response, by RequestType.',
+    ['request_type']))
+
+commands = registry.register(Gauge(
+    'commandment_commands', 'Commands in the database, by status.', ['status']))
+
+apns_pushes = registry.register(Counter(
+    'commandment_apns_pushes_total', 'Pushes sent to APNs, by response status code.', ['status_code']))
+
+api_request_seconds = registry.register(Histogram(
+    'commandment_api_request_seconds', 'Time taken by requests to Apple services, by service and status code.',
+    ['service', 'status_code']))
+
+request_queries = registry.register(Histogram(
+    'commandment_request_queries', 'Database queries made to handle a request, by endpoint.', ['endpoint'],
+    buckets=QUERY_BUCKETS))
+
+
+def api_response_hook(service: str) -> Callable:
+    """Create a ``requests`` response hook which records the latency of each response in ``api_request_seconds``.
+
+    Args:
+          service (str): The label value, eg. 'dep' or 'vpp'.
+    """
+    def hook(response, *args, **kwargs):
+        api_request_seconds.observe(response.elapsed.total_seconds(), service, str(response.status_code))
+
+    return hook
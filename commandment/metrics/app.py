@@ -0,0 +1,42 @@
+"""
+The ``/metrics`` endpoint, and the per-request database query count.
+
+The statements executed by each request are recorded by :mod:`commandment.querylog`, and their number is observed in
+``commandment_request_queries`` when the request is torn down.
+"""
+from flask import Blueprint, Flask, Response, request
+from sqlalchemy import func
+
+from commandment import querylog
+from commandment.metrics import registry, commands, request_queries
+from commandment.models import db, Command
+
+metrics_app = Blueprint('metrics_app', __name__)
+
+
+def _record_queries(exc=None):
+    log = querylog.current_log()
+    request_queries.observe(log.count if log is not None else 0, request.endpoint or 'none')
+
+
+def _collect_commands():
+    counts = db.session.query(Command.status, func.count(Command.id)).group_by(Command.status).all()
+    commands.replace({(status.value,): count for status, count in counts})
+
+
+@metrics_app.record_once
+def _init_app(state):
+    app: Flask = state.app
+    querylog.record_requests(app)
+    app.teardown_request(_record_queries)
+    registry.on_collect(_collect_commands)
+
+
+@metrics_app.route('/metrics')
+def metrics():
+    """Expose the metrics of this process in the Prometheus text format.
+
+    :resheader Content-Type: text/plain; version=0.0.4
+    :status 200: The metrics
+    """
+    return Response(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
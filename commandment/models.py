@@ -268,7 +268,7 @@ class Device(db.Model):
         else:
             return hexlify(self.token).decode('utf8')
 
-    certificate_id = db.Column(db.Integer, db.ForeignKey('certificates.id'))
+    certificate_id = db.Column(db.Integer, db.ForeignKey('certificates.id'), index=True)
     certificate = db.relationship('Certificate', backref='devices')
 
     dep_profile_id = db.Column(db.Integer, db.ForeignKey('dep_profiles.id'))
@@ -295,9 +295,14 @@ class Device(db.Model):
 
     @property
     def platform(self) -> Platform:
-        if self.model_name in ['iMac', 'MacBook Pro', 'MacBook Air', 'Mac Pro']:  # TODO: obviously not sufficient
+        return Device.platform_for_model_name(self.model_name)
+
+    @staticmethod
+    def platform_for_model_name(model_name: Optional[str]) -> Platform:
+        """The platform of a device with the given model_name, without loading the device."""
+        if model_name in ['iMac', 'MacBook Pro', 'MacBook Air', 'Mac Pro']:  # TODO: obviously not sufficient
             return Platform.macOS
-        elif self.model_name in ['iPhone', 'iPad']:
+        elif model_name in ['iPhone', 'iPad']:
             return Platform.iOS
         else:
             return Platform.Unknown
@@ -339,9 +344,9 @@ class Command(db.Model):
     """status (CommandStatus): The status of the command."""
     queued_at = db.Column(db.DateTime, default=datetime.datetime.utcnow(), server_default=db.text('CURRENT_TIMESTAMP'))
     """queued_at (datetime.datetime): The datetime (utc) of when the command was created. Defaults to UTC now"""
-    sent_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True, index=True)
     """sent_at (datetime.datetime): The datetime (utc) of when the command was delivered to the client."""
-    acknowledged_at = db.Column(db.DateTime, nullable=True)
+    acknowledged_at = db.Column(db.DateTime, nullable=True, index=True)
     """acknowledged_at (datetime.datetime): The datetime (utc) of when the Acknowledged, Error or NotNow response was
         returned."""
     # command must only be sent after this date
@@ -401,14 +406,14 @@ class Command(db.Model):
         - The `after` field is in the past, or empty.
 
         Args:
-            device (Device): The database model matching the device checking in.
+            device (Device): The database model matching the device checking in, or any object with its `id`.
 
         Returns:
             Command: The next command model to be processed.
         """
         # d == d AND (q_status == Q OR (q_status == R AND result == 'NotNow'))
         return cls.query.filter(db.and_(
-            cls.device == device,
+            cls.device_id == device.id,
             cls.status == CommandStatus.Queued.value)).order_by(cls.id).first()
 
     @classmethod
@@ -577,3 +582,66 @@ class Tag(db.Model):
     # )
 
 
+
+
+class ChangeCounter(db.Model):
+    """This table holds named counters that are incremented whenever the data they describe changes.
+
+    Processes that cache that data compare the counter against the value they last saw, to find out whether another
+    process has made a change.
+
+    :table: change_counters
+    """
+    __tablename__ = 'change_counters'
+
+    name = db.Column(db.String, primary_key=True)
+    """name (str): The name of the cached data, eg. 'devices'"""
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    """value (int): The number of changes made"""
+
+    @classmethod
+    def increment(cls, name: str):
+        """Increment the named counter as part of the current transaction."""
+        updated = db.session.query(cls).filter(cls.name == name).update(
+            {cls.value: cls.value + 1}, synchronize_session=False)
+        if updated == 0:
+            db.session.add(cls(name=name, value=1))
+
+    @classmethod
+    def current(cls, name: str) -> int:
+        """Get the value of the named counter."""
+        return db.session.query(cls.value).filter(cls.name == name).scalar() or 0
+
+
+class QueuedResponse(db.Model):
+    """A command response that was accepted by the MDM endpoint and is waiting to be processed by a response worker.
+
+    Only the latest unprocessed response for each device and request type is kept, because each of the deferred
+    responses (eg. InstalledApplicationList) replaces the whole inventory it describes.
+
+    :table: queued_responses
+    """
+    __tablename__ = 'queued_responses'
+
+    id = db.Column(db.Integer, primary_key=True)
+    """id (int): ID, responses are processed in ascending order"""
+    device_id = db.Column(db.ForeignKey('devices.id'), nullable=False)
+    """device_id (int): The device that sent the response."""
+    command_id = db.Column(db.ForeignKey('commands.id'), nullable=False)
+    """command_id (int): The command that the device responded to."""
+    request_type = db.Column(db.String, nullable=False)
+    """request_type (str): The RequestType of the command, used to coalesce responses."""
+    body = db.Column(db.LargeBinary, nullable=False)
+    """body (bytes): The response exactly as it was received, as a property list."""
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    """received_at (datetime.datetime): The datetime (utc) that the response was received."""
+    claimed_by = db.Column(db.String, nullable=True)
+    """claimed_by (str): The token of the worker processing the response, if any."""
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    """claimed_at (datetime.datetime): The datetime (utc) that a worker claimed the response."""
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    """attempts (int): The number of times that processing the response has failed."""
+
+    __table_args__ = (
+        db.Index('ix_queued_responses_device_id_request_type', 'device_id', 'request_type'),
+    )
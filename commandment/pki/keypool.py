@@ -0,0 +1,70 @@
+"""
+Pre-generated RSA private key pool.
+
+Generating a 2048 bit RSA key takes tens to hundreds of milliseconds, which would otherwise be paid on the request path
+for every device identity issued. Keys are generated ahead of time and stored as ``rsa_private_keys`` rows with
+``pooled`` set. :meth:`commandment.pki.models.RSAPrivateKey.take_pooled` hands them out atomically, so the pool can be
+shared by every worker process.
+"""
+import logging
+from typing import List
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from sqlalchemy.orm import Session
+
+from commandment.pki.models import RSAPrivateKey
+
+logger = logging.getLogger(__name__)
+
+
+def generate_pem_private_key(key_size: int = 2048) -> bytes:
+    """Generate an RSA private key, returning the PKCS#8 PEM encoding used by RSAPrivateKey.pem_data"""
+    private_key = rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=key_size,
+        backend=default_backend(),
+    )
+
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+def pooled_key_count(session: Session) -> int:
+    """Get the number of keys available in the pool."""
+    return session.query(RSAPrivateKey).filter(RSAPrivateKey.pooled == True).count()
+
+
+def fill_pool(session: Session, size: int, key_size: int = 2048, batch_size: int = 10) -> int:
+    """Generate keys until the pool holds at least ``size`` keys.
+
+    Keys are committed in batches so that they become available to other processes while the pool is still filling.
+
+    Args:
+        session (Session): The session to write keys with.
+        size (int): The target number of pooled keys.
+        key_size (int): RSA key size in bits.
+        batch_size (int): Number of keys to generate between commits.
+    Returns:
+        int: The number of keys generated.
+    """
+    missing = size - pooled_key_count(session)
+    generated = 0
+
+    while generated < missing:
+        batch: List[dict] = []
+        for _ in range(min(batch_size, missing - generated)):
+            batch.append({'pem_data': generate_pem_private_key(key_size), 'pooled': True})
+
+        session.bulk_insert_mappings(RSAPrivateKey, batch)
+        session.commit()
+        generated += len(batch)
+
+    if generated > 0:
+        logger.info('Generated %d RSA private key(s) for the key pool', generated)
+
+    return generated
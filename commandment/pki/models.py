@@ -2,8 +2,13 @@
 This module contains the SQLAlchemy models for PKI related functionality.
 """
 from enum import Enum
+import threading
+from typing import List, Dict, Tuple
+import sqlalchemy
+from sqlalchemy.orm.attributes import set_committed_value
 
 from commandment.models import db
+from commandment.signals import rsa_private_key_taken
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
@@ -76,6 +81,7 @@ class CertificateAuthority(db.Model):
         """
         Create a Certificate Signing Request with the specified Common Name.
 
+        The private key is taken from the pre-generated key pool if one is available, otherwise it is generated.
         The private key model is automatically committed to the database.
         This is also true for the certificate signing request.
 
@@ -86,14 +92,20 @@ class CertificateAuthority(db.Model):
             Tuple[rsa.RSAPrivateKeyWithSerialization, x509.CertificateSigningRequest] - A tuple containing the RSA
             Private key that was generated, along with the CSR.
         """
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048,
-            backend=default_backend(),
-        )
+        private_key_model = RSAPrivateKey.take_pooled()
+        if private_key_model is not None:
+            private_key = private_key_model.to_crypto()
+        else:
+            private_key = rsa.generate_private_key(
+                public_exponent=65537,
+                key_size=2048,
+                backend=default_backend(),
+            )
+
+            private_key_model = RSAPrivateKey.from_crypto(private_key)
+            db.session.add(private_key_model)
 
-        private_key_model = RSAPrivateKey.from_crypto(private_key)
-        db.session.add(private_key_model)
+        rsa_private_key_taken.send(self, pooled=private_key_model.pooled is not None)
 
         name = x509.Name([
             x509.NameAttribute(NameOID.COMMON_NAME, common_name),
@@ -117,50 +129,108 @@ class CertificateAuthority(db.Model):
 
         return private_key, request
 
+    def signing_context(self) -> 'CASigningContext':
+        """Get the signing context for this CA, deserializing the CA private key only once per process."""
+        key = (self.id, self.rsa_private_key_id, self.common_name)
+        with _signing_contexts_lock:
+            context = _signing_contexts.get(key, None)
+            if context is None:
+                context = CASigningContext(self.rsa_private_key.to_crypto(), x509.Name([
+                    x509.NameAttribute(NameOID.COMMON_NAME, self.common_name),
+                    x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'commandment')
+                ]))
+                _signing_contexts[key] = context
+
+        return context
+
+    def allocate_serials(self, count: int = 1) -> int:
+        """Allocate a contiguous range of certificate serial numbers.
+
+        The counter is incremented with a single ``UPDATE ... SET serial = serial + count`` so that concurrent workers
+        never receive the same serial. The row stays locked until the current transaction ends, so callers should
+        commit soon after.
+
+        Args:
+            count (int): Number of serials to allocate.
+        Returns:
+            int: The first serial of the allocated range.
+        """
+        table = CertificateAuthority.__table__
+        stmt = table.update().where(table.c.id == self.id).values(
+            serial=sqlalchemy.func.coalesce(table.c.serial, 0) + count)
+
+        if db.session.get_bind().dialect.name == 'postgresql':
+            last = db.session.execute(stmt.returning(table.c.serial)).scalar()
+        else:
+            db.session.execute(stmt)
+            last = db.session.execute(sqlalchemy.select([table.c.serial]).where(table.c.id == self.id)).scalar()
+
+        set_committed_value(self, 'serial', last)
+        return last - count + 1
+
     def sign(self, request: x509.CertificateSigningRequest) -> x509.Certificate:
         """
         Sign a Certificate Signing Request.
 
-        The issued certificate is automatically persisted to the database.
-
         Args:
             request (x509.CertificateSigningRequest): The CSR object (cryptography) not the SQLAlchemy model.
 
         Returns:
             x509.Certificate: A signed certificate
         """
-        b = x509.CertificateBuilder()
-        self.serial += 1
+        return self.sign_many([request])[0]
 
-        private_key_model = self.rsa_private_key
-        private_key = private_key_model.to_crypto()
-        # ca_certificate_model = self.certificate
-        # ca_certificate = ca_certificate_model.to_crypto()
+    def sign_many(self, requests: List[x509.CertificateSigningRequest]) -> List[x509.Certificate]:
+        """
+        Sign a number of Certificate Signing Requests, allocating all of their serial numbers at once.
 
-        name = x509.Name([
-            x509.NameAttribute(NameOID.COMMON_NAME, self.common_name),
-            x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'commandment')
-        ])
+        Args:
+            requests (List[x509.CertificateSigningRequest]): The CSR objects (cryptography).
 
-        cert = b.not_valid_before(
-            datetime.datetime.utcnow()
+        Returns:
+            List[x509.Certificate]: Signed certificates in the same order as the requests.
+        """
+        if len(requests) == 0:
+            return []
+
+        context = self.signing_context()
+        first_serial = self.allocate_serials(len(requests))
+
+        return [context.sign(request, first_serial + i, self.validity_period)
+                for i, request in enumerate(requests)]
+
+
+class CASigningContext(object):
+    """The parts of a CertificateAuthority needed for signing, which are expensive to load from the database.
+
+    Attributes:
+        private_key (rsa.RSAPrivateKey): The deserialized CA private key.
+        issuer (x509.Name): The issuer name placed in every signed certificate.
+    """
+
+    def __init__(self, private_key: rsa.RSAPrivateKey, issuer: x509.Name) -> None:
+        self.private_key = private_key
+        self.issuer = issuer
+
+    def sign(self, request: x509.CertificateSigningRequest, serial: int, validity_period: int) -> x509.Certificate:
+        now = datetime.datetime.utcnow()
+        return x509.CertificateBuilder().not_valid_before(
+            now
         ).not_valid_after(
-            datetime.datetime.utcnow() + datetime.timedelta(days=self.validity_period)
+            now + datetime.timedelta(days=validity_period)
         ).serial_number(
-            self.serial
+            serial
         ).issuer_name(
-            name
+            self.issuer
         ).subject_name(
             request.subject
         ).public_key(
             request.public_key()
-        ).sign(private_key, hashes.SHA256(), default_backend())
+        ).sign(self.private_key, hashes.SHA256(), default_backend())
 
-        # cert_model = DeviceIdentityCertificate().from_crypto(cert)
-        # db.session.add(cert_model)
-        # db.session.commit()
 
-        return cert
+_signing_contexts: Dict[Tuple[int, int, str], CASigningContext] = {}
+_signing_contexts_lock = threading.Lock()
 
 
 class CertificateType(Enum):
@@ -261,6 +331,31 @@ class RSAPrivateKey(db.Model):
     #: id db.Column
     id = db.Column(db.Integer, primary_key=True)
     pem_data = db.Column(db.Text, nullable=False)
+    pooled = db.Column(db.Boolean, index=True)
+    """pooled (bool): True if the key was pre-generated and has not been handed out yet, False once it has been
+        taken from the pool, and NULL if the key was never part of the pool."""
+
+    @classmethod
+    def take_pooled(cls, attempts: int = 3):
+        """Atomically take one pre-generated key from the pool.
+
+        A candidate key is claimed with a conditional UPDATE, so that if another process claimed it first the UPDATE
+        affects no rows and another candidate is tried.
+
+        Returns:
+            Optional[RSAPrivateKey]: The key, or None if the pool is empty.
+        """
+        for _ in range(attempts):
+            candidate_id = db.session.query(cls.id).filter(cls.pooled == True).order_by(cls.id).limit(1).scalar()
+            if candidate_id is None:
+                return None
+
+            claimed = db.session.query(cls).filter(cls.id == candidate_id, cls.pooled == True).update(
+                {'pooled': False}, synchronize_session=False)
+            if claimed == 1:
+                return db.session.query(cls).populate_existing().get(candidate_id)
+
+        return None
 
     @classmethod
     def from_crypto(cls, private_key: rsa.RSAPrivateKeyWithSerialization):
@@ -277,8 +372,9 @@ class RSAPrivateKey(db.Model):
 
     def to_crypto(self) -> rsa.RSAPrivateKey:
         """Convert an SQLAlchemy RSAPrivateKey model to a cryptography RSA Private Key."""
+        pem_data = self.pem_data.encode('utf8') if isinstance(self.pem_data, str) else self.pem_data
         pk = serialization.load_pem_private_key(
-            self.pem_data,
+            pem_data,
             backend=default_backend(),
             password=None,
         )
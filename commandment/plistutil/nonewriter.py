@@ -50,3 +50,16 @@ def dumps(value, *, fmt=FMT_XML, skipkeys=False, sort_keys=True):
     fp = BytesIO()
     dump(value, fp, fmt=fmt, skipkeys=skipkeys, sort_keys=sort_keys)
     return fp.getvalue()
+
+
+def dumps_fragment(value, *, indent_level=0, skipkeys=False, sort_keys=True):
+    """Return the XML for a single value, without the XML declaration or the enclosing <plist> element.
+
+    The value is indented as if it were nested ``indent_level`` elements deep, so that the fragment can be spliced
+    into a property list that was serialized with :func:`dumps`.
+    """
+    fp = BytesIO()
+    writer = PlistNoneWriter(fp, indent_level=indent_level, writeHeader=False, sort_keys=sort_keys,
+                             skipkeys=skipkeys)
+    writer.write_value(value)
+    return fp.getvalue()
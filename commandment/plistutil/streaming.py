@@ -0,0 +1,319 @@
+"""
+Incremental parsing of XML property lists.
+
+``plistlib.loads(request.data)`` needs the whole request body in memory, on top of the objects parsed from it. For the
+largest MDM responses, eg. InstalledApplicationList or CertificateList from a macOS device, that is several megabytes
+per request. This module instead:
+
+- Spools a request body to a temporary file, which is only kept in memory up to a threshold (see :func:`spool`).
+- Parses an XML property list from a file in fixed size chunks with expat (see :func:`load`), so that only the
+  parsed objects are held in memory.
+- Yields the items of a top level array one at a time without keeping the others (see :func:`iter_array`), for
+  callers that only need a single large array.
+- Skips the large top level arrays of a dictionary while it is parsed, and replaces them with a
+  :class:`StreamedArray`, whose items are parsed from the file again as they are iterated. The other keys of an MDM
+  response, eg. Status and UDID, come after these arrays, so they can only be read by parsing the whole file once.
+
+Binary property lists cannot be parsed incrementally, and are loaded with plistlib.
+"""
+import binascii
+import datetime
+import plistlib
+import re
+import tempfile
+from collections import deque
+from typing import Any, IO, Iterator, List, Optional, Sequence
+from xml.parsers.expat import ParserCreate, ExpatError
+
+CHUNK_SIZE = 64 * 1024
+"""int: Number of bytes read from the file for each call to the XML parser."""
+
+BINARY_HEADER = b'bplist00'
+
+
+class InvalidPlist(ValueError):
+    """Raised if the data is not a property list."""
+    pass
+
+
+class BodyTooLarge(ValueError):
+    """Raised if a body is larger than the maximum size given to :func:`spool`."""
+    pass
+
+
+def spool(stream: IO[bytes], max_size: Optional[int] = None, memory_size: int = 256 * 1024,
+          chunk_size: int = CHUNK_SIZE) -> IO[bytes]:
+    """Copy a stream to a temporary file which is kept in memory until it exceeds ``memory_size`` bytes.
+
+    Args:
+          stream (IO[bytes]): The stream to read until EOF, eg. ``request.stream``.
+          max_size (Optional[int]): The maximum number of bytes to read, or None for no limit.
+          memory_size (int): The number of bytes kept in memory before the file is written to disk.
+          chunk_size (int): The number of bytes to read at a time.
+    Returns:
+          IO[bytes]: The spooled file, positioned at the start.
+    Raises:
+          BodyTooLarge: If the stream is longer than ``max_size``.
+    """
+    fp = tempfile.SpooledTemporaryFile(max_size=memory_size)
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            fp.close()
+            raise BodyTooLarge('Body is larger than {} bytes'.format(max_size))
+
+        fp.write(chunk)
+
+    fp.seek(0)
+    return fp
+
+
+_dateParser = re.compile(r"(?P<year>\d\d\d\d)(?:-(?P<month>\d\d)(?:-(?P<day>\d\d)(?:T(?P<hour>\d\d)"
+                         r"(?::(?P<minute>\d\d)(?::(?P<second>\d\d))?)?)?)?)?Z", re.ASCII)
+
+
+def _date_from_string(s: str) -> datetime.datetime:
+    match = _dateParser.match(s)
+    if match is None:
+        raise InvalidPlist('Invalid date: {}'.format(s))
+
+    parts = []
+    for key in ('year', 'month', 'day', 'hour', 'minute', 'second'):
+        value = match.group(key)
+        if value is None:
+            break
+        parts.append(int(value))
+
+    return datetime.datetime(*parts)
+
+
+class StreamedArray(object):
+    """A top level array skipped by :func:`load`, whose items are parsed from the file each time it is iterated.
+
+    Iterating seeks the file to the start, so the file must stay open, and only one iteration over the arrays of the
+    same file may be in progress at a time.
+
+    Args:
+          fp (IO[bytes]): The file that the array was skipped in.
+          key (str): The key of the array in the root dictionary.
+          chunk_size (int): The number of bytes to read at a time.
+    """
+
+    def __init__(self, fp: IO[bytes], key: str, chunk_size: int = CHUNK_SIZE) -> None:
+        self.fp = fp
+        self.key = key
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[Any]:
+        self.fp.seek(0)
+        return iter_array(self.fp, self.key, self.chunk_size)
+
+    def __repr__(self) -> str:
+        return '<StreamedArray {}>'.format(self.key)
+
+
+class _PlistBuilder(object):
+    """Builds objects from expat events, like plistlib, optionally diverting the items of one top level array.
+
+    Args:
+          stream_key (Optional[str]): The key of a top level array whose items are appended to ``items`` instead of
+            the array, which is left empty.
+          skip_keys (Sequence[str]): The keys of top level arrays which are not built at all. The keys that were
+            skipped are listed in ``skipped``.
+    """
+
+    def __init__(self, stream_key: Optional[str] = None, skip_keys: Sequence[str] = ()) -> None:
+        self.stream_key = stream_key
+        self.skip_keys = skip_keys
+        self.items: deque = deque()
+        self.skipped: List[str] = []
+        self.root = None
+        self._stack = []
+        self._key = None
+        self._data = []
+        self._streamed = None
+        self._skipping = 0
+
+        parser = ParserCreate()
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._data.append
+        parser.EntityDeclHandler = self._entity_decl
+        self._parser = parser
+
+    def feed(self, chunk: bytes, final: bool = False):
+        try:
+            self._parser.Parse(chunk, final)
+        except ExpatError as e:
+            raise InvalidPlist(str(e))
+
+    def _entity_decl(self, *args):
+        # As in plistlib, entity declarations are rejected to avoid XML vulnerabilities in expat.
+        raise InvalidPlist('XML entity declarations are not supported in plist files')
+
+    def _start(self, element: str, attrs: dict):
+        self._data.clear()
+        if element != 'dict' and element != 'array':
+            return
+
+        if self._skipping:
+            self._skipping += 1
+            return
+
+        if element == 'array' and len(self._stack) == 1 and self._key in self.skip_keys:
+            self.skipped.append(self._key)
+            self._key = None
+            self._skipping = 1
+            return
+
+        container = {} if element == 'dict' else []
+        if element == 'array' and self.stream_key is not None and len(self._stack) == 1 and \
+                self._key == self.stream_key:
+            self._streamed = container
+
+        # Items of the streamed array are only passed on once they are complete, see _end()
+        if not self._stack or self._stack[-1] is not self._streamed:
+            self._add(container)
+
+        self._stack.append(container)
+
+    def _end(self, element: str):
+        if self._skipping:
+            # Values inside a skipped array are not even converted, so they are only validated when it is streamed
+            if element == 'dict' or element == 'array':
+                self._skipping -= 1
+            self._data.clear()
+            return
+
+        if element == 'key':
+            if self._key is not None or not self._stack or not isinstance(self._stack[-1], dict):
+                raise InvalidPlist('Unexpected key at line {}'.format(self._parser.CurrentLineNumber))
+            self._key = self._text()
+        elif element == 'dict' or element == 'array':
+            if self._key is not None:
+                raise InvalidPlist('Missing value for key {} at line {}'.format(
+                    self._key, self._parser.CurrentLineNumber))
+            container = self._stack.pop()
+            if self._stack and self._stack[-1] is self._streamed:
+                self.items.append(container)
+        elif element == 'string':
+            self._add(self._text())
+        elif element == 'integer':
+            text = self._text()
+            try:
+                self._add(int(text, 16) if text.lower().startswith('0x') else int(text))
+            except ValueError:
+                raise InvalidPlist('Invalid integer: {}'.format(text))
+        elif element == 'real':
+            try:
+                self._add(float(self._text()))
+            except ValueError:
+                raise InvalidPlist('Invalid real')
+        elif element == 'true':
+            self._add(True)
+        elif element == 'false':
+            self._add(False)
+        elif element == 'data':
+            try:
+                self._add(binascii.a2b_base64(self._text().encode('utf-8')))
+            except binascii.Error:
+                raise InvalidPlist('Invalid data')
+        elif element == 'date':
+            self._add(_date_from_string(self._text()))
+
+    def _text(self) -> str:
+        text = ''.join(self._data)
+        self._data.clear()
+        return text
+
+    def _add(self, value: Any):
+        if self._key is not None:
+            self._stack[-1][self._key] = value
+            self._key = None
+        elif not self._stack:
+            self.root = value
+        elif not isinstance(self._stack[-1], list):
+            raise InvalidPlist('Unexpected element at line {}'.format(self._parser.CurrentLineNumber))
+        elif self._stack[-1] is self._streamed:
+            self.items.append(value)
+        else:
+            self._stack[-1].append(value)
+
+
+def _is_binary(fp: IO[bytes]) -> bool:
+    position = fp.tell()
+    header = fp.read(len(BINARY_HEADER))
+    fp.seek(position)
+    return header == BINARY_HEADER
+
+
+def _load_binary(fp: IO[bytes]) -> Any:
+    try:
+        return plistlib.load(fp, fmt=plistlib.FMT_BINARY)
+    except (plistlib.InvalidFileException, ValueError, TypeError) as e:
+        raise InvalidPlist(str(e))
+
+
+def load(fp: IO[bytes], chunk_size: int = CHUNK_SIZE, stream_arrays: Sequence[str] = ()) -> Any:
+    """Parse a property list from a binary file object, reading ``chunk_size`` bytes at a time.
+
+    The result is the same as ``plistlib.load(fp)``, except that the top level arrays at ``stream_arrays`` are
+    :class:`StreamedArray` instances, which do not hold their items in memory. Binary property lists are always loaded
+    whole.
+
+    Args:
+          fp (IO[bytes]): The file to parse, which must stay open while any streamed array is used.
+          chunk_size (int): The number of bytes to read at a time.
+          stream_arrays (Sequence[str]): The keys of top level arrays which are streamed.
+
+    Raises:
+          InvalidPlist: If the file does not contain a valid property list.
+    """
+    if _is_binary(fp):
+        return _load_binary(fp)
+
+    builder = _PlistBuilder(skip_keys=stream_arrays)
+    while True:
+        chunk = fp.read(chunk_size)
+        builder.feed(chunk, final=not chunk)
+        if not chunk:
+            break
+
+    if builder.root is None:
+        raise InvalidPlist('No property list found')
+
+    for key in builder.skipped:
+        builder.root[key] = StreamedArray(fp, key, chunk_size)
+
+    return builder.root
+
+
+def iter_array(fp: IO[bytes], key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the items of the array stored at ``key`` of the root dictionary, as they are parsed.
+
+    Only the items parsed from the current chunk are held in memory at once, so the size of the array does not
+    affect the memory used.
+
+    Raises:
+          InvalidPlist: If the file does not contain a valid property list. Items parsed before the error was found
+            may already have been yielded.
+    """
+    if _is_binary(fp):
+        root = _load_binary(fp)
+        yield from (root.get(key, None) or []) if isinstance(root, dict) else []
+        return
+
+    builder = _PlistBuilder(stream_key=key)
+    while True:
+        chunk = fp.read(chunk_size)
+        builder.feed(chunk, final=not chunk)
+        while builder.items:
+            yield builder.items.popleft()
+
+        if not chunk:
+            break
@@ -0,0 +1,207 @@
+"""
+Opt-in profiling of individual MDM, check-in and enrollment requests.
+
+A request is profiled if its path starts with one of ``PROFILE_PATHS`` and either:
+
+- it is selected at random, with probability ``PROFILE_SAMPLE_RATE``, or
+- its body mentions one of the UDIDs in ``PROFILE_UDIDS``.
+
+At most ``PROFILE_MAX_PER_MINUTE`` requests are profiled per process, which bounds the overhead whatever the
+configuration. Each profile is written to ``PROFILE_DIR``, named after the time, the endpoint and the message type
+(the check-in MessageType, or the Status of an MDM request, see :func:`tag`). Only the newest ``PROFILE_MAX_FILES``
+profiles are kept.
+
+Two formats are supported by ``PROFILE_FORMAT``:
+
+- ``pstats``: a deterministic cProfile of the request thread, which can be read with :mod:`pstats` or snakeviz.
+- ``collapsed``: the stack of the request thread, sampled every ``PROFILE_SAMPLE_INTERVAL`` seconds by another
+  thread, in the collapsed format read by flamegraph.pl and speedscope. This has less overhead than cProfile, but
+  misses calls shorter than the interval.
+
+Profiling hooks are only installed if ``PROFILE_SAMPLE_RATE`` or ``PROFILE_UDIDS`` is set.
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+from flask import Flask, request
+
+from commandment.decorators import request_body
+
+PROFILER_ENVIRON_KEY = 'commandment.profiler'
+"""str: The WSGI environ key holding the profiler of the current request."""
+
+TAG_ENVIRON_KEY = 'commandment.profile_tag'
+"""str: The WSGI environ key holding the message type of the current request."""
+
+_unsafe = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def tag(value: str):
+    """Tag the profile of the current request, if any, with a message type. Does nothing if it is not profiled."""
+    if PROFILER_ENVIRON_KEY in request.environ:
+        request.environ[TAG_ENVIRON_KEY] = value
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of another thread at a fixed interval, counting each distinct stack.
+
+    Args:
+          thread_id (int): The ident of the thread to sample.
+          interval (float): Seconds between samples.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001) -> None:
+        super(StackSampler, self).__init__(name='stack sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        """The sampled stacks, one per line, followed by the number of times they were sampled."""
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler(object):
+    """Decides which requests to profile, and writes their profiles.
+
+    Args:
+          app (Flask): The app whose settings are used.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.paths: List[str] = app.config.get('PROFILE_PATHS', ['/mdm', '/checkin', '/enroll/'])
+        self.sample_rate: float = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.udids: List[bytes] = [udid.encode('utf8') for udid in app.config.get('PROFILE_UDIDS', [])]
+        self.directory: str = app.config.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(),
+                                                                            'commandment-profiles')
+        self.format: str = app.config.get('PROFILE_FORMAT', 'pstats')
+        self.interval: float = app.config.get('PROFILE_SAMPLE_INTERVAL', 0.001)
+        self.max_files: int = app.config.get('PROFILE_MAX_FILES', 200)
+        self.max_per_minute: int = app.config.get('PROFILE_MAX_PER_MINUTE', 10)
+
+        if self.format not in ('pstats', 'collapsed'):
+            raise ValueError('PROFILE_FORMAT must be pstats or collapsed, not {}'.format(self.format))
+
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_count = 0
+
+    def _allowed(self) -> bool:
+        """Count a profile against the per minute limit, returning False if the limit has been reached."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.max_per_minute:
+                return False
+            self._window_count += 1
+            return True
+
+    def _mentions_udid(self) -> bool:
+        body = request_body()
+        try:
+            # Read in chunks, overlapping by the longest UDID so that one split across chunks is still found
+            overlap = max(len(udid) for udid in self.udids) - 1
+            previous = b''
+            while True:
+                chunk = body.read(64 * 1024)
+                if not chunk:
+                    return False
+                window = previous + chunk
+                if any(udid in window for udid in self.udids):
+                    return True
+                previous = window[-overlap:] if overlap > 0 else b''
+        finally:
+            body.seek(0)
+
+    def should_profile(self) -> bool:
+        if not any(request.path.startswith(path) for path in self.paths):
+            return False
+
+        selected = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not selected and self.udids and request.content_length:
+            selected = self._mentions_udid()
+
+        return selected and self._allowed()
+
+    def start(self):
+        if self.format == 'pstats':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+
+        request.environ[PROFILER_ENVIRON_KEY] = profiler
+
+    def finish(self, exc=None):
+        profiler = request.environ.pop(PROFILER_ENVIRON_KEY, None)
+        if profiler is None:
+            return
+
+        message_type = request.environ.pop(TAG_ENVIRON_KEY, None) or 'unknown'
+        name = '{}-{:06d}-{}-{}'.format(time.strftime('%Y%m%dT%H%M%S'), int((time.time() % 1) * 1e6),
+                                        _unsafe.sub('_', request.endpoint or 'none'), _unsafe.sub('_', message_type))
+        os.makedirs(self.directory, exist_ok=True)
+
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            profiler.dump_stats(os.path.join(self.directory, name + '.prof'))
+        else:
+            profiler.stop()
+            with open(os.path.join(self.directory, name + '.collapsed'), 'w') as fd:
+                fd.write(profiler.collapsed())
+
+        self.prune()
+
+    def prune(self):
+        """Delete the oldest profiles, keeping ``max_files``."""
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(('.prof', '.collapsed')))
+        for name in names[:max(0, len(names) - self.max_files)]:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass  # Pruned by another process
+
+
+def init_app(app: Flask) -> Optional[RequestProfiler]:
+    """Install the profiling hooks, if PROFILE_SAMPLE_RATE or PROFILE_UDIDS is configured."""
+    if not app.config.get('PROFILE_SAMPLE_RATE') and not app.config.get('PROFILE_UDIDS'):
+        return None
+
+    profiler = RequestProfiler(app)
+
+    @app.before_request
+    def start_profile():
+        if profiler.should_profile():
+            profiler.start()
+
+    app.teardown_request(profiler.finish)
+    app.logger.info('Profiling requests to %s, writing %s profiles to %s', ', '.join(profiler.paths),
+                    profiler.format, profiler.directory)
+    return profiler
@@ -0,0 +1,163 @@
+"""
+Per-request SQL statement counts and timings, and detection of repeated statements (N+1 queries).
+
+Every statement executed while handling a request is recorded by SQLAlchemy ``before_cursor_execute`` and
+``after_cursor_execute`` listeners into the :class:`QueryLog` of the request, which is kept in its WSGI environ. The
+listeners and the log are installed by :func:`record_requests`, which is called by :func:`init_app` if
+``QUERY_LOG_ENABLED`` is set, and by the metrics feature, which observes the count of every request.
+:func:`recording` records the statements executed in a block of code, eg. in tests.
+
+When ``QUERY_LOG_ENABLED`` is set, statements are also grouped by shape: their SQL with literals and the length of IN
+lists removed. A shape executed ``QUERY_LOG_REPEAT_THRESHOLD`` or more times in one request is usually a relationship
+being lazy loaded once per row, and is logged as a warning with the endpoint that made it.
+
+If ``QUERY_LOG_HEADERS`` is set, each response also has the headers:
+
+- ``X-Query-Count``: the number of statements executed.
+- ``X-Query-Time``: the total time spent executing them, in milliseconds.
+- ``X-Query-Repeated``: the number of statement shapes over the threshold.
+
+Only statements executed before the response is returned are recorded.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from flask import Flask, Response, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_LOG_ENVIRON_KEY = 'commandment.query_log'
+"""str: The WSGI environ key holding the :class:`QueryLog` of the current request."""
+
+_START_TIME_KEY = 'commandment.query_start_time'
+
+_whitespace = re.compile(r'\s+')
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r'\(\s*(?:\?|%\([^)]+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\([^)]+\)s|%s|:\w+))*\s*\)')
+
+_recordings: List['QueryLog'] = []
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement, so that the same query with different parameters has the same shape."""
+    shape = _whitespace.sub(' ', statement).strip()
+    shape = _literals.sub('?', shape)
+    return _in_lists.sub('(?...)', shape)
+
+
+class QueryLog(object):
+    """The statements executed by one request.
+
+    The statements are kept as they were executed, which are the cached strings of compiled queries, and only
+    normalized when :meth:`repeated` is called.
+    """
+
+    def __init__(self) -> None:
+        self.statements: List[str] = []
+        self.seconds = 0.0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str, seconds: float):
+        self.statements.append(statement)
+        self.seconds += seconds
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """The shapes executed at least ``threshold`` times, most frequent first."""
+        shapes = Counter(statement_shape(statement) for statement in self.statements)
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+
+def current_log() -> Optional[QueryLog]:
+    """The query log of the current request, or None if there is no request or queries are not recorded."""
+    if not has_request_context():
+        return None
+    return request.environ.get(QUERY_LOG_ENVIRON_KEY)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info[_START_TIME_KEY] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop(_START_TIME_KEY, None)
+    if started is None:
+        return
+
+    seconds = time.perf_counter() - started
+    log = current_log()
+    if log is not None:
+        log.record(statement, seconds)
+    for recording in _recordings:
+        recording.record(statement, seconds)
+
+
+def _listen():
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+@contextmanager
+def recording() -> Iterator[QueryLog]:
+    """Record every statement executed by any thread while the block runs, whether or not it is in a request."""
+    _listen()
+    log = QueryLog()
+    _recordings.append(log)
+    try:
+        yield log
+    finally:
+        _recordings.remove(log)
+
+
+def _start_request_log():
+    request.environ[QUERY_LOG_ENVIRON_KEY] = QueryLog()
+
+
+def record_requests(app: Flask):
+    """Record the statements executed by each request of the app into its :class:`QueryLog`. Safe to call repeatedly.
+
+    The log is available from :func:`current_log` until the request is torn down.
+    """
+    if app.extensions.get('querylog', False):
+        return
+
+    _listen()
+    # Before any other before_request function, so that statements executed by those are recorded too
+    app.before_request_funcs.setdefault(None, []).insert(0, _start_request_log)
+    app.extensions['querylog'] = True
+
+
+def init_app(app: Flask):
+    """Record the statements executed by each request, if QUERY_LOG_ENABLED is set."""
+    if not app.config.get('QUERY_LOG_ENABLED', False):
+        return
+
+    threshold = app.config.get('QUERY_LOG_REPEAT_THRESHOLD', 10)
+    headers = app.config.get('QUERY_LOG_HEADERS', True)
+
+    record_requests(app)
+
+    @app.after_request
+    def finish_query_log(response: Response) -> Response:
+        log = current_log()
+        if log is None:
+            return response
+
+        repeated = log.repeated(threshold)
+        for shape, count in repeated:
+            app.logger.warning('%s executed %d statements like: %s', request.endpoint, count, shape)
+
+        app.logger.debug('%s executed %d statements in %.1fms', request.endpoint, log.count, log.seconds * 1000)
+
+        if headers:
+            response.headers['X-Query-Count'] = str(log.count)
+            response.headers['X-Query-Time'] = '{:.1f}'.format(log.seconds * 1000)
+            response.headers['X-Query-Repeated'] = str(len(repeated))
+
+        return response
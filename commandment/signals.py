@@ -12,3 +12,9 @@ device_checkin = signals.signal('device-checkin')
 
 # If APNS tells us that a device token expired
 device_token_expired = signals.signal('device-token-expired')
+
+# Sent when a private key is taken from the pre-generated key pool, or generated because the pool was empty
+rsa_private_key_taken = signals.signal('rsa-private-key-taken')
+
+# Sent when a command response is queued for a response worker instead of being handled in the request
+command_response_queued = signals.signal('command-response-queued')
@@ -0,0 +1,83 @@
+"""
+Columnar snapshots of the device inventory, so that reports do not query the tables that check-ins write to.
+
+The ``inventory_snapshot`` job writes the tables in :data:`TABLES` to ``SNAPSHOT_DIR`` as Parquet or Arrow IPC files
+(``SNAPSHOT_FORMAT``). Each run writes a new generation directory, then points ``manifest.json`` at it, so readers
+always see a complete and consistent set of files. Older generations are kept until the next run has finished, so
+that a report which is reading one is not interrupted.
+
+Runs are incremental: only the rows of devices seen since the previous run (by ``Device.last_seen``, less
+``SNAPSHOT_OVERLAP`` seconds for commands whose responses are processed late) are read from the database. They
+replace the rows of the same devices in the previous generation, and the rows of deleted devices are dropped. Every
+``SNAPSHOT_FULL_INTERVAL`` seconds, the snapshot is rebuilt from every row instead, which also picks up changes that
+are not made by check-ins, eg. DEP assignments.
+
+This requires the optional ``pyarrow`` dependency (``pip install commandment[reports]``). Web processes which serve
+the reports API must be able to read ``SNAPSHOT_DIR``.
+
+Attributes:
+    TABLES (Dict[str, SnapshotTable]): The snapshot of each table, and the columns it contains.
+"""
+import importlib.util
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple, Type
+
+from commandment.inventory.models import InstalledApplication, InstalledCertificate
+from commandment.models import db, Device
+
+MANIFEST = 'manifest.json'
+"""str: The name of the file which points to the current generation."""
+
+EXTENSIONS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+"""Dict[str, str]: The file extension of each snapshot format."""
+
+
+class SnapshotTable(NamedTuple):
+    """The rows of one table that are snapshotted.
+
+    Attributes:
+          model (Type[db.Model]): The model whose table is snapshotted.
+          key (str): The column holding the id of the device that a row belongs to.
+          columns (Tuple[str]): The columns in the snapshot.
+    """
+    model: Type[db.Model]
+    key: str
+    columns: Tuple[str, ...]
+
+
+TABLES: Dict[str, SnapshotTable] = OrderedDict([
+    ('devices', SnapshotTable(Device, 'id', (
+        'id', 'udid', 'serial_number', 'device_name', 'model_name', 'model', 'product_name', 'os_version',
+        'build_version', 'is_enrolled', 'last_seen', 'fde_enabled', 'fde_has_prk', 'fde_has_irk',
+    ))),
+    ('installed_applications', SnapshotTable(InstalledApplication, 'device_id', (
+        'id', 'device_id', 'bundle_identifier', 'name', 'version', 'short_version', 'bundle_size',
+    ))),
+    ('installed_certificates', SnapshotTable(InstalledCertificate, 'device_id', (
+        'id', 'device_id', 'x509_cn', 'is_identity', 'fingerprint_sha256',
+    ))),
+])
+
+
+def available() -> bool:
+    """Whether pyarrow is installed."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    """The manifest of the current generation, or None if no snapshot has been written."""
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as fd:
+            return json.load(fd)
+    except FileNotFoundError:
+        return None
+
+
+def table_path(directory: str, manifest: dict, table: str) -> str:
+    """The path of the file containing a table in the generation described by ``manifest``."""
+    return os.path.join(directory, manifest['generation'], table + EXTENSIONS[manifest['format']])
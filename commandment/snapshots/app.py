@@ -0,0 +1,81 @@
+"""
+API endpoints which answer inventory reports from the snapshot written by the ``inventory_snapshot`` job.
+
+Reports are only as current as the last snapshot, whose time is returned as ``snapshot_at``.
+"""
+from typing import List
+
+from flask import Blueprint, abort, current_app, jsonify, request
+
+from commandment.snapshots import available, read_manifest, reports
+
+reports_app = Blueprint('reports_app', __name__)
+
+
+def _manifest() -> dict:
+    directory = current_app.config.get('SNAPSHOT_DIR', None)
+    if directory is None:
+        return abort(503, 'Inventory snapshots are not configured')
+    if not available():
+        return abort(503, 'Inventory snapshots require pyarrow, which is not installed')
+
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return abort(503, 'No inventory snapshot has been written yet')
+
+    return manifest
+
+
+def _report(manifest: dict, data: List[dict]):
+    return jsonify({'snapshot_at': manifest['watermark'], 'data': data})
+
+
+@reports_app.route('/v1/reports/os_versions', methods=['GET'])
+def os_versions():
+    """Count the devices running each OS version.
+
+    :query group_by: ``product_name`` to count each OS version of each product separately.
+    :resheader Content-Type: application/json
+    :statuscode 200: OK
+    :statuscode 400: Invalid group_by
+    :statuscode 503: No snapshot has been written
+    """
+    group_by = request.args.get('group_by', None)
+    if group_by not in (None, 'product_name'):
+        return abort(400, 'Invalid group_by: {}'.format(group_by))
+
+    manifest = _manifest()
+    return _report(manifest, reports.os_versions(current_app.config['SNAPSHOT_DIR'], manifest,
+                                                 by_product=group_by is not None))
+
+
+@reports_app.route('/v1/reports/missing_application', methods=['GET'])
+def missing_application():
+    """List the devices which do not have an application installed.
+
+    :query bundle_identifier: The bundle identifier of the application, required.
+    :query version: Also list devices which have a different version of the application installed.
+    :resheader Content-Type: application/json
+    :statuscode 200: OK
+    :statuscode 400: No bundle_identifier
+    :statuscode 503: No snapshot has been written
+    """
+    bundle_identifier = request.args.get('bundle_identifier', None)
+    if not bundle_identifier:
+        return abort(400, 'bundle_identifier is required')
+
+    manifest = _manifest()
+    return _report(manifest, reports.missing_application(current_app.config['SNAPSHOT_DIR'], manifest,
+                                                         bundle_identifier, request.args.get('version', None)))
+
+
+@reports_app.route('/v1/reports/fde_compliance', methods=['GET'])
+def fde_compliance():
+    """Count the devices of each model, and those of them which have FileVault enabled.
+
+    :resheader Content-Type: application/json
+    :statuscode 200: OK
+    :statuscode 503: No snapshot has been written
+    """
+    manifest = _manifest()
+    return _report(manifest, reports.fde_compliance(current_app.config['SNAPSHOT_DIR'], manifest))
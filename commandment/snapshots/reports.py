@@ -0,0 +1,78 @@
+"""
+Aggregate reports over the current generation of the inventory snapshot.
+
+Each report reads only the columns it needs, and aggregates them with Arrow compute kernels rather than per row in
+Python, so the cost of a report depends on the number of groups it returns rather than the number of devices.
+"""
+from typing import List, Optional, Sequence
+
+from commandment.snapshots import table_path
+
+
+def read_table(directory: str, manifest: dict, table: str, columns: Sequence[str]):
+    """Read some columns of a table in the generation described by ``manifest``.
+
+    Returns:
+          pyarrow.Table: The columns.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = table_path(directory, manifest, table)
+    if manifest['format'] == 'parquet':
+        return pq.read_table(path, columns=list(columns))
+
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().select(list(columns))
+
+
+def _rows(table, sort_by: List[tuple]) -> List[dict]:
+    return table.sort_by(sort_by).to_pylist()
+
+
+def os_versions(directory: str, manifest: dict, by_product: bool = False) -> List[dict]:
+    """The number of devices running each OS version, and optionally each product name, most common first."""
+    keys = ['product_name', 'os_version'] if by_product else ['os_version']
+    devices = read_table(directory, manifest, 'devices', keys + ['id'])
+
+    counts = devices.group_by(keys).aggregate([('id', 'count')])
+    counts = counts.append_column('count', counts['id_count']).select(keys + ['count'])
+    return _rows(counts, [('count', 'descending')] + [(k, 'ascending') for k in keys])
+
+
+def missing_application(directory: str, manifest: dict, bundle_identifier: str,
+                        version: Optional[str] = None) -> List[dict]:
+    """The devices which do not have an application installed, or do not have a version of it."""
+    import pyarrow.compute as pc
+
+    applications = read_table(directory, manifest, 'installed_applications',
+                              ['device_id', 'bundle_identifier', 'version'])
+    installed = pc.equal(applications['bundle_identifier'], bundle_identifier)
+    if version is not None:
+        installed = pc.and_(installed, pc.equal(applications['version'], version))
+    having = pc.unique(applications['device_id'].filter(installed))
+
+    devices = read_table(directory, manifest, 'devices', ['id', 'udid', 'serial_number', 'device_name'])
+    missing = devices.filter(pc.invert(pc.is_in(devices['id'], value_set=having)))
+    return _rows(missing, [('id', 'ascending')])
+
+
+def fde_compliance(directory: str, manifest: dict) -> List[dict]:
+    """The number of devices of each model, and how many of those have FileVault enabled.
+
+    Devices which have not reported their security info, whose ``fde_enabled`` is null, are counted as not compliant.
+    """
+    import pyarrow.compute as pc
+
+    devices = read_table(directory, manifest, 'devices', ['model_name', 'fde_enabled'])
+    devices = devices.set_column(1, 'fde_enabled', pc.cast(pc.fill_null(devices['fde_enabled'], False), 'int64'))
+
+    totals = devices.group_by(['model_name']).aggregate([('fde_enabled', 'count'), ('fde_enabled', 'sum')])
+    total, enabled = totals['fde_enabled_count'], totals['fde_enabled_sum']
+    ratio = pc.divide(pc.cast(enabled, 'float64'), pc.cast(total, 'float64'))
+
+    report = totals.select(['model_name']) \
+        .append_column('total', total) \
+        .append_column('fde_enabled', enabled) \
+        .append_column('ratio', ratio)
+    return _rows(report, [('model_name', 'ascending')])
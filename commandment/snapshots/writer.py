@@ -0,0 +1,212 @@
+"""
+Writes generations of the inventory snapshot, see :mod:`commandment.snapshots`.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from flask import Flask
+from sqlalchemy import types
+from sqlalchemy.orm import Session
+
+from commandment.models import db, Device
+from commandment.snapshots import MANIFEST, TABLES, SnapshotTable, read_manifest, table_path
+
+BATCH_SIZE = 10000
+"""int: Number of rows fetched from the database, and written to the snapshot, at a time."""
+
+IN_CHUNK = 500
+"""int: Maximum number of device ids in each IN clause of an incremental run."""
+
+
+def arrow_schema(spec: SnapshotTable):
+    """The Arrow schema of a snapshot table, converted from the types of its columns."""
+    import pyarrow as pa
+
+    fields = []
+    for name in spec.columns:
+        column = getattr(spec.model, name).property.columns[0]
+        if isinstance(column.type, types.Boolean):
+            type_ = pa.bool_()
+        elif isinstance(column.type, types.Integer):
+            type_ = pa.int64()
+        elif isinstance(column.type, types.DateTime):
+            type_ = pa.timestamp('us')
+        elif isinstance(column.type, (types.Float, types.Numeric)):
+            type_ = pa.float64()
+        else:
+            type_ = pa.string()
+        fields.append(pa.field(name, type_))
+
+    return pa.schema(fields)
+
+
+def _batches(rows: Iterator[tuple], schema) -> Iterator:
+    """Convert database rows to record batches of BATCH_SIZE rows."""
+    import pyarrow as pa
+
+    columns: List[list] = [[] for _ in schema]
+    count = 0
+    for row in rows:
+        for values, value in zip(columns, row):
+            values.append(value if value is None or isinstance(value, (bool, int, float, datetime)) else str(value))
+        count += 1
+        if count == BATCH_SIZE:
+            yield pa.RecordBatch.from_arrays([pa.array(values, type=f.type) for values, f in zip(columns, schema)],
+                                             schema=schema)
+            columns, count = [[] for _ in schema], 0
+
+    if count:
+        yield pa.RecordBatch.from_arrays([pa.array(values, type=f.type) for values, f in zip(columns, schema)],
+                                         schema=schema)
+
+
+def _query_rows(session: Session, spec: SnapshotTable, device_ids: Optional[List[int]]) -> Iterator[tuple]:
+    """The rows of a table, for every device if ``device_ids`` is None."""
+    key = getattr(spec.model, spec.key)
+    query = session.query(*[getattr(spec.model, name) for name in spec.columns]).filter(key.isnot(None))
+
+    if device_ids is None:
+        yield from query.order_by(spec.model.id).execution_options(stream_results=True).yield_per(BATCH_SIZE)
+        return
+
+    for i in range(0, len(device_ids), IN_CHUNK):
+        yield from query.filter(key.in_(device_ids[i:i + IN_CHUNK])).order_by(spec.model.id).yield_per(BATCH_SIZE)
+
+
+def _open_writer(path: str, schema, fmt: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == 'parquet':
+        return pq.ParquetWriter(path, schema)
+    return pa.ipc.new_file(path, schema)
+
+
+def _read_batches(path: str, fmt: str) -> Iterator:
+    """Read the record batches of a previous generation, without loading the whole table."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == 'parquet':
+        yield from pq.ParquetFile(path).iter_batches(batch_size=BATCH_SIZE)
+    else:
+        with pa.memory_map(path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+
+def _write_table(path: str, fmt: str, spec: SnapshotTable, previous: Optional[str], replaced, alive,
+                 rows: Iterator[tuple]) -> int:
+    """Write the rows of the previous generation that are kept, then the rows from the database.
+
+    Returns:
+          int: The number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    schema = arrow_schema(spec)
+    written = 0
+    writer = _open_writer(path, schema, fmt)
+    try:
+        if previous is not None:
+            for batch in _read_batches(previous, fmt):
+                key = batch.column(schema.get_field_index(spec.key))
+                keep = pc.and_(pc.is_in(key, value_set=alive), pc.invert(pc.is_in(key, value_set=replaced)))
+                batch = batch.filter(keep)
+                if batch.num_rows:
+                    writer.write_table(pa.Table.from_batches([batch]))
+                    written += batch.num_rows
+
+        for batch in _batches(rows, schema):
+            writer.write_table(pa.Table.from_batches([batch]))
+            written += batch.num_rows
+    finally:
+        writer.close()
+
+    return written
+
+
+def snapshot_inventory(session: Session, directory: str, fmt: str = 'parquet', overlap: int = 300,
+                       full_interval: int = 86400, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Write a new generation of the inventory snapshot.
+
+    Args:
+          session (Session): The database session.
+          directory (str): The snapshot directory.
+          fmt (str): ``parquet`` or ``arrow``.
+          overlap (int): Seconds before the previous run after which devices seen are also read again.
+          full_interval (int): Seconds after the last full run that every row is read again.
+          now (datetime): The time of this run, for testing.
+
+    Returns:
+          Dict[str, int]: The number of rows in each table of the new generation.
+    """
+    import pyarrow as pa
+
+    if now is None:
+        now = datetime.utcnow()
+
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(directory)
+
+    full = previous is None or previous['format'] != fmt or \
+        now - datetime.strptime(previous['full_at'], '%Y-%m-%dT%H:%M:%S.%f') >= timedelta(seconds=full_interval)
+
+    changed: Optional[List[int]] = None
+    replaced = alive = None
+    if not full:
+        since = datetime.strptime(previous['watermark'], '%Y-%m-%dT%H:%M:%S.%f') - timedelta(seconds=overlap)
+        changed = [id_ for id_, in session.query(Device.id).filter(Device.last_seen > since)]
+        replaced = pa.array(changed, type=pa.int64())
+        alive = pa.array([id_ for id_, in session.query(Device.id)], type=pa.int64())
+
+    generation = now.strftime('%Y%m%dT%H%M%S%f')
+    os.makedirs(os.path.join(directory, generation))
+
+    manifest = {
+        'generation': generation,
+        'format': fmt,
+        'watermark': now.strftime('%Y-%m-%dT%H:%M:%S.%f'),
+        'full_at': now.strftime('%Y-%m-%dT%H:%M:%S.%f') if full else previous['full_at'],
+        'rows': {},
+    }
+
+    for name, spec in TABLES.items():
+        manifest['rows'][name] = _write_table(
+            table_path(directory, manifest, name), fmt, spec,
+            None if full else table_path(directory, previous, name), replaced, alive,
+            _query_rows(session, spec, changed))
+
+    # Replacing the manifest is atomic, so readers see either the previous generation or this one
+    tmp = os.path.join(directory, MANIFEST + '.tmp')
+    with open(tmp, 'w') as fd:
+        json.dump(manifest, fd)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+    # Keep the previous generation, which may still be read, and delete any older
+    keep = {generation, previous['generation'] if previous is not None else None}
+    for entry in os.listdir(directory):
+        if entry not in keep and os.path.isdir(os.path.join(directory, entry)):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+    return manifest['rows']
+
+
+def snapshot_job(app: Flask):
+    """Run :func:`snapshot_inventory` from the scheduler."""
+    with app.app_context():
+        try:
+            rows = snapshot_inventory(
+                db.session, app.config['SNAPSHOT_DIR'],
+                fmt=app.config.get('SNAPSHOT_FORMAT', 'parquet'),
+                overlap=app.config.get('SNAPSHOT_OVERLAP', 300),
+                full_interval=app.config.get('SNAPSHOT_FULL_INTERVAL', 86400),
+            )
+            app.logger.info('Wrote inventory snapshot: %s', ', '.join('{} {}'.format(n, t) for t, n in rows.items()))
+        finally:
+            db.session.remove()
@@ -0,0 +1,72 @@
+"""
+This thread keeps the pre-generated RSA private key pool full.
+
+It refills the pool at startup, and again whenever a key is taken and the pool drops below the low water mark.
+
+Attributes:
+    key_pool_thread (threading.Thread):
+    key_pool_time (int): In seconds, the maximum time between checks of the pool size.
+"""
+import logging
+import threading
+from flask import Flask
+import sqlalchemy.exc
+
+from commandment.models import db
+from commandment.pki.keypool import fill_pool, pooled_key_count
+from commandment.signals import rsa_private_key_taken
+
+key_pool_thread = None
+key_pool_time = 60
+key_pool_wakeup = threading.Event()
+key_pool_thread_stopped = threading.Event()
+
+logger = logging.getLogger('key pool thread')
+
+
+def _key_taken(sender, **kwargs):
+    key_pool_wakeup.set()
+
+
+def start(app: Flask):
+    """Start the key pool thread, if RSA_KEY_POOL_SIZE is configured."""
+    size = app.config.get('RSA_KEY_POOL_SIZE', 0)
+    if size <= 0:
+        logger.info('RSA key pool is disabled')
+        return
+
+    global key_pool_thread
+    rsa_private_key_taken.connect(_key_taken)
+    key_pool_thread = threading.Thread(target=key_pool_thread_callback, args=[app], name='key pool', daemon=True)
+    key_pool_thread.start()
+
+
+def stop():
+    """Stop the key pool thread"""
+    logger.info('Key pool thread will stop')
+    key_pool_thread_stopped.set()
+    key_pool_wakeup.set()
+    rsa_private_key_taken.disconnect(_key_taken)
+
+
+def key_pool_thread_callback(app: Flask):
+    """Refill the key pool whenever it falls below RSA_KEY_POOL_LOW_WATER keys."""
+    size = app.config.get('RSA_KEY_POOL_SIZE', 0)
+    low_water = app.config.get('RSA_KEY_POOL_LOW_WATER', size // 2)
+    key_size = app.config.get('RSA_KEY_POOL_KEY_SIZE', 2048)
+    refill = True
+
+    while not key_pool_thread_stopped.is_set():
+        with app.app_context():
+            thread_session = db.create_scoped_session()
+            try:
+                if refill or pooled_key_count(thread_session) <= low_water:
+                    fill_pool(thread_session, size, key_size)
+                    refill = False
+            except sqlalchemy.exc.SQLAlchemyError as e:
+                app.logger.error('Could not refill the RSA key pool: %s', e)
+            finally:
+                thread_session.remove()
+
+        key_pool_wakeup.wait(key_pool_time)
+        key_pool_wakeup.clear()
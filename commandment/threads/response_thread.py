@@ -0,0 +1,81 @@
+"""
+These threads process the command responses queued by the MDM endpoint (see :mod:`commandment.mdm.ingest`).
+
+The pool is only started if MDM_DEFERRED_RESPONSE_TYPES is configured. Each worker claims a batch of responses,
+processes it, and immediately claims another if the batch was full. Otherwise it sleeps until a response is queued
+by this process, or for at most ``response_poll_time`` seconds to pick up responses queued by other processes.
+
+Attributes:
+    response_threads (List[threading.Thread]):
+    response_poll_time (int): In seconds, the maximum time between checks of the queue.
+"""
+import logging
+import os
+import socket
+import threading
+from typing import List
+from flask import Flask
+import sqlalchemy.exc
+
+from commandment.models import db
+from commandment.mdm.ingest import process_batch
+from commandment.signals import command_response_queued
+
+response_threads: List[threading.Thread] = []
+response_poll_time = 5
+response_wakeup = threading.Event()
+response_threads_stopped = threading.Event()
+
+logger = logging.getLogger('response thread')
+
+
+def _response_queued(sender, **kwargs):
+    response_wakeup.set()
+
+
+def start(app: Flask):
+    """Start the response worker pool, if MDM_DEFERRED_RESPONSE_TYPES is configured."""
+    if not app.config.get('MDM_DEFERRED_RESPONSE_TYPES'):
+        logger.info('Command responses are handled by the MDM endpoint')
+        return
+
+    workers = app.config.get('MDM_RESPONSE_WORKERS', 2)
+    command_response_queued.connect(_response_queued)
+
+    for i in range(workers):
+        name = '{}:{}:{}'.format(socket.gethostname(), os.getpid(), i)
+        thread = threading.Thread(target=response_thread_callback, args=[app, name], name='response worker',
+                                  daemon=True)
+        response_threads.append(thread)
+        thread.start()
+
+
+def stop():
+    """Stop the response worker pool"""
+    logger.info('Response threads will stop')
+    response_threads_stopped.set()
+    response_wakeup.set()
+    command_response_queued.disconnect(_response_queued)
+
+
+def response_thread_callback(app: Flask, name: str):
+    """Process batches of queued responses until the pool is stopped."""
+    batch_size = app.config.get('MDM_RESPONSE_BATCH_SIZE', 50)
+    lease = app.config.get('MDM_RESPONSE_LEASE', 300)
+    max_attempts = app.config.get('MDM_RESPONSE_MAX_ATTEMPTS', 3)
+
+    while not response_threads_stopped.is_set():
+        claimed = 0
+        with app.app_context():
+            try:
+                claimed = process_batch(name, batch_size, lease, max_attempts)
+            except sqlalchemy.exc.SQLAlchemyError as e:
+                app.logger.error('Could not process queued command responses: %s', e)
+            finally:
+                db.session.remove()
+
+        if claimed >= batch_size:
+            continue
+
+        response_wakeup.wait(response_poll_time)
+        response_wakeup.clear()
@@ -1,3 +1,340 @@
 """
-This thread should synchronise available licenses
-"""
\ No newline at end of file
+This thread synchronises VPP users and licenses into the ``vpp_users`` and ``vpp_licenses`` tables.
+
+The first run performs a full batch fetch of every license. The batch token is persisted after each page has been
+written so that an interrupted fetch resumes from the last completed page. Once the batch is exhausted, the
+``sinceModifiedToken`` returned on the final page is stored and every subsequent run only fetches licenses that
+were modified since then. Users are fetched the same way, before the licenses which refer to them.
+
+The sync is run by the scheduler in one process at a time (see :mod:`commandment.jobs.scheduler`).
+
+Attributes:
+    vpp_start (int): In seconds, time of first run
+    vpp_time (int): In seconds, time of subsequent runs
+"""
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from flask import Flask
+import requests
+import sqlalchemy.orm.exc
+import sqlalchemy.exc
+from sqlalchemy.orm import Session
+
+from commandment.models import db
+from commandment.vpp import configure_service_config_cache
+from commandment.vpp.assignment import LicenseAssignmentEngine, assign_device_licenses
+from commandment.vpp.enum import VPPPricingParam, VPPProductType, VPPUserStatus
+from commandment.vpp.errors import VPPAPIError, VPPErrorType
+from commandment.vpp.models import VPPAccount, VPPLicense, VPPUser
+from commandment.vpp.vpp import VPP, VPPLicenseCursor, VPPUserCursor, SERVICE_CONFIG_URL
+
+vpp_start = 10
+vpp_time = 300
+
+logger = logging.getLogger('vpp thread')
+
+UNRECOVERABLE_TOKEN_ERRORS = {
+    VPPErrorType.InvalidArgument,
+    VPPErrorType.DataBatchUnrecoverable,
+}
+"""set: VPP error numbers which indicate that the persisted batch or since modified token cannot be used again."""
+
+
+def license_mapping(license: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a single license from the getVPPLicensesSrv reply into a column mapping for VPPLicense.
+
+    Every column is present in the mapping so that an update clears the assignment of a license which is no longer
+    associated with a user or device.
+    """
+    try:
+        product_type = VPPProductType(license.get('productTypeId'))
+    except ValueError:
+        product_type = None
+
+    try:
+        pricing_param = VPPPricingParam(license.get('pricingParam'))
+    except ValueError:
+        pricing_param = None
+
+    adam_id = license.get('adamIdStr', license.get('adamId', None))
+
+    return {
+        'license_id': int(license.get('licenseIdStr', license.get('licenseId'))),
+        'adam_id': str(adam_id) if adam_id is not None else None,
+        'product_type': product_type,
+        'product_type_name': license.get('productTypeName', None),
+        'pricing_param': pricing_param,
+        'is_irrevocable': license.get('isIrrevocable', None),
+        'user_id': license.get('userId', None),
+        'client_user_id': license.get('clientUserIdStr', None),
+        'its_id_hash': license.get('itsIdHash', None),
+        'serial_number': license.get('serialNumber', None),
+        'status': license.get('status', None),
+    }
+
+
+def user_mapping(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a single user from the getVPPUsersSrv reply into a column mapping for VPPUser."""
+    try:
+        status = VPPUserStatus(user.get('status'))
+    except ValueError:
+        status = None
+
+    return {
+        'user_id': int(user.get('userIdStr', user.get('userId'))),
+        'client_user_id': user.get('clientUserIdStr', None),
+        'email': user.get('email', None),
+        'status': status,
+        'invite_url': user.get('inviteUrl', None),
+        'invite_code': user.get('inviteCode', None),
+    }
+
+
+def upsert_users(session: Session, users: List[Dict[str, Any]]) -> int:
+    """Insert or update a page of users using bulk operations, in the same way as :func:`upsert_licenses`.
+
+    Args:
+        session (Session): The session to write to. The caller is responsible for committing.
+        users (List[dict]): Users as returned by the VPP service.
+    Returns:
+        int: The number of users written.
+    """
+    mappings: Dict[int, Dict[str, Any]] = {}
+    for user in users:
+        mapping = user_mapping(user)
+        mappings[mapping['user_id']] = mapping
+
+    if len(mappings) == 0:
+        return 0
+
+    existing = {user_id for user_id, in session.query(VPPUser.user_id).filter(VPPUser.user_id.in_(mappings.keys()))}
+
+    session.bulk_update_mappings(VPPUser, [m for uid, m in mappings.items() if uid in existing])
+    session.bulk_insert_mappings(VPPUser, [m for uid, m in mappings.items() if uid not in existing])
+
+    return len(mappings)
+
+
+def _insert_missing_users(session: Session, mappings: List[Dict[str, Any]]):
+    """Insert a placeholder for each user that a license refers to, but which has not been synced yet.
+
+    ``vpp_licenses.user_id`` and ``client_user_id`` are foreign keys to ``vpp_users``. A user registered after the
+    last user sync is filled in by the next one.
+    """
+    referenced = {m['user_id']: m['client_user_id'] for m in mappings
+                  if m['user_id'] is not None and m['client_user_id'] is not None}
+    if len(referenced) == 0:
+        return
+
+    existing = {user_id for user_id, in session.query(VPPUser.user_id).filter(
+        VPPUser.user_id.in_(referenced.keys()))}
+    session.bulk_insert_mappings(VPPUser, [{'user_id': user_id, 'client_user_id': client_user_id}
+                                           for user_id, client_user_id in referenced.items()
+                                           if user_id not in existing])
+
+
+def upsert_licenses(session: Session, licenses: List[Dict[str, Any]]) -> int:
+    """Insert or update a page of licenses using bulk operations.
+
+    The existing license ids in the page are selected with a single query, then the page is split into one bulk
+    UPDATE and one bulk INSERT. ORM objects are never hydrated.
+
+    Args:
+        session (Session): The session to write to. The caller is responsible for committing.
+        licenses (List[dict]): Licenses as returned by the VPP service.
+    Returns:
+        int: The number of licenses written.
+    """
+    mappings: Dict[int, Dict[str, Any]] = {}
+    for license in licenses:
+        mapping = license_mapping(license)
+        mappings[mapping['license_id']] = mapping  # If VPP returns a license twice, the last one wins.
+
+    if len(mappings) == 0:
+        return 0
+
+    _insert_missing_users(session, list(mappings.values()))
+
+    existing = {license_id for license_id, in session.query(VPPLicense.license_id).filter(
+        VPPLicense.license_id.in_(mappings.keys()))}
+
+    session.bulk_update_mappings(VPPLicense, [m for lid, m in mappings.items() if lid in existing])
+    session.bulk_insert_mappings(VPPLicense, [m for lid, m in mappings.items() if lid not in existing])
+
+    return len(mappings)
+
+
+def vpp_sync_users(app: Flask, vpp: VPP, vpp_account_id: int) -> int:
+    """Fetch or sync users from the VPP service, committing the users and tokens after every page.
+
+    Tokens are used in the same way as :func:`vpp_sync_licenses`.
+
+    Args:
+        app (Flask): The flask app
+        vpp (VPP): VPP client
+        vpp_account_id (int): The VPPAccount which the tokens are persisted to.
+    Returns:
+        int: The number of users that were written.
+    Raises:
+        VPPAPIError: If the VPP service returned an error.
+    """
+    thread_session = db.create_scoped_session()
+
+    try:
+        vpp_account: VPPAccount = thread_session.query(VPPAccount).filter(VPPAccount.id == vpp_account_id).one()
+
+        if vpp_account.users_batch_token is not None:
+            app.logger.info('Resuming VPP user fetch using batch token')
+            cursor: Optional[VPPUserCursor] = vpp.users(batch_token=vpp_account.users_batch_token)
+        elif vpp_account.users_since_modified_token is not None:
+            app.logger.info('Syncing VPP users using since modified token')
+            cursor = vpp.users(since_modified_token=vpp_account.users_since_modified_token)
+        else:
+            app.logger.info('No VPP user tokens found, performing a full fetch')
+            cursor = vpp.users()
+
+        count = 0
+        while cursor is not None:
+            count += upsert_users(thread_session, cursor.users or [])
+
+            # at least one of these must be null at all times
+            if cursor.batch_token is not None:
+                vpp_account.users_batch_token = cursor.batch_token
+                vpp_account.users_since_modified_token = None
+            else:
+                vpp_account.users_batch_token = None
+                if cursor.since_modified_token is not None:
+                    vpp_account.users_since_modified_token = cursor.since_modified_token
+
+            thread_session.commit()
+            app.logger.debug('Wrote VPP user page (%d user(s) so far, %s in total)', count, cursor.total)
+
+            cursor = cursor.next()
+
+        app.logger.info('VPP user sync wrote %d user(s)', count)
+        return count
+    finally:
+        thread_session.remove()
+
+
+def vpp_sync_licenses(app: Flask, vpp: VPP, vpp_account_id: int) -> int:
+    """Fetch or sync licenses from the VPP service, committing the licenses and tokens after every page.
+
+    - If the account has a batch token, the interrupted batch is resumed.
+    - If the account has a since modified token, only licenses modified since the last sync are fetched.
+    - Otherwise, every license is fetched.
+
+    Args:
+        app (Flask): The flask app
+        vpp (VPP): VPP client
+        vpp_account_id (int): The VPPAccount which the tokens are persisted to.
+    Returns:
+        int: The number of licenses that were written.
+    Raises:
+        VPPAPIError: If the VPP service returned an error.
+    """
+    thread_session = db.create_scoped_session()
+
+    try:
+        vpp_account: VPPAccount = thread_session.query(VPPAccount).filter(VPPAccount.id == vpp_account_id).one()
+
+        if vpp_account.licenses_batch_token is not None:
+            app.logger.info('Resuming VPP license fetch using batch token')
+            cursor: Optional[VPPLicenseCursor] = vpp.licenses(batch_token=vpp_account.licenses_batch_token)
+        elif vpp_account.licenses_since_modified_token is not None:
+            app.logger.info('Syncing VPP licenses using since modified token')
+            cursor = vpp.licenses(since_modified_token=vpp_account.licenses_since_modified_token)
+        else:
+            app.logger.info('No VPP license tokens found, performing a full fetch')
+            cursor = vpp.licenses()
+
+        count = 0
+        while cursor is not None:
+            count += upsert_licenses(thread_session, cursor.licenses or [])
+
+            # at least one of these must be null at all times
+            if cursor.batch_token is not None:
+                vpp_account.licenses_batch_token = cursor.batch_token
+                vpp_account.licenses_since_modified_token = None
+            else:
+                vpp_account.licenses_batch_token = None
+                if cursor.since_modified_token is not None:
+                    vpp_account.licenses_since_modified_token = cursor.since_modified_token
+
+            vpp_account.licenses_synced_at = datetime.utcnow()
+            thread_session.commit()
+            app.logger.debug('Wrote VPP license page (%d license(s) so far, %s in total)', count, cursor.total)
+
+            cursor = cursor.next()
+
+        app.logger.info('VPP license sync wrote %d license(s)', count)
+        return count
+    finally:
+        thread_session.remove()
+
+
+def vpp_clear_sync_tokens(vpp_account_id: int):
+    """Forget the user and license batch and since modified tokens so that the next sync performs a full fetch."""
+    vpp_account: VPPAccount = db.session.query(VPPAccount).filter(VPPAccount.id == vpp_account_id).one()
+    vpp_account.users_batch_token = None
+    vpp_account.users_since_modified_token = None
+    vpp_account.licenses_batch_token = None
+    vpp_account.licenses_since_modified_token = None
+    db.session.commit()
+
+
+def vpp_assign_licenses(app: Flask, vpp: VPP):
+    """Associate and disassociate device licenses so that they match the application and device tags."""
+    engine = LicenseAssignmentEngine(
+        vpp,
+        max_workers=app.config.get('VPP_MAX_CONCURRENT_REQUESTS', 4),
+        requests_per_second=app.config.get('VPP_MAX_REQUESTS_PER_SECOND', 5.0),
+    )
+    report = assign_device_licenses(db.session, engine)
+    db.session.commit()
+
+    for serial_number, failures in report.failures_by_serial().items():
+        for failure in failures:
+            app.logger.warning('Could not %s license for Adam ID %s to %s: %s (%s)',
+                               'associate' if failure.associate else 'disassociate',
+                               failure.adam_id, serial_number, failure.error_message, failure.error_number)
+
+
+def vpp_thread_callback(app: Flask):
+    """Sync VPP users and licenses once.
+
+    The scheduler runs this every `vpp_time` seconds, or as configured in JOB_INTERVALS.
+    """
+    with app.app_context():
+        try:
+            vpp_account: VPPAccount = db.session.query(VPPAccount).one()
+            app.logger.info('Checking VPP license state')
+
+            stoken = vpp_account.stoken
+            if isinstance(stoken, bytes):
+                stoken = stoken.decode('utf8')
+
+            configure_service_config_cache(app.config)
+            vpp = VPP(stoken, app.config.get('VPP_SERVICE_CONFIG_URL', SERVICE_CONFIG_URL))
+
+            try:
+                vpp_sync_users(app, vpp, vpp_account.id)
+                vpp_sync_licenses(app, vpp, vpp_account.id)
+            except VPPAPIError as e:
+                app.logger.error('VPP sync failed: %d: %s', e.errno, e.message)
+                if e.errno in UNRECOVERABLE_TOKEN_ERRORS:
+                    app.logger.info('VPP sync tokens are no longer valid, clearing for next run...')
+                    vpp_clear_sync_tokens(vpp_account.id)
+            else:
+                if app.config.get('VPP_ASSIGN_DEVICE_LICENSES', False):
+                    vpp_assign_licenses(app, vpp)
+
+        except sqlalchemy.orm.exc.NoResultFound:
+            app.logger.info('Not attempting a VPP sync, no account configured.')
+        except sqlalchemy.orm.exc.MultipleResultsFound:
+            app.logger.error('Not attempting a VPP sync, more than one VPP account is configured.')
+        except requests.RequestException as e:
+            app.logger.error('Could not reach the VPP service: %s', e)
+        except sqlalchemy.exc.SQLAlchemyError as e:
+            app.logger.error('VPP sync could not write to the database: %s', e)
@@ -1,7 +1,16 @@
 from flask import g, current_app
 
 from commandment.vpp.errors import VPPError
-from commandment.vpp.vpp import VPP
+from commandment.vpp.session import service_config_cache
+from commandment.vpp.vpp import VPP, SERVICE_CONFIG_URL
+
+
+def configure_service_config_cache(config: dict):
+    """Apply the VPP_SERVICE_CONFIG_TTL and VPP_SERVICE_CONFIG_CACHE settings to the process-wide cache."""
+    service_config_cache.configure(
+        ttl=config.get('VPP_SERVICE_CONFIG_TTL', None),
+        path=config.get('VPP_SERVICE_CONFIG_CACHE', None),
+    )
 
 
 def get_vpp() -> VPP:
@@ -11,6 +20,9 @@ def get_vpp() -> VPP:
         if 'VPP_STOKEN' not in current_app.config:
             raise VPPError('VPP stoken not configured')
 
-        g._vpp = VPP(current_app.config['VPP_STOKEN'])
+        configure_service_config_cache(current_app.config)
+        vpp = VPP(current_app.config['VPP_STOKEN'],
+                  current_app.config.get('VPP_SERVICE_CONFIG_URL', SERVICE_CONFIG_URL))
+        g._vpp = vpp
 
     return vpp
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+VPP Device License Assignment
+
+The desired state (which App Store applications each device should hold a license for) is derived from tags: a device
+should hold a license for every App Store application that shares one of its tags. Only the licenses of applications
+which have at least one tag are managed this way, so licenses of untagged applications, eg. assigned in Apple School
+Manager, are left alone. The current state is the set of licenses synchronised into ``vpp_licenses`` by the VPP thread.
+
+The difference between the two is packed into as few ``manageVPPLicensesByAdamIdSrv`` requests as possible, honouring
+the ``maxBatchAssociateLicenseCount`` and ``maxBatchDisassociateLicenseCount`` limits of the service configuration,
+and the requests are sent concurrently from a bounded thread pool with a minimum interval between requests.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Set, List, Optional, Iterator, NamedTuple
+
+import requests
+from sqlalchemy.orm import Session
+
+from commandment.models import Device, device_tags
+from commandment.apps.models import Application, ApplicationType, application_tags
+from commandment.vpp.enum import AdamID
+from commandment.vpp.models import VPPLicense
+from commandment.vpp.vpp import VPP
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_COUNT = 10
+"""int: Used if the service configuration does not state the maximum number of (dis)associations per request."""
+
+VPP_APPLICATION_TYPES = [ApplicationType.APPSTORE_IOS.value, ApplicationType.APPSTORE_MAC.value]
+"""list: Application discriminators that are distributed using VPP licenses."""
+
+SerialNumber = str
+Assignments = Dict[AdamID, Set[SerialNumber]]
+"""Assignments: A mapping of Adam ID to the set of device serial numbers holding (or requiring) a license."""
+
+
+class LicenseRequest(NamedTuple):
+    """A single ``manageVPPLicensesByAdamIdSrv`` request."""
+    adam_id: AdamID
+    associate: List[SerialNumber]
+    disassociate: List[SerialNumber]
+    pricing_param: str = 'STDQ'
+
+
+class LicenseResult(NamedTuple):
+    """The outcome of associating or disassociating a license for a single serial number.
+
+    ``error_number`` and ``error_message`` are None if the operation succeeded. ``error_number`` is also None if the
+    request failed before the VPP service could reply.
+    """
+    adam_id: AdamID
+    serial_number: SerialNumber
+    associate: bool
+    license_id: Optional[int] = None
+    error_number: Optional[int] = None
+    error_message: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error_number is None and self.error_message is None
+
+
+class LicenseAssignmentReport(object):
+    """Collects the per-serial results of executing a number of license requests.
+
+    Attributes:
+          results (List[LicenseResult]): Every result, in the order in which the requests completed.
+    """
+
+    def __init__(self) -> None:
+        self.results: List[LicenseResult] = []
+
+    @property
+    def succeeded(self) -> List[LicenseResult]:
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self) -> List[LicenseResult]:
+        return [r for r in self.results if not r.ok]
+
+    def failures_by_serial(self) -> Dict[SerialNumber, List[LicenseResult]]:
+        """Group every failed result by the device serial number."""
+        failures: Dict[SerialNumber, List[LicenseResult]] = {}
+        for result in self.failed:
+            failures.setdefault(result.serial_number, []).append(result)
+
+        return failures
+
+
+def desired_device_licenses(session: Session) -> Assignments:
+    """Calculate the device licenses that should exist, based upon the tags shared by App Store applications and
+    devices.
+
+    This queries the tag join tables directly, no ORM objects are hydrated.
+
+    Every App Store application with an iTunes Store ID and at least one tag is present in the result, even if no
+    device shares its tags, so that licenses of devices which have been untagged are disassociated. Applications
+    without tags are not present, so that licenses which were not assigned by tag are left alone.
+    """
+    desired: Assignments = {}
+
+    apps = session.query(Application.itunes_store_id).\
+        join(application_tags, application_tags.c.application_id == Application.id).\
+        filter(Application.discriminator.in_(VPP_APPLICATION_TYPES)).\
+        filter(Application.itunes_store_id.isnot(None)).\
+        distinct()
+    for itunes_store_id, in apps:
+        desired[str(itunes_store_id)] = set()
+
+    rows = session.query(Application.itunes_store_id, Device.serial_number).\
+        join(application_tags, application_tags.c.application_id == Application.id).\
+        join(device_tags, device_tags.c.tag_id == application_tags.c.tag_id).\
+        join(Device, Device.id == device_tags.c.device_id).\
+        filter(Application.discriminator.in_(VPP_APPLICATION_TYPES)).\
+        filter(Application.itunes_store_id.isnot(None)).\
+        filter(Device.serial_number.isnot(None)).\
+        distinct()
+
+    for itunes_store_id, serial_number in rows:
+        desired[str(itunes_store_id)].add(serial_number)
+
+    return desired
+
+
+def current_device_licenses(session: Session) -> Assignments:
+    """Read the device licenses that were last synchronised from VPP."""
+    current: Assignments = {}
+    rows = session.query(VPPLicense.adam_id, VPPLicense.serial_number).filter(VPPLicense.serial_number.isnot(None))
+    for adam_id, serial_number in rows:
+        current.setdefault(adam_id, set()).add(serial_number)
+
+    return current
+
+
+def _chunks(items: List[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def plan_device_licenses(desired: Assignments, current: Assignments,
+                         max_associate: int = DEFAULT_MAX_BATCH_COUNT,
+                         max_disassociate: int = DEFAULT_MAX_BATCH_COUNT) -> List[LicenseRequest]:
+    """Diff the desired and current license assignments into the minimum number of license requests.
+
+    Only Adam IDs present in ``desired`` are managed. Licenses for other products are left alone, even if they are
+    assigned to devices, because they were not assigned by tag.
+
+    Associations and disassociations for the same Adam ID are packed into the same request where possible.
+
+    Args:
+        desired (Assignments): Adam ID to serial numbers that should hold a license.
+        current (Assignments): Adam ID to serial numbers that currently hold a license.
+        max_associate (int): Maximum serial numbers to associate in a single request.
+        max_disassociate (int): Maximum serial numbers to disassociate in a single request.
+    Returns:
+        List[LicenseRequest]: Requests which will converge the current state towards the desired state.
+    """
+    planned: List[LicenseRequest] = []
+
+    for adam_id in sorted(desired.keys()):
+        held = current.get(adam_id, set())
+        associate = sorted(desired[adam_id] - held)
+        disassociate = sorted(held - desired[adam_id])
+
+        associate_chunks = list(_chunks(associate, max_associate))
+        disassociate_chunks = list(_chunks(disassociate, max_disassociate))
+
+        for i in range(max(len(associate_chunks), len(disassociate_chunks))):
+            planned.append(LicenseRequest(
+                adam_id=adam_id,
+                associate=associate_chunks[i] if i < len(associate_chunks) else [],
+                disassociate=disassociate_chunks[i] if i < len(disassociate_chunks) else [],
+            ))
+
+    return planned
+
+
+class RateLimiter(object):
+    """Enforce a minimum interval between the start of consecutive requests across all threads.
+
+    Args:
+          requests_per_second (float): The maximum sustained request rate.
+    """
+
+    def __init__(self, requests_per_second: float) -> None:
+        self._interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next_at - now
+            self._next_at = max(now, self._next_at) + self._interval
+
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+class LicenseAssignmentEngine(object):
+    """Execute license requests concurrently within rate limits, and report partial failures per serial number.
+
+    Args:
+          vpp (VPP): The VPP client. Requests are made on its session, which is shared between the worker threads.
+          max_workers (int): Maximum number of requests in flight.
+          requests_per_second (float): Maximum sustained request rate.
+          max_retries (int): Number of times to retry a request that was rejected with HTTP 503/429 Retry-After.
+    """
+
+    def __init__(self, vpp: VPP, max_workers: int = 4, requests_per_second: float = 5.0,
+                 max_retries: int = 3) -> None:
+        self._vpp = vpp
+        self._max_workers = max_workers
+        self._limiter = RateLimiter(requests_per_second)
+        self._max_retries = max_retries
+
+    def plan(self, desired: Assignments, current: Assignments) -> List[LicenseRequest]:
+        """Plan license requests using the batch limits from the VPP service configuration."""
+        config = self._vpp.service_config
+        return plan_device_licenses(
+            desired, current,
+            max_associate=config.get('maxBatchAssociateLicenseCount', DEFAULT_MAX_BATCH_COUNT),
+            max_disassociate=config.get('maxBatchDisassociateLicenseCount', DEFAULT_MAX_BATCH_COUNT),
+        )
+
+    def execute(self, license_requests: List[LicenseRequest]) -> LicenseAssignmentReport:
+        """Send every license request and collect the results.
+
+        A failed request does not stop the remaining requests from being sent.
+        """
+        report = LicenseAssignmentReport()
+        if len(license_requests) == 0:
+            return report
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for results in executor.map(self._send, license_requests):
+                report.results.extend(results)
+
+        logger.info('Executed %d license request(s): %d succeeded, %d failed',
+                    len(license_requests), len(report.succeeded), len(report.failed))
+        return report
+
+    def _send(self, license_request: LicenseRequest) -> List[LicenseResult]:
+        reply = None
+        attempt = 0
+        try:
+            while reply is None:
+                self._limiter.wait()
+                res = self._vpp.manage_licenses_request(
+                    license_request.adam_id,
+                    associate=license_request.associate,
+                    disassociate=license_request.disassociate,
+                    pricing_param=license_request.pricing_param,
+                )
+                if res.status_code in (429, 503) and attempt < self._max_retries:
+                    attempt += 1
+                    retry_after = res.headers.get('Retry-After', '')
+                    delay = float(retry_after) if retry_after.isdigit() else 2.0 ** attempt
+                    logger.info('VPP asked us to back off for %.1f second(s)', delay)
+                    time.sleep(delay)
+                    continue
+
+                res.raise_for_status()
+                reply = res.json()
+
+        except (requests.RequestException, ValueError) as e:
+            logger.error('License request for Adam ID %s failed: %s', license_request.adam_id, e)
+            return self._fail_all(license_request, None, str(e))
+
+        if reply.get('status', 0) == -1:
+            return self._fail_all(license_request, reply.get('errorNumber'), reply.get('errorMessage'))
+
+        return self._results(license_request, reply)
+
+    @staticmethod
+    def _fail_all(license_request: LicenseRequest, error_number: Optional[int],
+                  error_message: Optional[str]) -> List[LicenseResult]:
+        return [LicenseResult(license_request.adam_id, serial, True, None, error_number, error_message or 'Failed')
+                for serial in license_request.associate] + \
+               [LicenseResult(license_request.adam_id, serial, False, None, error_number, error_message or 'Failed')
+                for serial in license_request.disassociate]
+
+    @staticmethod
+    def _results(license_request: LicenseRequest, reply: dict) -> List[LicenseResult]:
+        """Match the per-serial reply entries to the serial numbers that were requested.
+
+        Any serial number missing from the reply is assumed to have succeeded, because the service only itemizes
+        the associations and disassociations it processed.
+        """
+        results = []
+        for associate, serials, key in ((True, license_request.associate, 'associations'),
+                                        (False, license_request.disassociate, 'disassociations')):
+            items = {item.get('serialNumber'): item for item in reply.get(key, [])}
+            for serial in serials:
+                item = items.get(serial, {})
+                license_id = item.get('licenseIdStr', item.get('licenseId', None))
+                results.append(LicenseResult(
+                    adam_id=license_request.adam_id,
+                    serial_number=serial,
+                    associate=associate,
+                    license_id=int(license_id) if license_id is not None else None,
+                    error_number=item.get('errorNumber', None),
+                    error_message=item.get('errorMessage', None),
+                ))
+
+        return results
+
+
+def record_license_results(session: Session, report: LicenseAssignmentReport):
+    """Apply successful results to ``vpp_licenses`` so that the next plan does not repeat them before the
+    next license sync.
+
+    The caller is responsible for committing.
+    """
+    for result in report.succeeded:
+        if result.associate:
+            if result.license_id is None:
+                continue
+
+            updated = session.query(VPPLicense).filter(VPPLicense.license_id == result.license_id).update({
+                'serial_number': result.serial_number,
+                'status': 'Associated',
+            }, synchronize_session=False)
+            if updated == 0:
+                session.bulk_insert_mappings(VPPLicense, [{
+                    'license_id': result.license_id,
+                    'adam_id': result.adam_id,
+                    'serial_number': result.serial_number,
+                    'status': 'Associated',
+                }])
+        else:
+            session.query(VPPLicense).filter(
+                VPPLicense.adam_id == result.adam_id,
+                VPPLicense.serial_number == result.serial_number,
+            ).update({
+                'serial_number': None,
+                'status': 'Available',
+            }, synchronize_session=False)
+
+
+def assign_device_licenses(session: Session, engine: LicenseAssignmentEngine) -> LicenseAssignmentReport:
+    """Plan and execute every device license change required by the current tag assignments."""
+    license_requests = engine.plan(desired_device_licenses(session), current_device_licenses(session))
+    logger.info('Planned %d license request(s)', len(license_requests))
+    report = engine.execute(license_requests)
+    record_license_results(session, report)
+
+    return report
@@ -25,7 +25,7 @@ class VPPAccount(db.Model):
         self.exp_date = dateutil.parser.parse(data['expDate'])
         self.org_name = data['orgName']
 
-    _stoken = db.Column(db.String, nullable=False)
+    _stoken = db.Column('stoken', db.String, nullable=False)
     exp_date = db.Column(db.DateTime)
     """datetime: Populated for convenience when checking the VPP token expiry date."""
     org_name = db.Column(db.String)
@@ -35,6 +35,9 @@ class VPPAccount(db.Model):
     licenses_since_modified_token = db.Column(db.String)
     licenses_batch_token = db.Column(db.String)
 
+    licenses_synced_at = db.Column(db.DateTime)
+    """datetime: The last time the license sync job completed a batch or since-modified fetch."""
+
     users_since_modified_token = db.Column(db.String)
     users_batch_token = db.Column(db.String)
 
@@ -47,7 +50,7 @@ class VPPUser(db.Model):
     __tablename__ = 'vpp_users'
 
     user_id = db.Column(db.Integer, primary_key=True)
-    client_user_id = db.Column(GUID, nullable=False)
+    client_user_id = db.Column(GUID, nullable=False, unique=True, index=True)
     email = db.Column(db.String)
     status = db.Column(db.Enum(VPPUserStatus))
     invite_url = db.Column(db.String)
@@ -58,7 +61,7 @@ class VPPLicense(db.Model):
     __tablename__ = 'vpp_licenses'
 
     license_id = db.Column(db.Integer, primary_key=True)
-    adam_id = db.Column(db.String)
+    adam_id = db.Column(db.String, index=True)
     product_type = db.Column(db.Enum(VPPProductType))
     product_type_name = db.Column(db.String)
     pricing_param = db.Column(db.Enum(VPPPricingParam))
@@ -66,5 +69,8 @@ class VPPLicense(db.Model):
     user_id = db.Column(db.ForeignKey('vpp_users.user_id'))
     client_user_id = db.Column(db.ForeignKey('vpp_users.client_user_id'))
     its_id_hash = db.Column(db.String)
-    
+    serial_number = db.Column(db.String, index=True)
+    """str: The serial number of the device, if this license is assigned using device based assignment."""
+    status = db.Column(db.String)
+    """str: The license status as reported by VPP eg. `Associated` or `Available`"""
 
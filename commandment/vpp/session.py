@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Shared HTTP session and service configuration cache for the VPP client.
+
+Constructing a :class:`commandment.vpp.vpp.VPP` instance used to create a new ``requests.Session`` and perform a
+blocking GET of ``VPPServiceConfigSrv``. Both are now shared by every instance in the process:
+
+- :func:`vpp_session` returns a keep-alive session with a connection pool large enough for concurrent license
+  requests. A new session is created after a fork so that connections are never shared between processes.
+- :class:`ServiceConfigCache` keeps the service configuration for a TTL, revalidates it with ``If-None-Match`` when
+  the TTL expires, and optionally persists it to disk so that a cold start does not need the network.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from commandment.metrics import api_response_hook
+
+logger = logging.getLogger(__name__)
+
+POOL_MAXSIZE = 16
+"""int: Maximum number of pooled connections per host, which bounds useful request concurrency."""
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def vpp_session() -> requests.Session:
+    """Get the process-wide VPP session, creating it if necessary."""
+    global _session, _session_pid
+
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            session.hooks['response'].append(api_response_hook('vpp'))
+            _session = session
+            _session_pid = os.getpid()
+
+        return _session
+
+
+class CachedServiceConfig(NamedTuple):
+    """A service configuration reply and the metadata needed to revalidate it."""
+    config: dict
+    etag: Optional[str]
+    fetched_at: float
+
+
+class ServiceConfigCache(object):
+    """Process-wide cache of VPPServiceConfigSrv replies keyed by URL.
+
+    Args:
+          ttl (int): Seconds for which a cached configuration is used without contacting the service.
+          path (Optional[str]): If given, a JSON file used to persist fetched configurations between processes.
+    """
+
+    def __init__(self, ttl: int = 3600, path: Optional[str] = None) -> None:
+        self.ttl = ttl
+        self.path = path
+        self._entries: Dict[str, CachedServiceConfig] = {}
+        self._lock = threading.Lock()
+        self._loaded_path: Optional[str] = None
+
+    def configure(self, ttl: Optional[int] = None, path: Optional[str] = None):
+        """Change the TTL or persistence path, eg. from the Flask configuration."""
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if path is not None:
+                self.path = path
+
+    def clear(self):
+        """Forget every cached configuration held in memory. The persisted copy is not removed."""
+        with self._lock:
+            self._entries = {}
+            self._loaded_path = None
+
+    def get(self, url: str, session: requests.Session = None) -> dict:
+        """Get the service configuration for the given URL.
+
+        Args:
+              url (str): The VPPServiceConfigSrv URL
+              session (requests.Session): The session to fetch with, defaults to the shared VPP session.
+        Returns:
+              dict: The service configuration.
+        Raises:
+              requests.RequestException: If the configuration is not cached at all and cannot be fetched.
+        """
+        with self._lock:
+            self._load()
+            entry = self._entries.get(url, None)
+
+            if entry is not None and time.time() - entry.fetched_at < self.ttl:
+                return entry.config
+
+            try:
+                entry = self._fetch(url, session or vpp_session(), entry)
+            except (requests.RequestException, ValueError) as e:
+                if entry is None:
+                    raise
+
+                logger.warning('Could not revalidate VPP service config, using stale copy: %s', e)
+                return entry.config
+
+            self._entries[url] = entry
+            self._save()
+            return entry.config
+
+    def _fetch(self, url: str, session: requests.Session,
+               entry: Optional[CachedServiceConfig]) -> CachedServiceConfig:
+        headers = {}
+        if entry is not None and entry.etag is not None:
+            headers['If-None-Match'] = entry.etag
+
+        res = session.get(url, headers=headers)
+        if res.status_code == 304 and entry is not None:
+            logger.debug('VPP service config not modified')
+            return entry._replace(fetched_at=time.time())
+
+        res.raise_for_status()
+        logger.debug('Fetched VPP service config from %s', url)
+        return CachedServiceConfig(res.json(), res.headers.get('ETag', None), time.time())
+
+    def _load(self):
+        """Load the persisted configurations once per path, entries already in memory take precedence."""
+        if self.path is None or self._loaded_path == self.path:
+            return
+
+        self._loaded_path = self.path
+        try:
+            with open(self.path, 'r') as fd:
+                persisted = json.load(fd)
+        except (OSError, ValueError):
+            return
+
+        for url, entry in persisted.items():
+            if url not in self._entries:
+                self._entries[url] = CachedServiceConfig(entry['config'], entry.get('etag'), entry['fetched_at'])
+
+    def _save(self):
+        if self.path is None:
+            return
+
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as fd:
+                json.dump({url: entry._asdict() for url, entry in self._entries.items()}, fd)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning('Could not persist VPP service config to %s: %s', self.path, e)
+
+
+service_config_cache = ServiceConfigCache()
+"""ServiceConfigCache: The cache used by every VPP instance unless another one is given."""
@@ -14,8 +14,10 @@ import json
 import base64
 
 from commandment.vpp.decorators import raise_error_replies
+from commandment.vpp.errors import VPPAPIError
+from commandment.vpp.session import vpp_session, service_config_cache, ServiceConfigCache
 from commandment.vpp.enum import LicenseAssociation, LicenseDisassociation, LicenseAssociationType, \
-    LicenseDisassociationType, VPPPricingParam
+    LicenseDisassociationType, VPPPricingParam, AdamID
 
 SERVICE_CONFIG_URL = 'https://vpp.itunes.apple.com/WebObjects/MZFinance.woa/wa/VPPServiceConfigSrv'
 """str: The default production URL to fetch VPP service configuration from."""
@@ -241,34 +243,34 @@ class VPP(object):
         LicenseDisassociationType.LicenseID: 'disassociateLicenseIdStrs',
     }
 
-    def __init__(self, stoken: str, vpp_service_config_url: str = SERVICE_CONFIG_URL, service_config: dict = None) -> None:
+    def __init__(self, stoken: str, vpp_service_config_url: str = SERVICE_CONFIG_URL, service_config: dict = None,
+                 config_cache: ServiceConfigCache = None) -> None:
         """
         The VPP class is a wrapper around a requests session and provides an API for interacting with Apple's VPP
         service.
 
+        The session is shared by every instance in the process, and the service configuration is fetched through
+        a cache, so constructing an instance does not normally make a request.
+
         Args:
             stoken (str): Service Token
             vpp_service_config_url (str): URL to the VPPServiceConfigSrv endpoint. defaults to Apple's live server.
             service_config (dict): Dictionary containing service config, if you do not want to fetch it (testing only).
+            config_cache (ServiceConfigCache): The service config cache, defaults to the process-wide cache.
         """
-        self._session = requests.Session()
-        self._session.headers.update({'Content-Type': 'application/json'})
+        self._session = vpp_session()
         self._stoken = stoken
 
         if not service_config:
-            fetched_service_config = self._fetch_config(vpp_service_config_url)
-            self._service_config = fetched_service_config
+            cache = config_cache if config_cache is not None else service_config_cache
+            self._service_config = cache.get(vpp_service_config_url, self._session)
         else:
             self._service_config = service_config
 
-    def _fetch_config(self, service_config_url: str) -> dict:
-        """Fetch the service configuration from Apple, which contains all of the URLs required for VPP.
-
-        Args:
-            service_config_url (str): The VPPServiceConfigSrv URL to use
-        """
-        res = self._session.get(service_config_url)
-        return res.json()
+    @property
+    def service_config(self) -> dict:
+        """dict: The VPP service configuration, including endpoint URLs and batch size limits."""
+        return self._service_config
 
     @raise_error_replies
     def register_user(self, client_user_id: str, email: str = None, facilitator_member_id: str = None,
@@ -341,7 +343,11 @@ class VPP(object):
             since_modified_token (str): Since modified token (if requesting a time delta)
 
         Returns:
+              VPPUserCursor: A cursor that can be used to fetch all remaining results, pre-populated with the first
+                page.
 
+        Raises:
+              VPPAPIError: If the service replied with an error, such as an unrecoverable batch token.
         """
         request_body = {'sToken': self._stoken}
         if include_retired == 1:
@@ -354,6 +360,9 @@ class VPP(object):
 
         res = self._session.post(self._service_config['getUsersSrvUrl'], data=json.dumps(request_body))
         results = res.json()
+        if results.get('status', 0) == -1:
+            raise VPPAPIError(results['errorNumber'], results['errorMessage'])
+
         cursor = VPPUserCursor(includes_retired=(include_retired == 1))
         cursor._current = results
         cursor._vpp = self
@@ -506,6 +515,9 @@ class VPP(object):
         Returns:
               VPPLicenseCursor: A cursor that can be used to fetch all remaining results, pre-populated with the first
                 page.
+
+        Raises:
+              VPPAPIError: If the service replied with an error, such as an unrecoverable batch token.
         """
         request_body = {'sToken': self._stoken}
         if assigned_only:
@@ -524,6 +536,9 @@ class VPP(object):
 
         res = self._session.post(self._service_config['getLicensesSrvUrl'], data=json.dumps(request_body))
         reply = res.json()
+        if reply.get('status', 0) == -1:
+            raise VPPAPIError(reply['errorNumber'], reply['errorMessage'])
+
         cursor = VPPLicenseCursor(vpp=self)
         cursor._current = reply
 
@@ -582,20 +597,57 @@ class VPP(object):
         See Also:
             - manageVPPLicensesByAdamIdSrv
         """
+        res = self.manage_licenses_request(
+            adam_id,
+            association_type=association_type,
+            associate=associate,
+            disassociation_type=disassociation_type,
+            disassociate=disassociate,
+            pricing_param=pricing_param,
+            notify=notify,
+        )
+        reply = res.json()
+
+        return reply
+
+    def manage_licenses_request(self,
+                                adam_id: AdamID,
+                                associate: Optional[List[str]] = None,
+                                disassociate: Optional[List[str]] = None,
+                                association_type: Optional[LicenseAssociationType] =
+                                LicenseAssociationType.SerialNumber,
+                                disassociation_type: Optional[LicenseDisassociationType] =
+                                LicenseDisassociationType.SerialNumber,
+                                pricing_param: str = 'STDQ',
+                                notify: bool = False) -> requests.Response:
+        """Send a single manageVPPLicensesByAdamIdSrv request and return the raw HTTP response.
+
+        This is used by callers that need to inspect the HTTP status, eg. to honour ``Retry-After`` when sending many
+        requests concurrently. The defaults perform device based assignment by serial number.
+
+        Args:
+              adam_id (AdamID): Adam ID - The iTunes Store Product for which licenses will be managed.
+              associate (Optional[List[str]]): Values to associate, corresponding to the association_type
+              disassociate (Optional[List[str]]): Values to disassociate, corresponding to the disassociation_type
+              association_type (Optional[LicenseAssociationType]): Defaults to SerialNumber
+              disassociation_type (Optional[LicenseDisassociationType]): Defaults to SerialNumber
+              pricing_param (str): Defaults to Standard Quality 'STDQ'
+              notify (bool): Notify disassociation, default is False
+        Returns:
+              requests.Response: The HTTP response, which has not been checked for errors.
+        """
         request_body = {
             'sToken': self._stoken,
-            'adamIdStr': adam_id,
+            'adamIdStr': str(adam_id),
             'pricingParam': pricing_param,
             'notifyDisassociation': notify,
         }
 
-        if association_type in VPP.AssociationProperties:
+        if association_type in VPP.AssociationProperties and associate is not None:
             request_body[VPP.AssociationProperties[association_type]] = associate
 
-        if disassociation_type in VPP.DisassociationProperties:
+        if disassociation_type in VPP.DisassociationProperties and disassociate is not None:
             request_body[VPP.DisassociationProperties[disassociation_type]] = disassociate
 
-        res = self._session.post(self._service_config['manageVPPLicensesByAdamIdSrvUrl'], data=json.dumps(request_body))
-        reply = res.json()
-
-        return reply
+        return self._session.post(self._service_config['manageVPPLicensesByAdamIdSrvUrl'],
+                                  data=json.dumps(request_body))
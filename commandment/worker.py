@@ -0,0 +1,73 @@
+"""
+The background subsystems: the job scheduler, the RSA key pool and the command response workers.
+
+By default they are started by :func:`commandment.create_app` in every process, alongside the web application. To keep
+them out of the web server, set ``START_BACKGROUND_THREADS = False`` in the settings used by the web processes, and
+run one or more ``commandment-worker`` processes with the same settings instead::
+
+    COMMANDMENT_SETTINGS=/path/to/settings.cfg commandment-worker
+
+Because the jobs take database leases (see :mod:`commandment.jobs.scheduler`), any number of worker processes can
+run at once. A worker only wakes the key pool and response threads for keys taken and responses queued in its own
+process, so with separate workers those threads pick up work from the web processes on their next poll.
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+from typing import Optional
+
+from flask import Flask
+
+logger = logging.getLogger('worker')
+
+
+def start(app: Flask):
+    """Start the background subsystems in this process."""
+    from commandment.jobs import scheduler
+    from commandment.threads import key_pool_thread, response_thread
+
+    scheduler.start(app)
+    key_pool_thread.start(app)
+    response_thread.start(app)
+
+
+def stop():
+    """Stop the background subsystems in this process. Work that is in progress is allowed to finish."""
+    from commandment.jobs import scheduler
+    from commandment.threads import key_pool_thread, response_thread
+
+    scheduler.stop()
+    key_pool_thread.stop()
+    response_thread.stop()
+
+
+def main(argv: Optional[list] = None):
+    """Run the background subsystems without serving requests, until SIGINT or SIGTERM is received."""
+    parser = argparse.ArgumentParser(description='Run the Commandment background jobs and workers.')
+    parser.add_argument('--config', default=os.environ.get('COMMANDMENT_SETTINGS'),
+                        help='path to the settings file, defaults to the COMMANDMENT_SETTINGS environment variable')
+    args = parser.parse_args(argv)
+
+    if args.config is None:
+        parser.error('No settings file, use --config or set COMMANDMENT_SETTINGS')
+
+    logging.basicConfig(level=logging.INFO)
+
+    from commandment import create_app
+    app = create_app(args.config, start_background=False)
+
+    stopped = threading.Event()
+
+    def _stop(signum, frame):
+        logger.info('Received signal %d, stopping', signum)
+        stopped.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    logger.info('Starting background workers')
+    start(app)
+    stopped.wait()
+    stop()
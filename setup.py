@@ -61,12 +61,16 @@ setup(
         ],
         'macOS': [
             'pyobjc'
+        ],
+        'reports': [
+            'pyarrow>=7'
         ]
     },
     setup_requires=['pytest-runner'],
     entry_points={
         'console_scripts': [
-            'commandment=commandment.cli:server',
+            'commandment=commandment.cli:main',
+            'commandment-worker=commandment.worker:main',
             'appmanifest=commandment.pkg.appmanifest:main',
         ]
     },
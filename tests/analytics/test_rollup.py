@@ -0,0 +1,137 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import Response
+from tests.client import MDMClient
+from commandment.analytics import LatencyMetric, BUCKETS, bucket_index, empty_histogram, percentile
+from commandment.analytics.models import CommandLatencyRollup
+from commandment.analytics.rollup import rollup_command_latency
+from commandment.mdm import CommandStatus
+from commandment.models import Command, Device
+
+NOW = datetime(2026, 10, 19, 12, 30)
+
+
+def _command(session, device: Device, queued: int, sent: int = None, acknowledged: int = None,
+             status: CommandStatus = CommandStatus.Acknowledged, request_type: str = 'DeviceInformation') -> Command:
+    """Add a command with timestamps given in seconds before NOW."""
+    c = Command(
+        request_type=request_type,
+        uuid='{:032x}'.format(session.query(Command).count() + 1),
+        status=status,
+        parameters={},
+        device=device,
+        queued_at=NOW - timedelta(seconds=queued),
+        sent_at=NOW - timedelta(seconds=sent) if sent is not None else None,
+        acknowledged_at=NOW - timedelta(seconds=acknowledged) if acknowledged is not None else None,
+    )
+    session.add(c)
+    session.commit()
+    return c
+
+
+@pytest.fixture()
+def ipad(session) -> Device:
+    d = Device(udid='00000000-1111-2222-3333-444455556666', model_name='iPad')
+    session.add(d)
+    session.commit()
+    return d
+
+
+class TestPercentile:
+
+    def test_empty(self):
+        assert percentile(empty_histogram(), 0.5) is None
+
+    def test_interpolated(self):
+        counts = empty_histogram()
+        counts[bucket_index(3)] += 4  # (2, 5]
+        assert percentile(counts, 0.5) == 3.5
+
+    def test_overflow(self):
+        counts = empty_histogram()
+        counts[bucket_index(BUCKETS[-1] * 2)] += 1
+        assert percentile(counts, 0.99) == BUCKETS[-1]
+
+
+class TestRollup:
+
+    def test_rollup(self, session, ipad: Device):
+        _command(session, ipad, queued=900, sent=600, acknowledged=590)
+        _command(session, ipad, queued=900, sent=300, acknowledged=298)
+        _command(session, ipad, queued=900, status=CommandStatus.Queued)
+
+        assert rollup_command_latency(session, now=NOW) == 4
+
+        sent = session.query(CommandLatencyRollup).filter(
+            CommandLatencyRollup.metric == LatencyMetric.QueuedToSent).one()
+        assert sent.hour == datetime(2026, 10, 19, 12)
+        assert sent.request_type == 'DeviceInformation'
+        assert sent.platform == 'iOS'
+        assert sent.count == 2
+        assert sent.total_seconds == 900.0
+        assert sent.max_seconds == 600.0
+
+        acknowledged = session.query(CommandLatencyRollup).filter(
+            CommandLatencyRollup.metric == LatencyMetric.SentToAcknowledged).one()
+        assert acknowledged.count == 2
+        assert acknowledged.max_seconds == 10.0
+
+    def test_incremental(self, session, ipad: Device):
+        _command(session, ipad, queued=900, sent=600, acknowledged=590)
+        assert rollup_command_latency(session, now=NOW) == 2
+
+        # Already counted commands are not counted again
+        assert rollup_command_latency(session, now=NOW + timedelta(seconds=30)) == 0
+
+        _command(session, ipad, queued=100, sent=10, acknowledged=5)
+        assert rollup_command_latency(session, now=NOW + timedelta(seconds=120)) == 2
+
+        sent = session.query(CommandLatencyRollup).filter(
+            CommandLatencyRollup.metric == LatencyMetric.QueuedToSent).one()
+        assert sent.count == 2
+        assert sum(sent.buckets) == 2
+
+    def test_lag(self, session, ipad: Device):
+        _command(session, ipad, queued=40, sent=30, acknowledged=20)
+        assert rollup_command_latency(session, now=NOW, lag=60) == 0
+        assert rollup_command_latency(session, now=NOW + timedelta(seconds=60), lag=60) == 2
+
+    def test_not_now_excluded(self, session, ipad: Device):
+        _command(session, ipad, queued=900, sent=600, acknowledged=590, status=CommandStatus.NotNow)
+        rollup_command_latency(session, now=NOW)
+
+        assert session.query(CommandLatencyRollup).filter(
+            CommandLatencyRollup.metric == LatencyMetric.SentToAcknowledged).count() == 0
+
+
+class TestCommandLatencyAPI:
+
+    def test_summary(self, client: MDMClient, session, ipad: Device):
+        _command(session, ipad, queued=900, sent=600, acknowledged=590)
+        rollup_command_latency(session, now=NOW)
+
+        response: Response = client.get('/api/v1/analytics/command_latency', query_string={
+            'since': '2026-10-19T00:00:00', 'until': '2026-10-20T00:00:00', 'metric': 'queued_to_sent'})
+        assert response.status_code == 200
+
+        data = response.json['data']
+        assert len(data) == 1
+        assert data[0]['metric'] == 'queued_to_sent'
+        assert data[0]['request_type'] == 'DeviceInformation'
+        assert data[0]['platform'] == 'iOS'
+        assert data[0]['count'] == 1
+        assert data[0]['mean'] == 300.0
+        assert 120 < data[0]['p50'] <= 300
+
+    def test_group_by_hour(self, client: MDMClient, session, ipad: Device):
+        _command(session, ipad, queued=900, sent=600, acknowledged=590)
+        rollup_command_latency(session, now=NOW)
+
+        response: Response = client.get('/api/v1/analytics/command_latency', query_string={
+            'since': '2026-10-19T00:00:00', 'until': '2026-10-20T00:00:00', 'group_by': 'hour'})
+        assert [(d['metric'], d['hour']) for d in response.json['data']] == [
+            ('queued_to_sent', '2026-10-19T12:00:00'), ('sent_to_acknowledged', '2026-10-19T12:00:00')]
+
+    def test_invalid_group_by(self, client: MDMClient, session):
+        response: Response = client.get('/api/v1/analytics/command_latency', query_string={'group_by': 'udid'})
+        assert response.status_code == 400
@@ -0,0 +1,103 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from flask import Response
+from six.moves.urllib.parse import urlsplit
+from sqlalchemy.orm.session import Session
+from tests.client import MDMClient
+from commandment.api.pagination import encode_cursor, decode_cursor
+from commandment.models import Command
+from commandment.mdm import CommandStatus
+
+
+@pytest.fixture()
+def device_count() -> int:
+    return 11
+
+
+@pytest.fixture()
+def device_attributes():
+    # Duplicate and NULL serial numbers
+    return lambda i: {'serial_number': None if i % 4 == 0 else 'C{:02d}'.format(i % 5)}
+
+
+def fetch_all(client: MDMClient, url: str) -> list:
+    """Follow the next links from url, returning the ids of every page."""
+    pages = []
+    while url is not None:
+        response: Response = client.get(url)
+        assert response.status_code == 200, response.data
+        body = json.loads(response.data)
+        pages.append([int(item['id']) for item in body['data']])
+        url = body['links'].get('next')
+        if url is not None:
+            parts = urlsplit(url)
+            url = parts.path + '?' + parts.query
+
+    return pages
+
+
+class TestCursor:
+
+    def test_roundtrip(self, session: Session):
+        now = datetime(2018, 1, 2, 3, 4, 5, 6)
+        assert decode_cursor(encode_cursor(now, 5), Command.sent_at.property.columns[0]) == (now, 5)
+        assert decode_cursor(encode_cursor(CommandStatus.Sent, 5), Command.status.property.columns[0]) == \
+            (CommandStatus.Sent, 5)
+
+
+@pytest.mark.usefixtures('devices')
+class TestKeysetPagination:
+
+    def test_by_id(self, client: MDMClient, devices):
+        pages = fetch_all(client, '/api/v1/devices?page[size]=4&page[after]=')
+        assert [len(page) for page in pages] == [4, 4, 3]
+        assert sum(pages, []) == sorted(d.id for d in devices)
+
+    @pytest.mark.parametrize('sort', ['serial_number', '-serial_number'])
+    def test_by_nullable_column(self, client: MDMClient, devices, sort: str):
+        pages = fetch_all(client, '/api/v1/devices?page[size]=3&page[after]=&sort={}'.format(sort))
+        ids = sum(pages, [])
+
+        descending = sort.startswith('-')
+        key = {d.id: (d.serial_number is None, d.serial_number or '', d.id) for d in devices}
+        assert ids == sorted(key.keys(), key=key.get, reverse=descending)
+
+    def test_no_count(self, client: MDMClient):
+        body = json.loads(client.get('/api/v1/devices?page[size]=4&page[after]=').data)
+        assert 'meta' not in body
+        assert 'last' not in body['links']
+
+    def test_exact_count(self, client: MDMClient):
+        body = json.loads(client.get('/api/v1/devices?page[size]=4&page[after]=&page[totals]=exact').data)
+        assert body['meta'] == {'count': 11, 'approximate': False}
+
+    def test_approximate_count_falls_back(self, client: MDMClient):
+        body = json.loads(client.get('/api/v1/devices?page[size]=4&page[after]=&page[totals]=approximate').data)
+        assert body['meta'] == {'count': 11, 'approximate': False}
+
+    def test_unsupported_sort(self, client: MDMClient):
+        response: Response = client.get('/api/v1/devices?page[after]=&sort=device_name')
+        assert response.status_code == 400
+
+    def test_invalid_cursor(self, client: MDMClient):
+        response: Response = client.get('/api/v1/devices?page[after]=notacursor')
+        assert response.status_code == 400
+
+    def test_offset_pagination_unchanged(self, client: MDMClient):
+        body = json.loads(client.get('/api/v1/devices?page[size]=4&page[number]=2').data)
+        assert body['meta'] == {'count': 11}
+        assert len(body['data']) == 4
+
+    def test_device_commands(self, client: MDMClient, session: Session, devices):
+        device = devices[0]
+        started = datetime(2018, 1, 1)
+        for i in range(5):
+            session.add(Command(uuid='00000000-0000-0000-0000-{:012d}'.format(i), request_type='DeviceInformation',
+                                device=device, sent_at=started + timedelta(minutes=i % 3)))
+        session.commit()
+
+        pages = fetch_all(client, '/api/v1/devices/{}/commands?page[size]=2&page[after]=&sort=-sent_at'.format(device.id))
+        commands = {c.id: c for c in session.query(Command).all()}
+        ids = sum(pages, [])
+        assert ids == sorted(commands.keys(), key=lambda id_: (commands[id_].sent_at, id_), reverse=True)
@@ -0,0 +1,73 @@
+import json
+import pytest
+from typing import List
+from flask import Flask, Response
+from sqlalchemy.orm.session import Session
+from tests.client import MDMClient
+from commandment import querylog
+from commandment.models import Device, Tag
+
+
+@pytest.fixture()
+def query_log(app: Flask):
+    app.config['QUERY_LOG_ENABLED'] = True
+    app.config['QUERY_LOG_REPEAT_THRESHOLD'] = 5
+    querylog.init_app(app)
+    return app
+
+
+@pytest.fixture()
+def device_count() -> int:
+    return 12
+
+
+@pytest.fixture()
+def tagged_devices(session: Session, devices: List[Device]):
+    tag = Tag(name='lab', color='ff0000')
+    for d in devices:
+        d.tags.append(tag)
+    session.commit()
+
+
+class TestStatementShape:
+
+    def test_literals_and_in_lists(self):
+        assert querylog.statement_shape("SELECT a FROM t\n WHERE id IN (?, ?, ?) AND name = 'x' LIMIT 20") == \
+               querylog.statement_shape("SELECT a FROM t WHERE id IN (?) AND name = 'y' LIMIT 50")
+
+    def test_repeated(self):
+        log = querylog.QueryLog()
+        for i in range(3):
+            log.record('SELECT * FROM tags WHERE device_id = ?', 0.001)
+        log.record('SELECT * FROM devices', 0.001)
+
+        assert log.count == 4
+        assert log.repeated(3) == [('SELECT * FROM tags WHERE device_id = ?', 3)]
+
+
+@pytest.mark.usefixtures('tagged_devices')
+class TestQueryLog:
+
+    def test_device_list_headers(self, query_log: Flask, client: MDMClient):
+        with querylog.recording() as log:
+            response: Response = client.get('/api/v1/devices?page[size]=50')
+        assert response.status_code == 200
+        assert int(response.headers['X-Query-Count']) == log.count
+        # Statements of other before_request functions, eg. the schema check, are counted too
+        assert len([s for s in log.statements if 'alembic_version' not in s]) <= 3
+        assert response.headers['X-Query-Repeated'] == '0'
+        assert float(response.headers['X-Query-Time']) >= 0
+
+    def test_device_list_include(self, query_log: Flask, client: MDMClient):
+        response: Response = client.get('/api/v1/devices?page[size]=50&include=tags')
+        assert response.status_code == 200
+        assert response.headers['X-Query-Repeated'] == '0'
+
+        body = json.loads(response.data)
+        assert len(body['data']) == 12
+        assert body['data'][0]['relationships']['tags']['data'] == [{'type': 'tags', 'id': '1'}]
+        assert [included['type'] for included in body['included']] == ['tags']
+
+    def test_disabled(self, app: Flask, client: MDMClient):
+        response: Response = client.get('/api/v1/devices?page[size]=50')
+        assert 'X-Query-Count' not in response.headers
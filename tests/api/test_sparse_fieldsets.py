@@ -0,0 +1,60 @@
+import json
+import pytest
+from flask import Response
+from tests.client import MDMClient
+from commandment import querylog
+
+
+@pytest.fixture()
+def device_attributes():
+    return lambda i: {'device_name': 'device {}'.format(i), 'model_name': 'MacBook Pro'}
+
+
+@pytest.fixture()
+def statements():
+    """The statements executed while the fixture is in use."""
+    with querylog.recording() as log:
+        yield log.statements
+
+
+def device_select(statements: list) -> str:
+    """The statement that selected the page of devices."""
+    return [s for s in statements if s.startswith('SELECT') and 'FROM devices' in s and 'count(' not in s][-1]
+
+
+@pytest.mark.usefixtures('devices')
+class TestSparseFieldsets:
+
+    def test_load_only(self, client: MDMClient, statements: list):
+        response: Response = client.get('/api/v1/devices?page[size]=10&fields[devices]=udid,device_name')
+        assert response.status_code == 200
+
+        body = json.loads(response.data)
+        assert body['data'][0]['attributes'] == {'udid': '00000000-0000-0000-0000-000000000000',
+                                                 'device_name': 'device 0'}
+
+        select = device_select(statements)
+        assert 'devices.udid' in select
+        assert 'devices.device_name' in select
+        assert 'devices.serial_number' not in select
+        assert 'devices.model_name' not in select
+
+    def test_relationship_link_columns(self, client: MDMClient, statements: list):
+        response: Response = client.get('/api/v1/devices?page[size]=10&fields[devices]=udid,dep_profile')
+        assert response.status_code == 200
+        assert 'devices.dep_profile_id' in device_select(statements)
+
+    def test_keyset_sort_column(self, client: MDMClient, statements: list):
+        response: Response = client.get('/api/v1/devices?page[size]=2&page[after]=&sort=serial_number'
+                                        '&fields[devices]=udid')
+        assert response.status_code == 200
+
+        body = json.loads(response.data)
+        assert 'next' in body['links']
+        assert 'devices.serial_number' in device_select(statements)
+        assert not any('FROM devices' in s and 'devices.id = ?' in s for s in statements), \
+            'The sort value of the last row should not be loaded separately'
+
+    def test_all_columns_without_fieldset(self, client: MDMClient, statements: list):
+        client.get('/api/v1/devices?page[size]=10')
+        assert 'devices.serial_number' in device_select(statements)
@@ -0,0 +1,71 @@
+import pytest
+import datetime
+from flask import Flask
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import Encoding, pkcs7
+from cryptography.hazmat.backends import default_backend
+from commandment.cms.cache import SignerCertificateCache, signer_certificate_cache
+from commandment.cms.decorators import _verify_cms_signers
+
+BODY = b'<?xml version="1.0" encoding="UTF-8"?><plist version="1.0"><dict/></plist>'
+
+
+def _identity(common_name: str, days: int = 1):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=1024, backend=default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()
+    ).serial_number(1).not_valid_before(
+        datetime.datetime.utcnow() - datetime.timedelta(days=2)
+    ).not_valid_after(
+        datetime.datetime.utcnow() + datetime.timedelta(days=days)
+    ).sign(key, hashes.SHA256(), default_backend())
+
+    return key, cert
+
+
+def _mdm_signature(key: rsa.RSAPrivateKey, cert: x509.Certificate, body: bytes) -> bytes:
+    return pkcs7.PKCS7SignatureBuilder().set_data(body).add_signer(cert, key, hashes.SHA256()).sign(
+        Encoding.DER, [pkcs7.PKCS7Options.DetachedSignature, pkcs7.PKCS7Options.Binary])
+
+
+class TestSignerCertificateCache:
+
+    def test_lru(self):
+        certs = [_identity('device-{}'.format(i))[1] for i in range(3)]
+        cache = SignerCertificateCache(maxsize=2)
+
+        for cert in certs:
+            assert cache.get(cert.public_bytes(Encoding.DER)).certificate == cert
+
+        assert len(cache) == 2
+        assert cache.misses == 3
+        cache.get(certs[2].public_bytes(Encoding.DER))
+        assert cache.hits == 1
+        cache.get(certs[0].public_bytes(Encoding.DER))
+        assert cache.misses == 4
+
+    def test_validity_period(self):
+        key, cert = _identity('expired', days=-1)
+        assert SignerCertificateCache().get(cert.public_bytes(Encoding.DER)).valid is False
+
+    def test_verify_detached(self, app: Flask):
+        key, cert = _identity('device')
+        signature = _mdm_signature(key, cert, BODY)
+        signer_certificate_cache.clear()
+
+        for _ in range(2):
+            with app.test_request_context(data=BODY):
+                signers, signed_data = _verify_cms_signers(signature, detached=True)
+                assert signers == [cert]
+                assert signed_data.read() == BODY
+
+        assert signer_certificate_cache.hits == 1
+
+        with app.test_request_context(data=BODY + b' '):
+            with pytest.raises(InvalidSignature):
+                _verify_cms_signers(signature, detached=True)
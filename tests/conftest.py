@@ -1,9 +1,9 @@
 import pytest
 import os
 from flask import Flask
-from typing import Generator
+from typing import Any, Callable, Dict, Generator, List
 from commandment import create_app
-from commandment.models import db as _db
+from commandment.models import db as _db, Device
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import scoped_session
 import sqlalchemy
@@ -66,12 +66,16 @@ def session(db: SQLAlchemy) -> Generator[scoped_session, None, None]:
     options = dict(bind=connection)
     session = db.create_scoped_session(options=options)
 
+    # Resources keep the session that was current when they were imported, which must not outlive this test either
+    original_session = db.session
     db.session = session
 
     yield session
 
     # transaction.rollback()
     session.remove()
+    original_session.remove()
+    db.session = original_session
 
 
 @pytest.fixture(scope='function')
@@ -81,3 +85,33 @@ def client(app: Flask) -> MDMClient:
     test_client = app.test_client()
     return test_client
 
+
+
+@pytest.fixture(scope='function')
+def device_count() -> int:
+    """The number of devices created by the ``devices`` fixture. Override it to create more."""
+    return 3
+
+
+@pytest.fixture(scope='function')
+def device_attributes() -> Callable[[int], Dict[str, Any]]:
+    """Override to return the attributes of the i-th device created by the ``devices`` fixture, which replace the
+    default UDID and serial number."""
+    return lambda i: {}
+
+
+@pytest.fixture(scope='function')
+def devices(session: scoped_session, device_count: int,
+            device_attributes: Callable[[int], Dict[str, Any]]) -> List[Device]:
+    """Create ``device_count`` devices, with UDIDs 00000000-0000-0000-0000-000000000000 and up, and serial numbers
+    C0000 and up."""
+    created = []
+    for i in range(device_count):
+        attributes = dict(udid='00000000-0000-0000-0000-{:012d}'.format(i), serial_number='C{:04d}'.format(i))
+        attributes.update(device_attributes(i))
+        device = Device(**attributes)
+        session.add(device)
+        created.append(device)
+
+    session.commit()
+    return created
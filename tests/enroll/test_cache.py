@@ -0,0 +1,200 @@
+import pytest
+import datetime
+import json
+import os
+import plistlib
+from typing import Generator
+from flask import Flask
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.backends import default_backend
+from commandment.enroll import cache
+from commandment.enroll.cache import EnrollProfileCache, response_cache
+from commandment.models import Device, Organization, SCEPConfig
+from commandment.profiles.models import PKCS12CertificatePayload
+
+
+def _self_signed_pem(name: x509.Name) -> bytes:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=1024, backend=default_backend())
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()
+    ).serial_number(1).not_valid_before(
+        datetime.datetime.utcnow()
+    ).not_valid_after(
+        datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    ).sign(key, hashes.SHA256(), default_backend())
+
+    return cert.public_bytes(serialization.Encoding.PEM)
+
+
+@pytest.yield_fixture
+def push_certificate(app: Flask, tmpdir) -> Generator[str, None, None]:
+    pem_data = _self_signed_pem(x509.Name([
+        x509.NameAttribute(NameOID.USER_ID, u'com.apple.mgmt.External.00000000-0000-0000-0000-000000000000'),
+        x509.NameAttribute(NameOID.COMMON_NAME, u'APSP:00000000-0000-0000-0000-000000000000'),
+    ]))
+
+    path = str(tmpdir.join('push.pem'))
+    with open(path, 'wb') as fd:
+        fd.write(pem_data)
+
+    # Restored afterwards so that the startup thread does not find the push certificate and run migrations.
+    saved = {k: app.config.pop(k) for k in ('PUSH_CERTIFICATE', 'CA_CERTIFICATE', 'SSL_CERTIFICATE')}
+    app.config['PUSH_CERTIFICATE'] = path
+    yield path
+    app.config.update(saved)
+
+
+@pytest.fixture
+def configured(session, push_certificate: str):
+    session.add(Organization(name='Commandment', payload_prefix='com.example'))
+    session.add(SCEPConfig(url='https://localhost/scep', subject='CN=%HardwareUUID%', challenge='sekret'))
+    session.commit()
+
+
+def _identity() -> PKCS12CertificatePayload:
+    return PKCS12CertificatePayload(
+        type='com.apple.security.pkcs12',
+        identifier='com.example.identity',
+        display_name='Device Identity Certificate',
+        password='sekret',
+        payload_content=b'PKCS12',
+        version=1,
+    )
+
+
+@pytest.fixture
+def builds(monkeypatch) -> list:
+    calls = []
+    build_template = cache._build_template
+
+    def counting_build_template(with_identity: bool):
+        calls.append(with_identity)
+        return build_template(with_identity)
+
+    monkeypatch.setattr(cache, '_build_template', counting_build_template)
+    return calls
+
+
+@pytest.mark.usefixtures('configured')
+class TestEnrollProfileCache:
+
+    def test_render_identity(self, builds: list):
+        profile_cache = EnrollProfileCache()
+        first = plistlib.loads(profile_cache.render(_identity()))
+        second = plistlib.loads(profile_cache.render(_identity()))
+        assert builds == [True]
+        assert first == second
+
+        identity, mdm = first['PayloadContent']
+        assert identity['PayloadType'] == 'com.apple.security.pkcs12'
+        assert identity['PayloadContent'] == b'PKCS12'
+        assert mdm['IdentityCertificateUUID'] == identity['PayloadUUID']
+        assert mdm['Topic'] == 'com.apple.mgmt.External.00000000-0000-0000-0000-000000000000'
+
+    def test_render_scep(self, builds: list):
+        profile_cache = EnrollProfileCache()
+        data = profile_cache.render()
+        assert profile_cache.render() is data
+        assert builds == [False]
+
+        scep, mdm = plistlib.loads(data)['PayloadContent']
+        assert scep['PayloadContent']['Challenge'] == 'sekret'
+        assert mdm['IdentityCertificateUUID'] == scep['PayloadUUID']
+
+    def test_invalidated_by_organization(self, session, builds: list):
+        profile_cache = cache.enroll_profile_cache
+        profile_cache.invalidate()
+        profile_cache.render()
+
+        org = session.query(Organization).one()
+        org.name = 'Renamed'
+        session.commit()
+
+        assert plistlib.loads(profile_cache.render())['PayloadOrganization'] == 'Renamed'
+        assert builds == [False, False]
+
+    def test_invalidated_by_scep_config_bulk_update(self, session, builds: list):
+        profile_cache = cache.enroll_profile_cache
+        profile_cache.invalidate()
+        profile_cache.render()
+
+        session.query(SCEPConfig).update({'challenge': 'changed'})
+        session.commit()
+
+        scep, mdm = plistlib.loads(profile_cache.render())['PayloadContent']
+        assert scep['PayloadContent']['Challenge'] == 'changed'
+        assert builds == [False, False]
+
+    def test_not_invalidated_by_other_models(self, session, builds: list):
+        profile_cache = cache.enroll_profile_cache
+        profile_cache.invalidate()
+        data = profile_cache.render()
+
+        session.add(Device(udid='00000000-0000-0000-0000-000000000001', serial_number='C0001'))
+        session.commit()
+
+        assert profile_cache.render() is data
+        assert builds == [False]
+
+
+@pytest.fixture
+def ca_certificate(app: Flask, push_certificate: str, tmpdir) -> str:
+    path = str(tmpdir.join('ca.crt'))
+    with open(path, 'wb') as fd:
+        fd.write(_self_signed_pem(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'CA-CERTIFICATE')])))
+
+    app.config['CA_CERTIFICATE'] = path
+    response_cache.invalidate()
+    return path
+
+
+@pytest.mark.usefixtures('configured')
+class TestResponseCache:
+
+    def test_anchor_certs_conditional_get(self, client, ca_certificate: str):
+        response = client.get('/dep/anchor_certs')
+        assert response.status_code == 200
+        assert len(json.loads(response.data)) == 1
+        assert response.headers['Cache-Control'] == 'public, max-age=300'
+        etag = response.headers['ETag']
+
+        response = client.get('/dep/anchor_certs', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+    def test_anchor_certs_refreshed_when_file_changes(self, client, ca_certificate: str):
+        etag = client.get('/dep/anchor_certs').headers['ETag']
+
+        with open(ca_certificate, 'wb') as fd:
+            fd.write(_self_signed_pem(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'NEW-CA-CERTIFICATE')])))
+        st = os.stat(ca_certificate)
+        os.utime(ca_certificate, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+        response = client.get('/dep/anchor_certs', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_trust_profile_refreshed_when_organization_changes(self, client, session, ca_certificate: str):
+        response = client.get('/enroll/trust.mobileconfig')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert client.get('/enroll/trust.mobileconfig', headers={'If-None-Match': etag}).status_code == 304
+
+        org = session.query(Organization).one()
+        org.name = 'Renamed'
+        session.commit()
+
+        response = client.get('/enroll/trust.mobileconfig', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert plistlib.loads(response.data)['PayloadOrganization'] == 'Renamed'
+
+    def test_trust_profile_etag_stable_when_rebuilt(self, client, ca_certificate: str):
+        first = client.get('/enroll/trust.mobileconfig')
+        response_cache.invalidate()
+        second = client.get('/enroll/trust.mobileconfig', headers={'If-None-Match': first.headers['ETag']})
+
+        assert second.status_code == 304
+        assert second.headers['ETag'] == first.headers['ETag']
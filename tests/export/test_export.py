@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import pytest
+from typing import List
+from flask import Response
+from sqlalchemy.orm.session import Session
+from tests.client import MDMClient
+from commandment.export import csv_chunks, ndjson_chunks
+from commandment.inventory.models import InstalledApplication
+from commandment.models import Device
+
+
+@pytest.fixture()
+def device_attributes():
+    return lambda i: {'device_name': 'device, "{}"'.format(i)}
+
+
+@pytest.fixture()
+def applications(session: Session, devices: List[Device]):
+    for d in devices:
+        session.add(InstalledApplication(device=d, device_udid=d.udid, bundle_identifier='com.example.app',
+                                         name='Example', version='1.0'))
+    session.commit()
+
+
+class TestChunks:
+
+    def test_ndjson_chunks(self, monkeypatch):
+        monkeypatch.setattr('commandment.export.CHUNK_SIZE', 20)
+        chunks = list(ndjson_chunks(['id', 'name'], [(i, 'name {}'.format(i)) for i in range(5)]))
+        assert len(chunks) > 1
+        assert [json.loads(line) for line in ''.join(chunks).splitlines()][4] == {'id': 4, 'name': 'name 4'}
+
+    def test_csv_chunks(self, monkeypatch):
+        monkeypatch.setattr('commandment.export.CHUNK_SIZE', 20)
+        chunks = list(csv_chunks(['id', 'name'], [(i, 'name, {}'.format(i)) for i in range(5)]))
+        assert len(chunks) > 1
+        assert list(csv.reader(io.StringIO(''.join(chunks))))[:2] == [['id', 'name'], ['0', 'name, 0']]
+
+
+@pytest.mark.usefixtures('applications')
+class TestExport:
+
+    def test_devices_ndjson(self, client: MDMClient):
+        response: Response = client.get('/api/v1/export/devices')
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.content_type == 'application/x-ndjson'
+
+        rows = [json.loads(line) for line in response.data.decode('utf8').splitlines()]
+        assert len(rows) == 3
+        assert rows[0]['udid'] == '00000000-0000-0000-0000-000000000000'
+        assert rows[0]['serial_number'] == 'C0000'
+        assert 'commands' not in rows[0]
+        assert 'push_magic' not in rows[0]
+
+    def test_devices_csv_fields(self, client: MDMClient):
+        response: Response = client.get('/api/v1/export/devices?format=csv&fields=udid,device_name')
+        assert response.status_code == 200
+        assert response.headers['Content-Disposition'] == 'attachment; filename=devices.csv'
+
+        rows = list(csv.reader(io.StringIO(response.data.decode('utf8'))))
+        assert rows[0] == ['udid', 'device_name']
+        assert rows[2] == ['00000000-0000-0000-0000-000000000001', 'device, "1"']
+
+    def test_installed_applications(self, client: MDMClient):
+        response: Response = client.get('/api/v1/export/installed_applications')
+        rows = [json.loads(line) for line in response.data.decode('utf8').splitlines()]
+        assert len(rows) == 3
+        assert rows[0]['device_udid'] == '00000000-0000-0000-0000-000000000000'
+        assert rows[0]['bundle_identifier'] == 'com.example.app'
+
+    def test_invalid(self, client: MDMClient):
+        assert client.get('/api/v1/export/devices?format=xml').status_code == 400
+        assert client.get('/api/v1/export/devices?fields=udid,nope').status_code == 400
+
+    def test_unknown_resource(self, client: MDMClient):
+        response: Response = client.get('/api/v1/export/nonexistent')
+        assert response.status_code == 404
+        assert response.content_type == 'application/json'
+        assert json.loads(response.data)['message'] == 'Cannot export nonexistent'
@@ -0,0 +1,92 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from commandment.jobs import JobRunStatus
+from commandment.jobs.models import JobLease, JobRun
+from commandment.jobs.scheduler import Scheduler, register_jobs
+
+
+@pytest.fixture()
+def calls() -> list:
+    return []
+
+
+@pytest.fixture()
+def scheduler(calls: list) -> Scheduler:
+    s = Scheduler()
+    s.add_job('test', calls.append, interval=60)
+    return s
+
+
+class TestScheduler:
+
+    def test_run_pending(self, app: Flask, session, scheduler: Scheduler, calls: list):
+        assert scheduler.run_pending(app) == ['test']
+        assert calls == [app]
+
+        lease = session.query(JobLease).filter(JobLease.name == 'test').one()
+        assert lease.holder is None
+        assert lease.expires_at is None
+        assert lease.next_run_at > datetime.utcnow() + timedelta(seconds=50)
+
+    def test_not_run_before_next_run_at(self, app: Flask, session, scheduler: Scheduler, calls: list):
+        other = Scheduler()
+        other.add_job('test', calls.append, interval=60)
+
+        assert scheduler.run_pending(app) == ['test']
+        assert other.run_pending(app) == []
+        assert len(calls) == 1
+
+    def test_not_run_while_leased(self, app: Flask, session, scheduler: Scheduler, calls: list):
+        session.add(JobLease(name='test', holder='other', expires_at=datetime.utcnow() + timedelta(seconds=60)))
+        session.commit()
+
+        assert scheduler.run_pending(app) == []
+        assert calls == []
+
+    def test_expired_lease_is_taken(self, app: Flask, session, scheduler: Scheduler, calls: list):
+        session.add(JobLease(name='test', holder='other', expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        session.commit()
+
+        assert scheduler.run_pending(app) == ['test']
+        assert calls == [app]
+
+    def test_run_history(self, app: Flask, session, scheduler: Scheduler):
+        scheduler.run_pending(app)
+
+        run = session.query(JobRun).one()
+        assert run.name == 'test'
+        assert run.holder == scheduler.holder
+        assert run.status == JobRunStatus.Succeeded
+        assert run.finished_at is not None
+
+    def test_failed_run_is_recorded(self, app: Flask, session):
+        def fail(app: Flask):
+            raise RuntimeError('sync failed')
+
+        scheduler = Scheduler()
+        scheduler.add_job('test', fail, interval=60)
+        assert scheduler.run_pending(app) == ['test']
+
+        run = session.query(JobRun).one()
+        assert run.status == JobRunStatus.Failed
+        assert 'sync failed' in run.error
+        assert session.query(JobLease).one().holder is None
+
+    def test_once_job_runs_once(self, app: Flask, session, calls: list):
+        scheduler = Scheduler()
+        scheduler.add_job('once', calls.append)
+        other = Scheduler()
+        other.add_job('once', calls.append)
+
+        assert scheduler.run_pending(app) == ['once']
+        assert scheduler.run_pending(app) == []
+        # Another process runs it too, as it has not yet run in that process
+        assert other.run_pending(app) == ['once']
+        assert len(calls) == 2
+
+    def test_register_jobs_disabled(self, app: Flask):
+        scheduler = Scheduler()
+        register_jobs(app, scheduler)
+        assert 'apns_push' not in scheduler.jobs
+        assert scheduler.jobs['dep_sync'].interval == 90
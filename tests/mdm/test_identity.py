@@ -0,0 +1,149 @@
+import pytest
+import datetime
+import os
+from flask import Flask, g
+from werkzeug.exceptions import Forbidden
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.backends import default_backend
+from commandment.models import Device, ChangeCounter
+from commandment.pki.models import DeviceIdentityCertificate
+from commandment.mdm.identity import resolve_device, device_identity_cache, certificate_fingerprint, \
+    resolve_device_state, device_state_cache, DEVICE_CHANGE_COUNTER
+from commandment.signals import device_unenrolled
+
+UDID = '00000000-1111-2222-3333-444455556666'
+
+
+def _identity_certificate(common_name: str) -> x509.Certificate:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=1024, backend=default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    return x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()
+    ).serial_number(int.from_bytes(os.urandom(7), "big")).not_valid_before(
+        datetime.datetime.utcnow()
+    ).not_valid_after(
+        datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    ).sign(key, hashes.SHA256(), default_backend())
+
+
+@pytest.fixture
+def bound_certificate(session) -> x509.Certificate:
+    certificate = _identity_certificate('device-identity')
+    device = Device(udid=UDID, certificate=DeviceIdentityCertificate.from_crypto(certificate))
+    session.add(device)
+    session.commit()
+    device_identity_cache.clear()
+    return certificate
+
+
+class TestResolveDevice:
+
+    def test_by_certificate(self, app: Flask, bound_certificate: x509.Certificate):
+        g.signers = [bound_certificate]
+        device = resolve_device(UDID)
+        assert device.udid == UDID
+        assert device_identity_cache.get(certificate_fingerprint(bound_certificate)).device_id == device.id
+
+    def test_mismatched_udid(self, app: Flask, session, bound_certificate: x509.Certificate):
+        session.add(Device(udid='FFFFFFFF-1111-2222-3333-444455556666'))
+        session.commit()
+
+        g.signers = [bound_certificate]
+        with pytest.raises(Forbidden):
+            resolve_device('FFFFFFFF-1111-2222-3333-444455556666')
+
+    def test_unbound_certificate_falls_back_to_udid(self, app: Flask, bound_certificate: x509.Certificate):
+        g.signers = [_identity_certificate('renewed-identity')]
+        assert resolve_device(UDID).udid == UDID
+        assert resolve_device('FFFFFFFF-1111-2222-3333-444455556666') is None
+
+    def test_deleted_device(self, app: Flask, session, bound_certificate: x509.Certificate):
+        g.signers = [bound_certificate]
+        resolve_device(UDID)
+        session.query(Device).filter(Device.udid == UDID).delete()
+        session.commit()
+
+        assert resolve_device(UDID) is None
+        assert len(device_identity_cache) == 0
+
+
+IDLE_REQUEST = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+    <key>Status</key>
+    <string>Idle</string>
+    <key>UDID</key>
+    <string>{}</string>
+</dict>
+</plist>
+""".format(UDID)
+
+
+@pytest.fixture
+def device(session) -> Device:
+    d = Device(udid=UDID, is_enrolled=True, topic='com.apple.mgmt.test')
+    session.add(d)
+    session.commit()
+    device_state_cache.clear()
+    return d
+
+
+class TestDeviceStateCache:
+
+    def test_cached(self, app: Flask, session, device: Device):
+        state = resolve_device_state(UDID)
+        assert state.id == device.id
+        assert state.topic == 'com.apple.mgmt.test'
+
+        session.query(Device).filter(Device.id == device.id).update({'topic': 'changed'})
+        assert resolve_device_state(UDID) is state
+        assert resolve_device_state('FFFFFFFF-1111-2222-3333-444455556666') is None
+
+    def test_invalidated_by_signal(self, app: Flask, session, device: Device):
+        resolve_device_state(UDID)
+        device_unenrolled.send(device)
+        session.commit()
+
+        assert len(device_state_cache) == 0
+        assert ChangeCounter.current(DEVICE_CHANGE_COUNTER) == 1
+
+    def test_invalidated_by_change_counter(self, app: Flask, session, device: Device):
+        app.config['DEVICE_CACHE_SYNC_INTERVAL'] = 0
+        state = resolve_device_state(UDID)
+        assert resolve_device_state(UDID) is state
+
+        # Another process changes a device
+        ChangeCounter.increment(DEVICE_CHANGE_COUNTER)
+        session.commit()
+
+        assert resolve_device_state(UDID) is not state
+
+    def test_idle_checkin(self, client, session, device: Device):
+        response = client.put('/mdm', data=IDLE_REQUEST, content_type='text/xml')
+        assert response.status_code == 200
+        assert len(device_state_cache) == 1
+
+        session.query(Device).filter(Device.id == device.id).delete()
+        session.commit()
+
+        response = client.put('/mdm', data=IDLE_REQUEST, content_type='text/xml')
+        assert response.status_code == 410
+        assert len(device_state_cache) == 0
+
+    def test_checkin_after_reenrollment_elsewhere(self, app: Flask, client, session, device: Device):
+        app.config['DEVICE_CACHE_SYNC_INTERVAL'] = 3600
+        assert client.put('/mdm', data=IDLE_REQUEST, content_type='text/xml').status_code == 200
+
+        # Another process re-enrolls the device, and this process has not read the ChangeCounter yet
+        session.query(Device).filter(Device.id == device.id).delete()
+        reenrolled = Device(id=device.id + 1, udid=UDID, is_enrolled=True, topic='com.apple.mgmt.test')
+        session.add(reenrolled)
+        session.commit()
+
+        response = client.put('/mdm', data=IDLE_REQUEST, content_type='text/xml')
+        assert response.status_code == 200
+        assert resolve_device_state(UDID).id == reenrolled.id
@@ -0,0 +1,104 @@
+import pytest
+import os
+from datetime import datetime, timedelta
+from flask import Flask, Response
+from tests.client import MDMClient
+from commandment.mdm import CommandStatus
+from commandment.mdm.ingest import enqueue_response, claim_batch, process_batch
+from commandment.models import Command, Device, QueuedResponse
+from commandment.inventory.models import InstalledApplication
+
+TEST_DIR = os.path.realpath(os.path.dirname(__file__))
+TEST_DATA_DIR = os.path.realpath(TEST_DIR + '/../../testdata')
+
+
+@pytest.fixture()
+def installed_application_list_response() -> bytes:
+    with open(os.path.join(TEST_DATA_DIR, 'InstalledApplicationList/10.11.x.xml'), 'rb') as fd:
+        return fd.read()
+
+
+@pytest.fixture()
+def deferred(app: Flask):
+    app.config['MDM_DEFERRED_RESPONSE_TYPES'] = ['InstalledApplicationList']
+    yield
+    app.config['MDM_DEFERRED_RESPONSE_TYPES'] = []
+
+
+@pytest.fixture(scope='function')
+def command(session) -> Command:
+    c = Command(
+        uuid='00000000-1111-2222-3333-444455556666',
+        request_type='InstalledApplicationList',
+        status=CommandStatus.Sent.value,
+        parameters={},
+    )
+    session.add(c)
+    session.commit()
+    return c
+
+
+def _device(session) -> Device:
+    return session.query(Device).filter(Device.udid == '00000000-1111-2222-3333-444455556666').one()
+
+
+@pytest.mark.usefixtures('device', 'deferred')
+class TestResponseQueue:
+
+    def test_mdm_queues_response(self, client: MDMClient, session, command: Command,
+                                 installed_application_list_response: bytes):
+        response: Response = client.put('/mdm', data=installed_application_list_response, content_type='text/xml')
+        assert response.status_code == 200
+
+        queued = session.query(QueuedResponse).one()
+        assert queued.request_type == 'InstalledApplicationList'
+        assert queued.body == installed_application_list_response
+        assert len(_device(session).installed_applications) == 0
+
+    def test_process_batch(self, session, command: Command, installed_application_list_response: bytes):
+        device = _device(session)
+        enqueue_response(command, device.id, installed_application_list_response)
+
+        assert process_batch('test') == 1
+        assert session.query(QueuedResponse).count() == 0
+        assert session.query(InstalledApplication).filter(InstalledApplication.device_id == device.id).count() > 0
+
+    def test_unclaimed_responses_coalesced(self, session, command: Command,
+                                           installed_application_list_response: bytes):
+        device = _device(session)
+        enqueue_response(command, device.id, b'<plist version="1.0"><dict/></plist>')
+        latest = enqueue_response(command, device.id, installed_application_list_response)
+
+        assert [q.id for q in session.query(QueuedResponse)] == [latest.id]
+
+    def test_claimed_responses_are_not_reclaimed(self, session, command: Command,
+                                                 installed_application_list_response: bytes):
+        device = _device(session)
+        enqueue_response(command, device.id, installed_application_list_response)
+        assert len(claim_batch('first', 10, 300)) == 1
+
+        # A newer response for the same device is held back until the claimed one has been processed.
+        enqueue_response(command, device.id, installed_application_list_response)
+        assert claim_batch('second', 10, 300) == []
+
+    def test_abandoned_claim_is_reclaimed(self, session, command: Command,
+                                          installed_application_list_response: bytes):
+        device = _device(session)
+        queued = enqueue_response(command, device.id, installed_application_list_response)
+        claim_batch('first', 10, 300)
+
+        session.query(QueuedResponse).filter(QueuedResponse.id == queued.id).update({
+            QueuedResponse.claimed_at: datetime.utcnow() - timedelta(seconds=600)}, synchronize_session=False)
+        session.commit()
+
+        assert [q.id for q in claim_batch('second', 10, 300)] == [queued.id]
+
+    def test_failed_response_retried_then_discarded(self, session, command: Command):
+        device = _device(session)
+        enqueue_response(command, device.id, b'not a plist')
+
+        assert process_batch('test', max_attempts=2) == 1
+        assert session.query(QueuedResponse).one().attempts == 1
+
+        assert process_batch('test', max_attempts=2) == 1
+        assert session.query(QueuedResponse).count() == 0
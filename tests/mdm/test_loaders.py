@@ -0,0 +1,113 @@
+import pytest
+import os
+import plistlib
+from marshmallow import Schema, fields
+from commandment.inventory import models as inventory_models
+from commandment.mdm import response_schema
+from commandment.plistutil import streaming
+from commandment.mdm.loaders import compile_loader, load_device_information, load_installed_application_list, \
+    load_profile_list, load_available_os_updates
+
+TEST_DIR = os.path.realpath(os.path.dirname(__file__))
+TEST_DATA_DIR = os.path.realpath(TEST_DIR + '/../../testdata')
+
+
+def _testdata(name: str) -> list:
+    directory = os.path.join(TEST_DATA_DIR, name)
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.xml'))
+
+
+def _read(path: str) -> dict:
+    with open(path, 'rb') as fd:
+        return plistlib.load(fd)
+
+
+def _flattened(data: dict) -> dict:
+    """marshmallow does not run post_load for a schema with errors, so OSUpdateSettings is only flattened if valid.
+
+    The compiled loader always flattens it.
+    """
+    query_responses = data['QueryResponses']
+    query_responses.update(query_responses.pop('os_update_settings', None) or {})
+    return data
+
+
+@pytest.fixture()
+def column_dicts(monkeypatch):
+    """Make the post_load processors of the response schemas return dicts instead of model instances."""
+    for name in ('InstalledApplication', 'InstalledProfile', 'InstalledPayload', 'AvailableOSUpdate'):
+        monkeypatch.setattr(inventory_models, name, dict)
+
+
+@pytest.mark.usefixtures('column_dicts')
+class TestEquivalence:
+
+    @pytest.mark.parametrize('path', _testdata('DeviceInformation'))
+    def test_device_information(self, path: str):
+        data = _read(path)
+        expected = _flattened(response_schema.DeviceInformationResponse().load(data).data)
+        assert load_device_information(data) == expected
+
+    @pytest.mark.parametrize('path', _testdata('InstalledApplicationList'))
+    def test_installed_application_list(self, path: str):
+        data = _read(path)
+        expected = response_schema.InstalledApplicationListResponse().load(data).data
+        assert load_installed_application_list(data) == expected
+
+    @pytest.mark.parametrize('path', _testdata('InstalledApplicationList'))
+    def test_streamed_installed_application_list(self, path: str):
+        with open(path, 'rb') as fd:
+            data = streaming.load(fd, stream_arrays=['InstalledApplicationList'])
+            result = load_installed_application_list(data)
+            applications = list(result.pop('InstalledApplicationList'))
+
+        expected = response_schema.InstalledApplicationListResponse().load(_read(path)).data
+        assert applications == expected.pop('InstalledApplicationList')
+        assert result == expected
+
+    @pytest.mark.parametrize('path', _testdata('ProfileList'))
+    def test_profile_list(self, path: str):
+        data = _read(path)
+        assert load_profile_list(data) == response_schema.ProfileListResponse().load(data).data
+
+    @pytest.mark.parametrize('path', _testdata('AvailableOSUpdates'))
+    def test_available_os_updates(self, path: str):
+        data = _read(path)
+        assert load_available_os_updates(data) == response_schema.AvailableOSUpdateListResponse().load(data).data
+
+    @pytest.mark.parametrize('item', [
+        {'Identifier': b'com.example.bytes', 'BundleSize': '1024', 'DynamicSize': 12.7},
+        {'Identifier': 'com.example.invalid', 'IsValidated': 'maybe', 'BundleSize': 'large', 'Name': 1},
+        {'Identifier': None, 'BetaApp': 'true', 'Installing': 0, 'HasUpdateAvailable': None},
+        {'Unknown': 'ignored'},
+    ])
+    def test_installed_application_edge_cases(self, item: dict):
+        data = {'Status': 'Acknowledged', 'InstalledApplicationList': [item]}
+        expected = response_schema.InstalledApplicationListResponse().load(data).data
+        assert load_installed_application_list(data) == expected
+
+    def test_os_update_settings_flattened(self):
+        data = {'QueryResponses': {'OSUpdateSettings': {'CatalogURL': 'https://localhost', 'IsDefaultCatalog': True}}}
+        result = load_device_information(data)
+        assert result == response_schema.DeviceInformationResponse().load(data).data
+        assert result['QueryResponses'] == {'osu_catalog_url': 'https://localhost', 'osu_is_default_catalog': True}
+
+
+class TestCompileLoader:
+
+    def test_cached(self):
+        assert compile_loader(response_schema.ProfileListResponse) is load_profile_list
+
+    def test_allow_none_and_defaults(self):
+        class ExampleSchema(Schema):
+            Name = fields.String(attribute='name', allow_none=True)
+            Count = fields.Integer(attribute='count', missing=0)
+            Label = fields.String(load_from='label')
+
+        loader = compile_loader(ExampleSchema)
+        data = {'Name': None, 'label': 'x'}
+        assert loader(data) == ExampleSchema().load(data).data == {'name': None, 'count': 0, 'Label': 'x'}
+
+    def test_nested_items_not_dicts_dropped(self):
+        data = {'InstalledApplicationList': [{'Name': 'Safari'}, 'Safari']}
+        assert load_installed_application_list(data) == {'InstalledApplicationList': [{'name': 'Safari'}]}
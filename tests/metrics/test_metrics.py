@@ -0,0 +1,77 @@
+import os
+import pytest
+from flask import Response
+from tests.client import MDMClient
+from commandment.metrics import Counter, Gauge, Histogram, Registry, checkin_messages, request_queries
+
+TEST_DIR = os.path.realpath(os.path.dirname(__file__))
+TEST_DATA_DIR = os.path.realpath(TEST_DIR + '/../../testdata')
+
+
+@pytest.fixture()
+def authenticate_request() -> bytes:
+    with open(os.path.join(TEST_DATA_DIR, 'Authenticate/10.11.x.xml'), 'rb') as fd:
+        return fd.read()
+
+
+class TestRegistry:
+
+    def test_counter(self):
+        registry = Registry()
+        counter = registry.register(Counter('test_total', 'Test counter.', ['kind']))
+        counter.inc('a')
+        counter.inc('a', amount=2)
+        counter.inc('b')
+
+        assert registry.expose() == '\n'.join([
+            '# HELP test_total Test counter.',
+            '# TYPE test_total counter',
+            'test_total{kind="a"} 3',
+            'test_total{kind="b"} 1',
+        ]) + '\n'
+
+    def test_histogram(self):
+        histogram = Histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        assert list(histogram.samples()) == [
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            'test_seconds_sum 5.55',
+            'test_seconds_count 3',
+        ]
+
+    def test_gauge_collected(self):
+        registry = Registry()
+        gauge = registry.register(Gauge('test_depth', 'Test gauge.', ['status']))
+        registry.on_collect(lambda: gauge.replace({('Queued',): 4}))
+
+        assert 'test_depth{status="Queued"} 4' in registry.expose()
+
+    def test_label_escaping(self):
+        counter = Counter('test_total', 'Test counter.', ['kind'])
+        counter.inc('a "quoted"\nvalue')
+        assert list(counter.samples()) == ['test_total{kind="a \\"quoted\\"\\nvalue"} 1']
+
+
+class TestMetricsEndpoint:
+
+    def test_metrics(self, client: MDMClient, session):
+        response: Response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+
+        text = response.data.decode('utf8')
+        assert '# TYPE commandment_checkin_messages_total counter' in text
+        assert '# TYPE commandment_command_handler_seconds histogram' in text
+
+    def test_checkin_counted(self, client: MDMClient, session, authenticate_request: bytes):
+        before = checkin_messages.value('Authenticate')
+        queries_before = request_queries.count('mdm_app.view')
+        client.put('/checkin', data=authenticate_request, content_type='text/xml')
+
+        assert checkin_messages.value('Authenticate') == before + 1
+        assert request_queries.count('mdm_app.view') == queries_before + 1
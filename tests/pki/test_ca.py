@@ -0,0 +1,30 @@
+from cryptography import x509
+from commandment.pki.models import CertificateAuthority
+
+
+class TestCertificateAuthority:
+
+    def test_sign(self, session, csr: x509.CertificateSigningRequest):
+        ca = CertificateAuthority.create(key_size=1024)
+        cert = ca.sign(csr)
+        assert cert.subject == csr.subject
+        assert cert.serial_number == 1
+        assert ca.serial == 1
+
+    def test_sign_many_allocates_sequential_serials(self, session, csr: x509.CertificateSigningRequest):
+        ca = CertificateAuthority.create(key_size=1024)
+        ca.sign(csr)
+        certs = ca.sign_many([csr, csr, csr])
+        assert [c.serial_number for c in certs] == [2, 3, 4]
+        assert ca.sign_many([]) == []
+
+    def test_allocate_serials_sees_other_writers(self, session):
+        ca = CertificateAuthority.create(key_size=1024)
+        assert ca.allocate_serials(10) == 1
+        session.execute(CertificateAuthority.__table__.update().values(serial=100))
+        assert ca.allocate_serials() == 101
+        assert ca.serial == 101
+
+    def test_signing_context_cached(self, session):
+        ca = CertificateAuthority.create(key_size=1024)
+        assert ca.signing_context() is ca.signing_context()
@@ -0,0 +1,41 @@
+from commandment.pki.keypool import fill_pool, pooled_key_count
+from commandment.pki.models import RSAPrivateKey, CertificateAuthority
+from commandment.signals import rsa_private_key_taken
+
+
+class TestKeyPool:
+
+    def test_fill_pool(self, session):
+        assert fill_pool(session, 3, key_size=1024, batch_size=2) == 3
+        assert pooled_key_count(session) == 3
+        assert fill_pool(session, 3, key_size=1024) == 0
+
+    def test_take_pooled(self, session):
+        fill_pool(session, 2, key_size=1024)
+        key = RSAPrivateKey.take_pooled()
+        assert key is not None
+        assert key.pooled is False
+        assert key.to_crypto().key_size == 1024
+        assert pooled_key_count(session) == 1
+
+        assert RSAPrivateKey.take_pooled() is not None
+        assert RSAPrivateKey.take_pooled() is None
+
+    def test_create_device_csr_uses_pool(self, session):
+        fill_pool(session, 1, key_size=1024)
+        ca = CertificateAuthority.create(key_size=1024)
+        taken = []
+
+        def receiver(sender, **kwargs):
+            taken.append(kwargs['pooled'])
+
+        rsa_private_key_taken.connect(receiver)
+        try:
+            key, csr = ca.create_device_csr('device-identity')
+            assert key.key_size == 1024
+            key, csr = ca.create_device_csr('device-identity')
+            assert key.key_size == 2048
+        finally:
+            rsa_private_key_taken.disconnect(receiver)
+
+        assert taken == [True, False]
@@ -0,0 +1,111 @@
+import pytest
+import glob
+import io
+import os
+import plistlib
+from flask import Flask
+from tests.client import MDMClient
+from commandment.plistutil import streaming
+
+TEST_DIR = os.path.realpath(os.path.dirname(__file__))
+TEST_DATA_DIR = os.path.realpath(TEST_DIR + '/../../testdata')
+TEST_DATA = sorted(glob.glob(os.path.join(TEST_DATA_DIR, '*', '*.xml')))
+
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as fd:
+        return fd.read()
+
+
+class TestLoad:
+
+    @pytest.mark.parametrize('path', TEST_DATA)
+    def test_same_as_plistlib(self, path: str):
+        data = _read(path)
+        try:
+            expected = plistlib.loads(data)
+        except ValueError:  # Some fixtures contain placeholder data which is not valid base64
+            with pytest.raises(streaming.InvalidPlist):
+                streaming.load(io.BytesIO(data))
+        else:
+            assert streaming.load(io.BytesIO(data), chunk_size=97) == expected
+
+    def test_value_types(self):
+        value = {'a': [1, 0x10, -2.5, True, False, b'\x00\xff', 'text', {}, []], 'b': {'c': {'d': 'e'}}}
+        assert streaming.load(io.BytesIO(plistlib.dumps(value))) == value
+
+    def test_binary(self):
+        value = {'UDID': '00000000-1111-2222-3333-444455556666', 'Status': 'Idle'}
+        assert streaming.load(io.BytesIO(plistlib.dumps(value, fmt=plistlib.FMT_BINARY))) == value
+
+    @pytest.mark.parametrize('data', [
+        b'',
+        b'not a plist',
+        b'<plist><dict><key>a</key></dict></plist>',
+        b'<?xml version="1.0"?><!DOCTYPE plist [<!ENTITY e "x">]><plist><string>&e;</string></plist>',
+    ])
+    def test_invalid(self, data: bytes):
+        with pytest.raises(streaming.InvalidPlist):
+            streaming.load(io.BytesIO(data))
+
+
+class TestIterArray:
+
+    def test_items(self):
+        data = _read(os.path.join(TEST_DATA_DIR, 'InstalledApplicationList', '10.11.x.xml'))
+        expected = plistlib.loads(data)['InstalledApplicationList']
+        items = streaming.iter_array(io.BytesIO(data), 'InstalledApplicationList', chunk_size=64)
+        assert list(items) == expected
+
+    def test_nested_arrays_are_not_streamed(self):
+        value = {'Outer': {'Items': [1, 2]}, 'Items': [{'Items': [3]}, [4]]}
+        data = plistlib.dumps(value)
+        assert list(streaming.iter_array(io.BytesIO(data), 'Items', chunk_size=16)) == [{'Items': [3]}, [4]]
+
+    def test_missing_key(self):
+        assert list(streaming.iter_array(io.BytesIO(plistlib.dumps({'a': 1})), 'Items')) == []
+
+
+class TestStreamArrays:
+
+    def test_load(self):
+        data = _read(os.path.join(TEST_DATA_DIR, 'InstalledApplicationList', '10.11.x.xml'))
+        expected = plistlib.loads(data)
+        value = streaming.load(io.BytesIO(data), chunk_size=64, stream_arrays=['InstalledApplicationList'])
+
+        applications = value.pop('InstalledApplicationList')
+        assert isinstance(applications, streaming.StreamedArray)
+        assert value == {k: v for k, v in expected.items() if k != 'InstalledApplicationList'}
+        assert list(applications) == expected['InstalledApplicationList']
+        assert list(applications) == expected['InstalledApplicationList'], 'Should be iterable more than once'
+
+    def test_only_top_level_arrays(self):
+        value = {'Items': [{'Items': [1]}, [2]], 'Outer': {'Items': [3]}, 'Status': 'Acknowledged'}
+        loaded = streaming.load(io.BytesIO(plistlib.dumps(value)), stream_arrays=['Items'])
+        assert loaded['Outer'] == {'Items': [3]}
+        assert loaded['Status'] == 'Acknowledged'
+        assert list(loaded['Items']) == [{'Items': [1]}, [2]]
+
+    def test_binary(self):
+        value = {'Items': [1, 2], 'Status': 'Acknowledged'}
+        data = plistlib.dumps(value, fmt=plistlib.FMT_BINARY)
+        assert streaming.load(io.BytesIO(data), stream_arrays=['Items']) == value
+
+
+class TestSpool:
+
+    def test_spool(self):
+        fp = streaming.spool(io.BytesIO(b'x' * 100), max_size=100, memory_size=10, chunk_size=7)
+        assert fp.read() == b'x' * 100
+
+    def test_too_large(self):
+        with pytest.raises(streaming.BodyTooLarge):
+            streaming.spool(io.BytesIO(b'x' * 101), max_size=100)
+
+    def test_mdm_body_too_large(self, app: Flask, session, client: MDMClient):
+        app.config['MDM_MAX_BODY_SIZE'] = 16
+        try:
+            response = client.put('/mdm', data=b'x' * 17, content_type='text/xml')
+            assert response.status_code == 413
+        finally:
+            app.config['MDM_MAX_BODY_SIZE'] = 32 * 1024 * 1024
@@ -0,0 +1,123 @@
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+from typing import List
+from flask import Response
+from sqlalchemy.orm.session import Session
+from tests.client import MDMClient
+from commandment.inventory.models import InstalledApplication, InstalledCertificate
+from commandment.models import Device
+from commandment.snapshots import read_manifest
+from commandment.snapshots.reports import fde_compliance, missing_application, os_versions, read_table
+from commandment.snapshots.writer import snapshot_inventory
+
+pytest.importorskip('pyarrow')
+
+NOW = datetime(2018, 6, 1, 12, 0, 0)
+
+
+@pytest.fixture()
+def device_attributes():
+    models = [('MacBook Pro', '10.13.4', True), ('MacBook Pro', '10.13.4', False), ('iMac', '10.13.3', None)]
+    return lambda i: {'model_name': models[i][0], 'product_name': models[i][0], 'os_version': models[i][1],
+                      'fde_enabled': models[i][2], 'last_seen': NOW - timedelta(days=1)}
+
+
+@pytest.fixture()
+def inventory(session: Session, devices: List[Device]):
+    for i, d in enumerate(devices):
+        session.add(InstalledCertificate(device=d, device_udid=d.udid, x509_cn='device {}'.format(i),
+                                         fingerprint_sha256='{:064d}'.format(i), der_data=b''))
+        if i < 2:
+            session.add(InstalledApplication(device=d, device_udid=d.udid, bundle_identifier='com.example.app',
+                                             name='Example', version='1.{}'.format(i)))
+    session.commit()
+
+
+@pytest.mark.usefixtures('inventory')
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+class TestSnapshotInventory:
+
+    def test_full(self, session: Session, tmpdir, fmt: str):
+        rows = snapshot_inventory(session, str(tmpdir), fmt=fmt, now=NOW)
+        assert rows == {'devices': 3, 'installed_applications': 2, 'installed_certificates': 3}
+
+        manifest = read_manifest(str(tmpdir))
+        assert manifest['format'] == fmt
+        devices = read_table(str(tmpdir), manifest, 'devices', ['udid', 'fde_enabled'])
+        assert devices.column('fde_enabled').to_pylist() == [True, False, None]
+
+    def test_incremental(self, session: Session, tmpdir, fmt: str):
+        snapshot_inventory(session, str(tmpdir), fmt=fmt, now=NOW)
+
+        changed = session.query(Device).filter(Device.serial_number == 'C0000').one()
+        changed.last_seen = NOW + timedelta(minutes=10)
+        session.query(InstalledApplication).filter(InstalledApplication.device_id == changed.id).delete()
+        session.add(InstalledApplication(device=changed, device_udid=changed.udid, bundle_identifier='com.example.other',
+                                         name='Other', version='2.0'))
+        deleted = session.query(Device.id).filter(Device.serial_number == 'C0002').scalar()
+        session.query(InstalledCertificate).filter(InstalledCertificate.device_id == deleted).delete()
+        session.query(Device).filter(Device.id == deleted).delete()
+        session.commit()
+
+        rows = snapshot_inventory(session, str(tmpdir), fmt=fmt, now=NOW + timedelta(minutes=15))
+        assert rows == {'devices': 2, 'installed_applications': 2, 'installed_certificates': 2}
+
+        manifest = read_manifest(str(tmpdir))
+        assert manifest['full_at'] == NOW.strftime('%Y-%m-%dT%H:%M:%S.%f'), 'Should not have been a full run'
+        applications = read_table(str(tmpdir), manifest, 'installed_applications', ['device_id', 'bundle_identifier'])
+        assert sorted(applications.column('bundle_identifier').to_pylist()) == ['com.example.app', 'com.example.other']
+
+    def test_prunes_generations(self, session: Session, tmpdir, fmt: str):
+        for minutes in range(3):
+            snapshot_inventory(session, str(tmpdir), fmt=fmt, now=NOW + timedelta(minutes=minutes))
+
+        generations = sorted(e for e in os.listdir(str(tmpdir)) if os.path.isdir(os.path.join(str(tmpdir), e)))
+        assert len(generations) == 2
+        assert generations[-1] == read_manifest(str(tmpdir))['generation']
+
+
+@pytest.mark.usefixtures('inventory')
+class TestReports:
+
+    @pytest.fixture()
+    def snapshot(self, session: Session, tmpdir) -> dict:
+        snapshot_inventory(session, str(tmpdir), now=NOW)
+        return read_manifest(str(tmpdir))
+
+    def test_os_versions(self, tmpdir, snapshot: dict):
+        assert os_versions(str(tmpdir), snapshot) == [
+            {'os_version': '10.13.4', 'count': 2},
+            {'os_version': '10.13.3', 'count': 1},
+        ]
+
+    def test_missing_application(self, tmpdir, snapshot: dict):
+        missing = missing_application(str(tmpdir), snapshot, 'com.example.app')
+        assert [d['serial_number'] for d in missing] == ['C0002']
+
+        missing = missing_application(str(tmpdir), snapshot, 'com.example.app', version='1.1')
+        assert [d['serial_number'] for d in missing] == ['C0000', 'C0002']
+
+    def test_fde_compliance(self, tmpdir, snapshot: dict):
+        assert fde_compliance(str(tmpdir), snapshot) == [
+            {'model_name': 'MacBook Pro', 'total': 2, 'fde_enabled': 1, 'ratio': 0.5},
+            {'model_name': 'iMac', 'total': 1, 'fde_enabled': 0, 'ratio': 0.0},
+        ]
+
+    def test_api(self, app, client: MDMClient, tmpdir, snapshot: dict):
+        app.config['SNAPSHOT_DIR'] = str(tmpdir)
+        response: Response = client.get('/api/v1/reports/os_versions?group_by=product_name')
+        assert response.status_code == 200
+
+        body = json.loads(response.data)
+        assert body['snapshot_at'] == snapshot['watermark']
+        assert body['data'][0] == {'product_name': 'MacBook Pro', 'os_version': '10.13.4', 'count': 2}
+
+        response = client.get('/api/v1/reports/missing_application')
+        assert response.status_code == 400
+
+    def test_api_without_snapshot(self, app, client: MDMClient, tmpdir):
+        app.config['SNAPSHOT_DIR'] = str(tmpdir.join('empty'))
+        response: Response = client.get('/api/v1/reports/fde_compliance')
+        assert response.status_code == 503
@@ -0,0 +1,35 @@
+from flask import Flask
+from commandment import bootstrap
+from commandment.pki.models import CACertificate
+
+
+class TestBootstrap:
+
+    def test_generate_ca(self, app: Flask, session):
+        """Assert that bootstrap actually creates self-signed certificates."""
+        bootstrap.generate_ca(app)
+        certificate = session.query(CACertificate).one()
+        assert certificate.x509_cn == 'COMMANDMENT-CA'
+        assert certificate.pem_data is not None
+        assert certificate.fingerprint is not None
+
+    def test_schema_is_current(self, app: Flask, session):
+        assert bootstrap.schema_is_current(app)
+
+    def test_advisory_lock_without_support(self, app: Flask, session):
+        with bootstrap.advisory_lock(session.connection()):
+            pass
+
+
+class TestRequireCurrentSchema:
+
+    def test_refused_before_migration(self, app: Flask):
+        client = app.test_client()
+        response = client.get('/api/v1/devices')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+
+    def test_accepted_after_migration(self, app: Flask, session):
+        client = app.test_client()
+        response = client.get('/')
+        assert response.status_code == 200
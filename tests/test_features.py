@@ -0,0 +1,37 @@
+import pytest
+from flask import Flask
+from commandment.features import import_models, register_features
+
+
+@pytest.fixture()
+def bare_app() -> Flask:
+    a = Flask(__name__)
+    a.config.from_object('commandment.default_settings')
+    import_models()
+    return a
+
+
+class TestFeatures:
+
+    def test_all_features_by_default(self, bare_app: Flask):
+        import_times = register_features(bare_app)
+        assert 'mdm_app' in bare_app.blueprints
+        assert 'dep_app' in bare_app.blueprints
+        assert 'api_app' in bare_app.blueprints
+        assert bare_app.extensions['feature_import_times'] is import_times
+        assert 'mdm' in import_times
+
+    def test_enabled_features(self, bare_app: Flask):
+        bare_app.config['ENABLED_FEATURES'] = ['enroll', 'mdm']
+        assert list(register_features(bare_app).keys()) == ['enroll', 'mdm']
+        assert set(bare_app.blueprints.keys()) == {'enroll_app', 'mdm_app'}
+
+    def test_unknown_feature(self, bare_app: Flask):
+        bare_app.config['ENABLED_FEATURES'] = ['mdm', 'nonexistent']
+        with pytest.raises(ValueError):
+            register_features(bare_app)
+
+    def test_missing_optional_feature(self, bare_app: Flask):
+        bare_app.config['ENABLED_FEATURES'] = ['scep']
+        register_features(bare_app)
+        assert 'scep_app' not in bare_app.blueprints or 'scep' in bare_app.extensions['feature_import_times']
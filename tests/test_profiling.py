@@ -0,0 +1,87 @@
+import os
+import pstats
+import pytest
+from flask import Flask
+from tests.client import MDMClient
+from commandment import profiling
+
+TEST_DIR = os.path.realpath(os.path.dirname(__file__))
+TEST_DATA_DIR = os.path.realpath(TEST_DIR + '/../testdata')
+
+
+@pytest.fixture()
+def authenticate_request() -> bytes:
+    with open(os.path.join(TEST_DATA_DIR, 'Authenticate/10.11.x.xml'), 'rb') as fd:
+        return fd.read()
+
+
+@pytest.fixture()
+def profiled_app(app: Flask, tmpdir):
+    """Configure the app fixture to profile every request, and install the profiling hooks."""
+    app.config['PROFILE_SAMPLE_RATE'] = 1.0
+    app.config['PROFILE_DIR'] = str(tmpdir)
+    profiling.init_app(app)
+    return app
+
+
+class TestRequestProfiler:
+
+    def test_disabled_by_default(self, app: Flask):
+        assert profiling.init_app(app) is None
+
+    def test_pstats(self, profiled_app: Flask, client: MDMClient, session, authenticate_request: bytes, tmpdir):
+        response = client.put('/checkin', data=authenticate_request, content_type='text/xml')
+        assert response.status_code == 200
+
+        names = os.listdir(str(tmpdir))
+        assert len(names) == 1
+        assert names[0].endswith('-mdm_app.view-Authenticate.prof')
+
+        stats = pstats.Stats(os.path.join(str(tmpdir), names[0]))
+        assert any(function == 'view' for _, _, function in stats.stats.keys())
+
+    def test_collapsed(self, app: Flask, client: MDMClient, session, authenticate_request: bytes, tmpdir):
+        app.config['PROFILE_SAMPLE_RATE'] = 1.0
+        app.config['PROFILE_DIR'] = str(tmpdir)
+        app.config['PROFILE_FORMAT'] = 'collapsed'
+        profiling.init_app(app)
+
+        client.put('/checkin', data=authenticate_request, content_type='text/xml')
+
+        names = os.listdir(str(tmpdir))
+        assert len(names) == 1
+        assert names[0].endswith('-mdm_app.view-Authenticate.collapsed')
+
+    def test_other_paths_ignored(self, profiled_app: Flask, client: MDMClient, session, tmpdir):
+        client.get('/api/v1/configuration/scep')
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_udid(self, app: Flask, client: MDMClient, session, authenticate_request: bytes, tmpdir):
+        app.config['PROFILE_UDIDS'] = ['00000000-1111-2222-3333-444455556666']
+        app.config['PROFILE_DIR'] = str(tmpdir)
+        profiler = profiling.init_app(app)
+
+        client.put('/checkin', data=authenticate_request, content_type='text/xml')
+        assert len(os.listdir(str(tmpdir))) == 1
+
+        profiler.udids = [b'11111111-1111-2222-3333-444455556666']
+        client.put('/checkin', data=authenticate_request, content_type='text/xml')
+        assert len(os.listdir(str(tmpdir))) == 1
+
+    def test_rate_limited(self, profiled_app: Flask):
+        profiled_app.config['PROFILE_MAX_PER_MINUTE'] = 2
+        profiler = profiling.RequestProfiler(profiled_app)
+        assert profiler._allowed()
+        assert profiler._allowed()
+        assert not profiler._allowed()
+
+    def test_prune(self, profiled_app: Flask, tmpdir):
+        profiled_app.config['PROFILE_MAX_FILES'] = 2
+        profiler = profiling.RequestProfiler(profiled_app)
+        for name in ['20180101T000000-000001-a-b.prof', '20180101T000000-000002-a-b.prof',
+                     '20180101T000000-000003-a-b.collapsed']:
+            tmpdir.join(name).write('')
+
+        profiler.prune()
+        assert sorted(os.listdir(str(tmpdir))) == ['20180101T000000-000002-a-b.prof',
+                                                    '20180101T000000-000003-a-b.collapsed']
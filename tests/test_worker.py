@@ -0,0 +1,29 @@
+import os
+import pytest
+from commandment import create_app, worker
+
+TEST_DIR = os.path.realpath(os.path.dirname(__file__))
+TEST_APP_CONFIG = os.path.realpath(TEST_DIR + '/../travis-ci-settings.cfg')
+
+
+@pytest.fixture()
+def started(monkeypatch) -> list:
+    apps = []
+    monkeypatch.setattr(worker, 'start', apps.append)
+    return apps
+
+
+class TestWorker:
+
+    def test_create_app_starts_background(self, started: list):
+        app = create_app(TEST_APP_CONFIG)
+        assert started == [app]
+
+    def test_create_app_without_background(self, started: list):
+        create_app(TEST_APP_CONFIG, start_background=False)
+        assert started == []
+
+    def test_main_requires_config(self, monkeypatch):
+        monkeypatch.delenv('COMMANDMENT_SETTINGS', raising=False)
+        with pytest.raises(SystemExit):
+            worker.main([])
@@ -0,0 +1,171 @@
+import pytest
+import base64
+import json
+from typing import List
+from flask import Flask
+from commandment.threads import vpp_thread
+from commandment.vpp.errors import VPPAPIError, VPPErrorType
+from commandment.vpp.models import VPPAccount, VPPLicense, VPPUser
+from commandment.vpp.enum import VPPPricingParam, VPPProductType, VPPUserStatus
+from commandment.vpp.vpp import VPPLicenseCursor, VPPUserCursor
+
+STOKEN = base64.b64encode(json.dumps({
+    'token': 'sekret',
+    'expDate': '2030-01-01T00:00:00-0800',
+    'orgName': 'Commandment',
+}).encode('utf8'))
+
+
+def _license(license_id: int, serial_number: str = None) -> dict:
+    l = {
+        'licenseId': license_id,
+        'licenseIdStr': str(license_id),
+        'adamId': 408709785,
+        'adamIdStr': '408709785',
+        'productTypeId': 8,
+        'productTypeName': 'Application',
+        'pricingParam': 'STDQ',
+        'isIrrevocable': False,
+        'status': 'Available',
+    }
+    if serial_number is not None:
+        l['serialNumber'] = serial_number
+        l['status'] = 'Associated'
+
+    return l
+
+
+def _user(user_id: int) -> dict:
+    return {
+        'userId': user_id,
+        'userIdStr': str(user_id),
+        'clientUserIdStr': '00000000-0000-0000-0000-{:012d}'.format(user_id),
+        'email': 'user{}@example.com'.format(user_id),
+        'status': 'Associated',
+    }
+
+
+class FakeVPP:
+    """Replays a list of getVPPLicensesSrv replies, recording the tokens used to request each page."""
+
+    def __init__(self, pages: List[dict], user_pages: List[dict] = None):
+        self.pages = pages
+        self.user_pages = user_pages or []
+        self.requests = []
+
+    def licenses(self, batch_token: str = None, since_modified_token: str = None, **kwargs) -> VPPLicenseCursor:
+        self.requests.append((batch_token, since_modified_token))
+        reply = self.pages.pop(0)
+        if reply.get('status', 0) == -1:
+            raise VPPAPIError(reply['errorNumber'], reply['errorMessage'])
+
+        cursor = VPPLicenseCursor(vpp=self)
+        cursor._current = reply
+        return cursor
+
+    def users(self, batch_token: str = None, since_modified_token: str = None, **kwargs) -> VPPUserCursor:
+        self.requests.append((batch_token, since_modified_token))
+        cursor = VPPUserCursor(vpp=self)
+        cursor._current = self.user_pages.pop(0)
+        return cursor
+
+
+@pytest.fixture
+def vpp_account(session) -> VPPAccount:
+    account = VPPAccount(stoken=STOKEN)
+    session.add(account)
+    session.commit()
+    return account
+
+
+class TestVPPThread:
+
+    def test_license_mapping(self):
+        m = vpp_thread.license_mapping(_license(1, 'C02ABCDEFGHI'))
+        assert m['license_id'] == 1
+        assert m['adam_id'] == '408709785'
+        assert m['product_type'] == VPPProductType.Application
+        assert m['pricing_param'] == VPPPricingParam.StandardQuality
+        assert m['serial_number'] == 'C02ABCDEFGHI'
+        assert m['status'] == 'Associated'
+
+    def test_full_fetch_then_since_modified(self, app: Flask, session, vpp_account: VPPAccount):
+        vpp = FakeVPP([
+            {'status': 0, 'licenses': [_license(1), _license(2)], 'batchToken': 'BATCH1', 'totalCount': 3},
+            {'status': 0, 'licenses': [_license(3)], 'sinceModifiedToken': 'SINCE1', 'totalCount': 3},
+        ])
+        count = vpp_thread.vpp_sync_licenses(app, vpp, vpp_account.id)
+        assert count == 3
+        assert vpp.requests == [(None, None), ('BATCH1', None)]
+        assert session.query(VPPLicense).count() == 3
+
+        session.refresh(vpp_account)
+        assert vpp_account.licenses_batch_token is None
+        assert vpp_account.licenses_since_modified_token == 'SINCE1'
+
+        vpp = FakeVPP([
+            {'status': 0, 'licenses': [_license(2, 'C02ABCDEFGHI')], 'sinceModifiedToken': 'SINCE2'},
+        ])
+        count = vpp_thread.vpp_sync_licenses(app, vpp, vpp_account.id)
+        assert count == 1
+        assert vpp.requests == [(None, 'SINCE1')]
+        assert session.query(VPPLicense).count() == 3
+
+        license = session.query(VPPLicense).filter(VPPLicense.license_id == 2).one()
+        assert license.serial_number == 'C02ABCDEFGHI'
+        assert license.status == 'Associated'
+
+        session.refresh(vpp_account)
+        assert vpp_account.licenses_since_modified_token == 'SINCE2'
+
+    def test_resume_batch(self, app: Flask, session, vpp_account: VPPAccount):
+        vpp = FakeVPP([
+            {'status': 0, 'licenses': [_license(1)], 'batchToken': 'BATCH1'},
+            {'status': -1, 'errorNumber': VPPErrorType.InternalError, 'errorMessage': 'Internal Error'},
+        ])
+        with pytest.raises(VPPAPIError):
+            vpp_thread.vpp_sync_licenses(app, vpp, vpp_account.id)
+
+        session.refresh(vpp_account)
+        assert vpp_account.licenses_batch_token == 'BATCH1'
+        assert session.query(VPPLicense).count() == 1
+
+        vpp = FakeVPP([
+            {'status': 0, 'licenses': [_license(2)], 'sinceModifiedToken': 'SINCE1'},
+        ])
+        vpp_thread.vpp_sync_licenses(app, vpp, vpp_account.id)
+        assert vpp.requests == [('BATCH1', None)]
+        assert session.query(VPPLicense).count() == 2
+
+    def test_sync_users(self, app: Flask, session, vpp_account: VPPAccount):
+        vpp = FakeVPP([], [
+            {'status': 0, 'users': [_user(1)], 'batchToken': 'BATCH1'},
+            {'status': 0, 'users': [_user(2)], 'sinceModifiedToken': 'SINCE1'},
+        ])
+        assert vpp_thread.vpp_sync_users(app, vpp, vpp_account.id) == 2
+        assert vpp.requests == [(None, None), ('BATCH1', None)]
+
+        user = session.query(VPPUser).filter(VPPUser.user_id == 2).one()
+        assert user.email == 'user2@example.com'
+        assert user.status == VPPUserStatus.Associated
+
+        session.refresh(vpp_account)
+        assert vpp_account.users_batch_token is None
+        assert vpp_account.users_since_modified_token == 'SINCE1'
+
+    def test_user_assigned_license_foreign_keys(self, app: Flask, session, vpp_account: VPPAccount):
+        session.execute('PRAGMA foreign_keys=ON')
+
+        assigned = _license(1)
+        assigned.update(_user(1))
+        unsynced = _license(2)
+        unsynced.update(_user(2))
+
+        vpp = FakeVPP([{'status': 0, 'licenses': [assigned, unsynced, _license(3)], 'sinceModifiedToken': 'SINCE1'}],
+                      [{'status': 0, 'users': [_user(1)], 'sinceModifiedToken': 'SINCE1'}])
+        vpp_thread.vpp_sync_users(app, vpp, vpp_account.id)
+        assert vpp_thread.vpp_sync_licenses(app, vpp, vpp_account.id) == 3
+
+        license = session.query(VPPLicense).filter(VPPLicense.license_id == 2).one()
+        assert license.user_id == 2
+        assert session.query(VPPUser).count() == 2
@@ -0,0 +1,122 @@
+import threading
+from typing import List
+from commandment.models import Device, Tag
+from commandment.apps.models import AppstoreiOSApplication
+from commandment.vpp.assignment import plan_device_licenses, desired_device_licenses, current_device_licenses, \
+    LicenseAssignmentEngine, LicenseRequest, record_license_results
+from commandment.vpp.errors import VPPErrorType
+from commandment.vpp.models import VPPLicense
+
+
+class FakeResponse:
+
+    def __init__(self, reply: dict, status_code: int = 200, headers: dict = None):
+        self._reply = reply
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._reply
+
+
+class FakeVPP:
+    """Accepts every license request, except for serial numbers in `rejected` which are itemized as errors."""
+
+    service_config = {
+        'maxBatchAssociateLicenseCount': 2,
+        'maxBatchDisassociateLicenseCount': 2,
+    }
+
+    def __init__(self, rejected: List[str] = None):
+        self.rejected = rejected or []
+        self.requests = []
+        self._lock = threading.Lock()
+        self._next_license_id = 100
+
+    def manage_licenses_request(self, adam_id, associate=None, disassociate=None, **kwargs):
+        with self._lock:
+            self.requests.append((adam_id, associate, disassociate))
+            associations = []
+            for serial in associate:
+                if serial in self.rejected:
+                    associations.append({'serialNumber': serial, 'errorNumber': VPPErrorType.LicenseNotFound,
+                                         'errorMessage': 'No license available'})
+                else:
+                    self._next_license_id += 1
+                    associations.append({'serialNumber': serial, 'licenseIdStr': str(self._next_license_id)})
+
+            return FakeResponse({
+                'status': 0,
+                'associations': associations,
+                'disassociations': [{'serialNumber': serial} for serial in disassociate],
+            })
+
+
+class TestAssignment:
+
+    def test_plan_packs_requests(self):
+        desired = {'1': {'A', 'B', 'C'}, '2': set()}
+        current = {'1': {'C', 'D'}, '2': {'E'}, '3': {'F'}}
+
+        planned = plan_device_licenses(desired, current, max_associate=1, max_disassociate=10)
+        assert planned == [
+            LicenseRequest('1', ['A'], ['D']),
+            LicenseRequest('1', ['B'], []),
+            LicenseRequest('2', [], ['E']),
+        ]
+
+    def test_plan_nothing_to_do(self):
+        assert plan_device_licenses({'1': {'A'}}, {'1': {'A'}}) == []
+
+    def test_desired_from_tags(self, session):
+        tag = Tag(name='Students')
+        app = AppstoreiOSApplication(display_name='Pages', bundle_id='com.apple.Pages', itunes_store_id=361309726)
+        app.tags.append(tag)
+        unused_tag = Tag(name='Staff')
+        unassigned = AppstoreiOSApplication(display_name='Keynote', bundle_id='com.apple.Keynote',
+                                            itunes_store_id=361285480)
+        unassigned.tags.append(unused_tag)
+        untagged = AppstoreiOSApplication(display_name='Numbers', bundle_id='com.apple.Numbers',
+                                          itunes_store_id=361304891)
+        session.add_all([
+            app, unassigned, untagged,
+            Device(serial_number='C02AAAAAAAAA', tags=[tag]),
+            Device(serial_number='C02BBBBBBBBB'),
+        ])
+        session.commit()
+
+        assert desired_device_licenses(session) == {
+            '361309726': {'C02AAAAAAAAA'},
+            '361285480': set(),
+        }
+
+    def test_untagged_licenses_left_alone(self, session):
+        session.add_all([
+            AppstoreiOSApplication(display_name='Numbers', bundle_id='com.apple.Numbers', itunes_store_id=361304891),
+            VPPLicense(license_id=1, adam_id='361304891', serial_number='C02AAAAAAAAA', status='Associated'),
+        ])
+        session.commit()
+
+        assert plan_device_licenses(desired_device_licenses(session), current_device_licenses(session)) == []
+
+    def test_execute_reports_partial_failures(self, session):
+        session.add(VPPLicense(license_id=1, adam_id='1', serial_number='D', status='Associated'))
+        session.commit()
+
+        vpp = FakeVPP(rejected=['B'])
+        engine = LicenseAssignmentEngine(vpp, max_workers=2, requests_per_second=0)
+        planned = engine.plan({'1': {'A', 'B', 'C'}}, current_device_licenses(session))
+        assert len(planned) == 2
+
+        report = engine.execute(planned)
+        assert len(vpp.requests) == 2
+        assert len(report.succeeded) == 3
+        assert list(report.failures_by_serial().keys()) == ['B']
+        assert report.failed[0].error_number == VPPErrorType.LicenseNotFound
+
+        record_license_results(session, report)
+        session.commit()
+        assert current_device_licenses(session) == {'1': {'A', 'C'}}
@@ -0,0 +1,86 @@
+import pytest
+import os
+import requests
+from commandment.vpp.session import ServiceConfigCache, vpp_session
+from commandment.vpp.vpp import VPP
+
+SERVICE_CONFIG_URL = 'http://localhost:8080/VPPServiceConfigSrv'
+SERVICE_CONFIG = {'status': 0, 'getLicensesSrvUrl': 'http://localhost:8080/getVPPLicensesSrv'}
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int, body: dict = None, headers: dict = None):
+        self.status_code = status_code
+        self._body = body
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    """Serves the service config with an ETag, replying 304 Not Modified if the client already has it."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.requests = []
+
+    def get(self, url: str, headers: dict = None):
+        self.requests.append(headers)
+        if self.fail:
+            raise requests.ConnectionError('offline')
+
+        if headers.get('If-None-Match') == '"1"':
+            return FakeResponse(304)
+
+        return FakeResponse(200, SERVICE_CONFIG, {'ETag': '"1"'})
+
+
+class TestServiceConfigCache:
+
+    def test_cached_within_ttl(self):
+        cache = ServiceConfigCache(ttl=3600)
+        session = FakeSession()
+        assert cache.get(SERVICE_CONFIG_URL, session) == SERVICE_CONFIG
+        assert cache.get(SERVICE_CONFIG_URL, session) == SERVICE_CONFIG
+        assert len(session.requests) == 1
+
+    def test_revalidate_with_etag(self):
+        cache = ServiceConfigCache(ttl=0)
+        session = FakeSession()
+        cache.get(SERVICE_CONFIG_URL, session)
+        assert cache.get(SERVICE_CONFIG_URL, session) == SERVICE_CONFIG
+        assert session.requests == [{}, {'If-None-Match': '"1"'}]
+
+    def test_stale_copy_used_when_offline(self):
+        cache = ServiceConfigCache(ttl=0)
+        cache.get(SERVICE_CONFIG_URL, FakeSession())
+        assert cache.get(SERVICE_CONFIG_URL, FakeSession(fail=True)) == SERVICE_CONFIG
+
+        with pytest.raises(requests.ConnectionError):
+            ServiceConfigCache().get(SERVICE_CONFIG_URL, FakeSession(fail=True))
+
+    def test_persisted_copy(self, tmpdir):
+        path = str(tmpdir.join('vpp_service_config.json'))
+        ServiceConfigCache(path=path).get(SERVICE_CONFIG_URL, FakeSession())
+        assert os.path.exists(path)
+
+        cold = ServiceConfigCache(path=path)
+        assert cold.get(SERVICE_CONFIG_URL, FakeSession(fail=True)) == SERVICE_CONFIG
+
+    def test_vpp_uses_cache(self):
+        cache = ServiceConfigCache()
+        session = FakeSession()
+        cache.get(SERVICE_CONFIG_URL, session)
+
+        vpp = VPP('stoken', SERVICE_CONFIG_URL, config_cache=cache)
+        assert vpp.service_config == SERVICE_CONFIG
+        assert len(session.requests) == 1
+
+    def test_shared_session(self):
+        assert vpp_session() is vpp_session()
@@ -1,7 +1,9 @@
 import pytest
 import logging
 
+from commandment.threads import vpp_thread
 from commandment.vpp.enum import LicenseAssociationType
+from commandment.vpp.models import VPPAccount, VPPLicense
 from commandment.vpp.vpp import VPP
 
 logger = logging.getLogger(__name__)
@@ -87,4 +89,18 @@ class TestVPP:
 
         op.add(LicenseAssociationType.ClientUserID, VPP_MOCK_USER_CID)
         vpp.save(op)
-        
\ No newline at end of file
+
+    def test_sync_licenses(self, app, session, simulator_token: str, vpp: VPP):
+        account = VPPAccount(stoken=simulator_token)
+        session.add(account)
+        session.commit()
+
+        count = vpp_thread.vpp_sync_licenses(app, vpp, account.id)
+        assert count == session.query(VPPLicense).count()
+
+        session.refresh(account)
+        assert account.licenses_batch_token is None
+        assert account.licenses_since_modified_token is not None
+
+        # Nothing has changed since the full fetch
+        assert vpp_thread.vpp_sync_licenses(app, vpp, account.id) == 0